@@ -0,0 +1,64 @@
+import io
+
+import cold_start
+
+np = cold_start.lazy_import('numpy')
+
+# Written next to result.json: requests/{user_id}/{request_id}/attributions.npz
+FILE_NAME = 'attributions.npz'
+CONTENT_TYPE = 'application/octet-stream'
+
+
+def _scaled(values):
+    """
+    Per-pixel SHAP values are often around 1e-5, where float16 is subnormal
+    and loses most of its precision, so arrays are stored divided by their
+    largest magnitude together with that scale.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    scale = float(np.max(np.abs(values))) if values.size else 0.0
+    if scale == 0.0:
+        scale = 1.0
+    return (values / scale).astype(np.float16), np.float32(scale)
+
+
+def pack(attributions, labels, heatmap):
+    """
+    Compress one run's arrays into an .npz
+
+    Args:
+        attributions: (H, W, 3) SHAP values for the explained class
+        labels: (H, W) superpixel labels from SLIC
+        heatmap: (H, W) mean |SHAP| as drawn in the visualization
+
+    Returns:
+        bytes: The .npz file. attributions and heatmap are float16 in [-1, 1]
+               with float32 attributions_scale / heatmap_scale; labels are uint16
+    """
+    attributions, attributions_scale = _scaled(attributions)
+    heatmap, heatmap_scale = _scaled(heatmap)
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf,
+        attributions=attributions,
+        attributions_scale=attributions_scale,
+        heatmap=heatmap,
+        heatmap_scale=heatmap_scale,
+        labels=np.asarray(labels, dtype=np.uint16),
+    )
+    return buf.getvalue()
+
+
+def unpack(data):
+    """
+    Inverse of pack, for re-deriving metrics or re-rendering from a stored run
+
+    Returns:
+        dict: attributions, heatmap (float32, original scale) and labels
+    """
+    with np.load(io.BytesIO(data)) as npz:
+        return {
+            'attributions': npz['attributions'].astype(np.float32) * npz['attributions_scale'],
+            'heatmap': npz['heatmap'].astype(np.float32) * npz['heatmap_scale'],
+            'labels': npz['labels'],
+        }
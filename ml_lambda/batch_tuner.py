@@ -0,0 +1,181 @@
+import json
+import os
+import platform
+import resource
+import threading
+import time
+
+import cold_start
+
+np = cold_start.lazy_import('numpy')
+torch = cold_start.lazy_import('torch')
+
+# 'auto' probes the loaded model, 'preset' keeps each preset's batch_size,
+# and a number fixes the batch size for every preset
+BATCH_SIZE = os.environ.get('SHAP_BATCH_SIZE', 'auto').lower()
+# Batch sizes tried by the probe, smallest first
+CANDIDATES = tuple(int(size) for size in os.environ.get('SHAP_BATCH_CANDIDATES', '1,4,8,16').split(','))
+# Peak RSS a batch size may reach; defaults to 80% of the Lambda's memory
+MEMORY_CEILING_MB = float(os.environ.get(
+    'SHAP_MEMORY_CEILING_MB',
+    0.8 * float(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', 0))
+)) or None
+# Choices are shared between containers through S3, under this prefix
+TUNING_PREFIX = 'tuning/batch_size'
+# A larger batch has to beat a smaller one by this much to be picked
+MIN_SPEEDUP = 1.05
+
+_lock = threading.Lock()
+_choices = {}
+
+
+def hardware_signature():
+    """What the best batch size depends on besides the model: memory tier and cores"""
+    return {
+        'memory_mb': os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', 'local'),
+        'cpus': os.cpu_count(),
+        'threads': torch.get_num_threads(),
+        'machine': platform.machine(),
+    }
+
+
+def cache_key(model_version, quantization=None):
+    signature = hardware_signature()
+    hardware = '-'.join(f"{key}{value}" for key, value in signature.items())
+    return f"{model_version or 'unversioned'}/{quantization or 'none'}/{hardware}"
+
+
+def peak_rss_mb():
+    """Process high-water mark; ru_maxrss is in kilobytes on Linux"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def probe(run_batch, candidates=None, ceiling_mb=None):
+    """
+    Time run_batch at each candidate size, smallest first.
+
+    Peak RSS only ever grows, so each measurement is the high-water mark after
+    that size ran. A size whose peak, extrapolated from the previous two, would
+    cross the ceiling is not run at all, and neither is anything larger.
+
+    Args:
+        run_batch: Callable running one (N, 224, 224, 3) batch through the model
+        candidates: Batch sizes to try, default CANDIDATES
+        ceiling_mb: Peak RSS limit, default MEMORY_CEILING_MB
+
+    Returns:
+        list: {'batch_size', 'images_per_second', 'peak_rss_mb'} per size that ran
+    """
+    candidates = sorted(candidates or CANDIDATES)
+    ceiling_mb = MEMORY_CEILING_MB if ceiling_mb is None else ceiling_mb
+
+    # First call pays for one-time kernel setup
+    run_batch(np.zeros((1, 224, 224, 3), dtype=np.float32))
+
+    measurements = []
+    for batch_size in candidates:
+        if ceiling_mb and len(measurements) >= 2:
+            previous, last = measurements[-2:]
+            per_image = max(last['peak_rss_mb'] - previous['peak_rss_mb'], 0) / (last['batch_size'] - previous['batch_size'])
+            if last['peak_rss_mb'] + per_image * (batch_size - last['batch_size']) > ceiling_mb:
+                print(f"Skipping batch size {batch_size}: expected to exceed {ceiling_mb:.0f} MB")
+                break
+
+        batch = np.zeros((batch_size, 224, 224, 3), dtype=np.float32)
+        start = time.perf_counter()
+        run_batch(batch)
+        elapsed = time.perf_counter() - start
+        measurements.append({
+            'batch_size': batch_size,
+            'images_per_second': batch_size / elapsed,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+        if ceiling_mb and measurements[-1]['peak_rss_mb'] > ceiling_mb:
+            break
+    return measurements
+
+
+def choose(measurements, ceiling_mb=None):
+    """
+    Smallest batch size within MIN_SPEEDUP of the best throughput under the ceiling
+
+    Returns:
+        int: Batch size; the smallest one measured if none stayed under the
+             ceiling, or None if nothing was measured
+    """
+    ceiling_mb = MEMORY_CEILING_MB if ceiling_mb is None else ceiling_mb
+    if not measurements:
+        return None
+    fitting = [m for m in measurements if not ceiling_mb or m['peak_rss_mb'] <= ceiling_mb]
+    if not fitting:
+        print(f"No batch size stayed under {ceiling_mb:.0f} MB, using the smallest")
+        return min(m['batch_size'] for m in measurements)
+    best = max(m['images_per_second'] for m in fitting)
+    return min(m['batch_size'] for m in fitting if m['images_per_second'] * MIN_SPEEDUP >= best)
+
+
+def _load(s3_client, bucket, key):
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{TUNING_PREFIX}/{key}.json")
+        return json.loads(response['Body'].read())
+    except Exception as e:
+        print(f"No stored batch size for {key}: {str(e)}")
+        return None
+
+
+def _store(s3_client, bucket, key, choice):
+    try:
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=f"{TUNING_PREFIX}/{key}.json",
+            Body=json.dumps(choice),
+            ContentType='application/json'
+        )
+    except Exception as e:
+        print(f"Could not store batch size for {key}: {str(e)}")
+
+
+def get_batch_size(run_batch, model_version, quantization=None, s3_client=None, bucket=None):
+    """
+    Batch size for the explainer on this container.
+
+    With SHAP_BATCH_SIZE=auto the choice is looked up in memory, then in S3,
+    and only probed when neither has it for this model version and hardware.
+
+    Returns:
+        tuple: (batch size, or None to keep the preset's, info dict for the result metadata)
+    """
+    if BATCH_SIZE == 'preset':
+        return None, {'source': 'preset'}
+    if BATCH_SIZE != 'auto':
+        return int(BATCH_SIZE), {'source': 'config'}
+
+    key = cache_key(model_version, quantization)
+    with _lock:
+        if key in _choices:
+            return _choices[key]['batch_size'], dict(_choices[key], source='memory')
+
+        choice = _load(s3_client, bucket, key) if s3_client is not None else None
+        source = 's3'
+        if choice is None:
+            start = time.perf_counter()
+            measurements = probe(run_batch)
+            choice = {
+                'batch_size': choose(measurements),
+                'measurements': measurements,
+                'ceiling_mb': MEMORY_CEILING_MB,
+                'probe_ms': (time.perf_counter() - start) * 1000,
+            }
+            source = 'probe'
+            print(f"Batch size {choice['batch_size']} for {key}")
+            if choice['batch_size'] is not None and s3_client is not None:
+                _store(s3_client, bucket, key, choice)
+
+        choice['key'] = key
+        _choices[key] = choice
+        return choice['batch_size'], dict(choice, source=source)
+
+
+def clear():
+    with _lock:
+        _choices.clear()
@@ -0,0 +1,67 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+import cold_start
+
+requests = cold_start.lazy_import('requests')
+
+# Mirrors src/utils/callback_signing.py on the API side
+SIGNATURE_HEADER = 'X-Shap-Signature'
+TIMESTAMP_HEADER = 'X-Shap-Timestamp'
+
+CALLBACK_SECRET = os.environ.get('SHAP_CALLBACK_SECRET', '')
+CALLBACK_TIMEOUT = float(os.environ.get('SHAP_CALLBACK_TIMEOUT', 10))
+
+
+def sign(body, secret, timestamp):
+    message = str(timestamp).encode('utf-8') + b'.' + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def _post(url, body, headers):
+    response = requests.post(url, data=body, headers=headers, timeout=CALLBACK_TIMEOUT)
+    response.raise_for_status()
+
+
+# Swapped out in tests for a function that hands the request straight to the API
+transport = _post
+
+
+def send_status(callback_url, request_id, status, result=None, error=None):
+    """
+    Report a job state change to the API's SHAP callback endpoint.
+
+    Failures are logged and swallowed: result.json / error.json are still
+    written to S3, so a lost callback never loses the analysis.
+
+    Returns:
+        bool: Whether the callback was delivered
+    """
+    if not callback_url:
+        return False
+    if not CALLBACK_SECRET:
+        print("SHAP_CALLBACK_SECRET is not set, skipping status callback")
+        return False
+
+    payload = {'request_id': request_id, 'status': status}
+    if result is not None:
+        payload['result'] = result
+    if error is not None:
+        payload['error'] = error
+
+    body = json.dumps(payload).encode('utf-8')
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        TIMESTAMP_HEADER: timestamp,
+        SIGNATURE_HEADER: sign(body, CALLBACK_SECRET, timestamp),
+    }
+    try:
+        transport(callback_url, body, headers)
+        return True
+    except Exception as e:
+        print(f"SHAP status callback for {request_id} failed: {str(e)}")
+        return False
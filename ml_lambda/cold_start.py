@@ -0,0 +1,117 @@
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Imported first by lambda_function, so this is as close to the start of the
+# Lambda init phase as Python code can get.
+_process_start = time.perf_counter()
+
+_lock = threading.Lock()
+_imports = {}
+_phases = {}
+_invocations = 0
+_first_invocation_at = None
+
+
+def import_module(name):
+    """
+    Import ``name``, recording how long it took if this is the first import.
+
+    Modules that are already loaded (including test doubles placed in
+    sys.modules) are returned without being timed.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = (time.perf_counter() - start) * 1000
+    with _lock:
+        _imports.setdefault(name, elapsed)
+    return module
+
+
+class LazyModule:
+    """
+    Module stand-in that imports the real module on first attribute access.
+
+    Lets shap_service keep its module-level names (``shap``, ``cv2``, ``np``...)
+    without paying for them at import time, so the handler can reject a bad
+    event before torch, shap or OpenCV are loaded.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_module')
+        if module is None:
+            module = import_module(object.__getattribute__(self, '_name'))
+            object.__setattr__(self, '_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module '{object.__getattribute__(self, '_name')}'>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+@contextmanager
+def phase(name):
+    """Time an init phase, e.g. ``with cold_start.phase('model_load'):``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(name, (time.perf_counter() - start) * 1000)
+
+
+def record_phase(name, elapsed_ms):
+    with _lock:
+        _phases[name] = elapsed_ms
+
+
+def mark_invocation():
+    """Call once at the top of the handler"""
+    global _invocations, _first_invocation_at
+    with _lock:
+        _invocations += 1
+        if _first_invocation_at is None:
+            _first_invocation_at = time.perf_counter()
+
+
+def report():
+    """
+    Cold-start budget for the result metadata
+
+    Returns:
+        dict: whether this invocation was the container's first, time from
+              module load to the first invocation, per-module import times and
+              init phase times, all in milliseconds
+    """
+    with _lock:
+        init_ms = None
+        if _first_invocation_at is not None:
+            init_ms = (_first_invocation_at - _process_start) * 1000
+        return {
+            'cold_start': _invocations <= 1,
+            'invocation': _invocations,
+            'init_ms': init_ms,
+            'import_ms': sum(_imports.values()),
+            'imports_ms': dict(sorted(_imports.items(), key=lambda item: -item[1])),
+            'phases_ms': dict(_phases),
+        }
@@ -0,0 +1,215 @@
+import argparse
+import json
+import os
+import time
+
+import cold_start
+
+np = cold_start.lazy_import('numpy')
+torch = cold_start.lazy_import('torch')
+
+# Used when a request does not name a method
+DEFAULT_METHOD = os.environ.get('SHAP_DEFAULT_METHOD', 'shap_partition')
+
+
+class Explainer:
+    """
+    Per-pixel attributions for the model's top class.
+
+    Implementations use the service's model and preprocessing and return
+    (H, W, 3) attributions, so the quadrant/superpixel analysis, the stored
+    artifacts and the result schema are the same whichever method ran.
+    Attribution scales differ between methods; compare them by rank or
+    correlation, not by value.
+    """
+    name = None
+    # Preset parameters (presets.PRESETS) the method uses
+    param_keys = ()
+
+    def __init__(self, service):
+        self.service = service
+
+    def params(self, preset_params):
+        """The subset of the preset this method runs with, for the result metadata"""
+        return {key: preset_params[key] for key in self.param_keys if key in preset_params}
+
+    def explain(self, image_normalized, params):
+        """
+        Args:
+            image_normalized: (224, 224, 3) float32 image in [0, 1]
+            params: Preset parameters, see presets.PRESETS
+
+        Returns:
+            tuple: ((H, W, 3) attributions for the top class, class probabilities)
+        """
+        raise NotImplementedError
+
+    def _device(self):
+        return next(self.service.model.parameters()).device
+
+    def _input(self, image):
+        """(1, 3, H, W) normalized tensor that outlives the preprocessing buffer"""
+        return self.service.preprocess(np.expand_dims(image, 0)).clone().to(self._device())
+
+
+def _gradient(output, inputs):
+    try:
+        gradient, = torch.autograd.grad(output, inputs)
+    except RuntimeError as e:
+        # Quantized layers (SHAP_QUANTIZATION) have no backward pass
+        raise ValueError(f"Gradient explanations need an unquantized model: {str(e)}")
+    return gradient
+
+
+class ShapPartition(Explainer):
+    """SHAP PartitionExplainer over masked copies of the image (max_evals forward passes)"""
+    name = 'shap_partition'
+    param_keys = ('masker', 'max_evals', 'batch_size')
+
+    def explain(self, image_normalized, params):
+        shap_values, probs = self.service.explain(image_normalized, params)
+        return shap_values.values[0, :, :, :, 0], probs
+
+
+class GradCam(Explainer):
+    """
+    Grad-CAM on the model's last Conv2d: one forward and one backward pass.
+
+    The map is the ReLU of the activations weighted by their mean gradient,
+    upsampled to the image and repeated over the colour channels, so it is
+    non-negative and coarse (14x14 cells for VGG16).
+    """
+    name = 'gradcam'
+
+    def explain(self, image_normalized, params):
+        model = self.service.model
+        convs = [module for module in model.modules() if isinstance(module, torch.nn.Conv2d)]
+        if not convs:
+            raise ValueError("Grad-CAM needs a model with a Conv2d layer")
+
+        captured = {}
+        handle = convs[-1].register_forward_hook(lambda module, inputs, output: captured.update(activation=output))
+        try:
+            # The input needs a gradient because the VGG16 features are frozen
+            x = self._input(image_normalized).requires_grad_(True)
+            with torch.enable_grad():
+                output = model(x)
+                pred = int(output[0].argmax())
+                gradient = _gradient(output[0, pred], captured['activation'])
+        finally:
+            handle.remove()
+
+        activation = captured['activation'].detach()
+        weights = gradient.mean(dim=(2, 3), keepdim=True)
+        cam = torch.relu((weights * activation).sum(dim=1, keepdim=True))
+        cam = torch.nn.functional.interpolate(cam, size=image_normalized.shape[:2], mode='bilinear', align_corners=False)
+        cam = cam[0, 0].cpu().numpy()
+        probs = torch.nn.functional.softmax(output.detach(), dim=1)[0].cpu().numpy()
+        return np.repeat(cam[:, :, None], 3, axis=2), probs
+
+
+class IntegratedGradients(Explainer):
+    """
+    Integrated gradients of the top class probability along the straight path
+    from a black image, ig_steps midpoint steps run batch_size at a time.
+
+    Normalization is affine per channel, so integrating in normalized space
+    gives the same attributions as in [0, 1] pixel space. Like SHAP values
+    they add up to roughly p(image) - p(black).
+    """
+    name = 'integrated_gradients'
+    param_keys = ('ig_steps', 'batch_size')
+
+    def explain(self, image_normalized, params):
+        model = self.service.model
+        steps = int(params.get('ig_steps', 32))
+        batch_size = int(params.get('batch_size') or steps)
+
+        x = self._input(image_normalized)
+        baseline = self._input(np.zeros_like(image_normalized))
+        with torch.no_grad():
+            probs = torch.nn.functional.softmax(model(x), dim=1)[0]
+        pred = int(probs.argmax())
+
+        delta = x - baseline
+        alphas = (torch.arange(steps, dtype=torch.float32) + 0.5) / steps
+        total = torch.zeros_like(x)
+        with torch.enable_grad():
+            for chunk in alphas.split(batch_size):
+                path = (baseline + chunk.view(-1, 1, 1, 1).to(x.device) * delta).requires_grad_(True)
+                target = torch.nn.functional.softmax(model(path), dim=1)[:, pred].sum()
+                gradient = _gradient(target, path)
+                total += gradient.sum(dim=0, keepdim=True)
+
+        attributions = (delta * total / steps)[0].permute(1, 2, 0)
+        return attributions.cpu().numpy(), probs.cpu().numpy()
+
+
+EXPLAINERS = {explainer.name: explainer for explainer in (ShapPartition, GradCam, IntegratedGradients)}
+
+
+def resolve(name=None):
+    """
+    Args:
+        name: An EXPLAINERS key, or None for DEFAULT_METHOD
+
+    Returns:
+        str: The method name
+
+    Raises:
+        ValueError: If the method does not exist
+    """
+    name = name or DEFAULT_METHOD
+    if name not in EXPLAINERS:
+        raise ValueError(f"Unknown explanation method '{name}', expected one of {', '.join(EXPLAINERS)}")
+    return name
+
+
+def create(name, service):
+    return EXPLAINERS[resolve(name)](service)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark explanation methods: runtime against agreement with SHAP')
+    parser.add_argument('--image', required=True, help='Image to explain')
+    parser.add_argument('--weights', help='model.pth to explain (defaults to an untrained CNNModel)')
+    parser.add_argument('--preset', default='standard', help='Preset every method runs with')
+    parser.add_argument('--reference-preset', default='thorough', help='Preset of the shap_partition reference run')
+    parser.add_argument('--runs', type=int, default=1)
+    args = parser.parse_args()
+
+    import post_analysis
+    import presets
+    from shap_service import ShapAnalysisService
+
+    service = ShapAnalysisService.offline(args.weights)
+    with open(args.image, 'rb') as f:
+        _, image_normalized, image_gray = ShapAnalysisService.load_image(f.read())
+    labels = post_analysis.segment(image_gray)
+    _, params = presets.resolve(args.preset)
+    _, reference_params = presets.resolve(args.reference_preset)
+
+    # First call pays for torch and masker setup
+    service.explain(image_normalized, {'masker': 'blur(8,8)', 'max_evals': 10, 'batch_size': 10})
+
+    reference, _ = create('shap_partition', service).explain(image_normalized, reference_params)
+    report = {}
+    for name in EXPLAINERS:
+        explainer = create(name, service)
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            attributions, probs = explainer.explain(image_normalized, params)
+            timings.append((time.perf_counter() - start) * 1000)
+        report[name] = dict(
+            explainer.params(params),
+            mean_ms=sum(timings) / len(timings),
+            confidence=float(np.max(probs)),
+            **post_analysis.agreement(attributions, reference, labels)
+        )
+
+    print(json.dumps({'preset': args.preset, 'reference_preset': args.reference_preset, 'methods': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
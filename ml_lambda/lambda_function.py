@@ -1,13 +1,19 @@
+import cold_start
 import json
-import boto3
 import uuid
 from datetime import datetime
 from shap_service import ShapAnalysisService
+import callback
+import explainers
+import presets
+
+boto3 = cold_start.lazy_import('boto3')
 
 def lambda_handler(event, context):
     """
     AWS Lambda handler function for async SHAP analysis
     """
+    cold_start.mark_invocation()
     try:
         # Parse the request body
         body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', {})
@@ -16,6 +22,9 @@ def lambda_handler(event, context):
         image_url = body.get('image_url')
         user_id = body.get('user_id')
         request_id = body.get('request_id')
+        callback_url = body.get('callback_url')
+        preset = body.get('preset')
+        method = body.get('method')
         
         if not image_url or not user_id or not request_id:
             return {
@@ -29,6 +38,21 @@ def lambda_handler(event, context):
                 })
             }
 
+        try:
+            preset, _ = presets.resolve(preset)
+            method = explainers.resolve(method)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'error': str(e)
+                })
+            }
+
         timestamp = datetime.utcnow().isoformat()
         
         # Initialize S3 client
@@ -40,6 +64,8 @@ def lambda_handler(event, context):
             'request_id': request_id,
             'user_id': user_id,
             'image_url': image_url,
+            'preset': preset,
+            'method': method,
             'status': 'processing',
             'timestamp': timestamp
         }
@@ -52,9 +78,32 @@ def lambda_handler(event, context):
             ContentType='application/json'
         )
         
+        callback.send_status(callback_url, request_id, 'running')
+
+        result_key = f'requests/{user_id}/{request_id}/result.json'
+
+        def publish_analysis(analysis):
+            # Numbers are available before the visualization is rendered;
+            # result.json is overwritten once the image URL is known
+            analysis.update({
+                'request_id': request_id,
+                'status': 'analyzed',
+                'analysis_time': datetime.utcnow().isoformat()
+            })
+            s3_client.put_object(
+                Bucket=results_bucket,
+                Key=result_key,
+                Body=json.dumps(analysis),
+                ContentType='application/json'
+            )
+            callback.send_status(callback_url, request_id, 'analyzed', result=analysis)
+
         # Initialize service and analyze
         service = ShapAnalysisService()
-        result = service.analyze_image(image_url, user_id, request_id)
+        result = service.analyze_image(image_url, user_id, request_id, on_analysis=publish_analysis,
+                                      preset=preset, method=method)
+        if result.get('status') == 'failed':
+            raise Exception(result.get('error'))
         
         # Update the request status and store results
         result.update({
@@ -66,10 +115,12 @@ def lambda_handler(event, context):
         # Save complete results to S3
         s3_client.put_object(
             Bucket=results_bucket,
-            Key=f'requests/{user_id}/{request_id}/result.json',
+            Key=result_key,
             Body=json.dumps(result),
             ContentType='application/json'
         )
+
+        callback.send_status(callback_url, request_id, 'completed', result=result)
         
         return {
             'statusCode': 202,
@@ -100,6 +151,7 @@ def lambda_handler(event, context):
                 Body=json.dumps(error_response),
                 ContentType='application/json'
             )
+            callback.send_status(body.get('callback_url'), request_id, 'failed', error=error_response)
             
         return {
             'statusCode': 500,
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+from model_service import load_cnn_model
+from quantization import quantize_model, calibration_batches_from_dir
+
+# Lambda keeps module globals (and /tmp) alive between invocations on a warm
+# container, so the artifact and the loaded model live here rather than on
+# ShapAnalysisService, which is created per event.
+MODEL_CACHE_DIR = os.environ.get('MODEL_CACHE_DIR', '/tmp/model')
+# Seconds between HEAD revalidations; 0 revalidates on every request
+MODEL_REVALIDATE_SECONDS = float(os.environ.get('MODEL_REVALIDATE_SECONDS', 0))
+# Downloads retried when an unversioned artifact is overwritten mid-download
+DOWNLOAD_ATTEMPTS = 3
+
+_lock = threading.Lock()
+_entry = {
+    'version': None,
+    'path': None,
+    'model': None,
+    'load_timings': None,
+    'quantization': None,
+    'checked_at': 0.0,
+}
+_stats = {'hits': 0, 'misses': 0, 'downloads': 0, 'revalidation_errors': 0}
+
+
+def _version_id(head):
+    version_id = head.get('VersionId')
+    if version_id and version_id != 'null':
+        return str(version_id)
+    return None
+
+
+def _artifact_version(head):
+    """Prefer the S3 VersionId when the bucket is versioned, otherwise the ETag"""
+    return _version_id(head) or str(head.get('ETag', '')).strip('"')
+
+
+def _local_path(key, version):
+    safe_version = ''.join(c for c in version if c.isalnum() or c in '-_') or 'unversioned'
+    name, ext = os.path.splitext(os.path.basename(key))
+    return os.path.join(MODEL_CACHE_DIR, f"{name}-{safe_version}{ext}")
+
+
+def _purge_stale(keep_path):
+    """Remove artifacts for older versions so /tmp does not fill up"""
+    try:
+        for name in os.listdir(MODEL_CACHE_DIR):
+            path = os.path.join(MODEL_CACHE_DIR, name)
+            if path != keep_path and os.path.isfile(path):
+                os.remove(path)
+    except OSError as e:
+        print(f"Could not purge stale model artifacts: {str(e)}")
+
+
+def _download(s3_client, bucket, key, path, head):
+    """
+    Download the object ``head`` describes to ``path``
+
+    Returns:
+        bool: False if the object was overwritten since the HEAD, in which case
+              nothing is written to ``path``
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.part"
+    version_id = _version_id(head)
+    if version_id:
+        # Pin the download to the version the cache key was built from
+        s3_client.download_file(bucket, key, tmp_path, ExtraArgs={'VersionId': version_id})
+    else:
+        s3_client.download_file(bucket, key, tmp_path)
+        # Nothing to pin without versioning; check the object is still the one we resolved
+        current = s3_client.head_object(Bucket=bucket, Key=key)
+        if _artifact_version(current) != _artifact_version(head):
+            os.remove(tmp_path)
+            return False
+    # Atomic rename so a concurrent reader never sees a partial file
+    os.replace(tmp_path, path)
+    _stats['downloads'] += 1
+    return True
+
+
+def get_model(s3_client, bucket, key, device, quantization='none', calibration_dir=None):
+    """
+    Return the model for s3://bucket/key, reusing the warm-container copy when
+    the artifact has not changed.
+
+    ``quantization`` is part of the cache key; only the requested variant is
+    kept in memory so the int8 modes actually lower the container's footprint.
+
+    Returns:
+        tuple: (model, info dict with version, cache outcome and load timings)
+    """
+    with _lock:
+        now = time.monotonic()
+        cached = _entry['model'] is not None and _entry['quantization']['requested'] == quantization
+
+        if cached and now - _entry['checked_at'] < MODEL_REVALIDATE_SECONDS:
+            _stats['hits'] += 1
+            return _entry['model'], _info('hit')
+
+        try:
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            version = _artifact_version(head)
+        except Exception as e:
+            if not cached:
+                raise
+            # Serve the model we already have rather than fail the job
+            print(f"Model revalidation failed, using cached version {_entry['version']}: {str(e)}")
+            _stats['revalidation_errors'] += 1
+            _stats['hits'] += 1
+            return _entry['model'], _info('stale')
+
+        _entry['checked_at'] = now
+        if cached and version == _entry['version']:
+            _stats['hits'] += 1
+            return _entry['model'], _info('hit')
+
+        _stats['misses'] += 1
+        # Release the previous model before loading its replacement
+        _entry['model'] = None
+        path = _local_path(key, version)
+        for _ in range(DOWNLOAD_ATTEMPTS):
+            if os.path.exists(path):
+                break
+            print(f"Downloading model s3://{bucket}/{key} (version {version})")
+            if _download(s3_client, bucket, key, path, head):
+                break
+            print(f"Model s3://{bucket}/{key} changed during download, resolving it again")
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            version = _artifact_version(head)
+            path = _local_path(key, version)
+        else:
+            raise RuntimeError(f"Model s3://{bucket}/{key} kept changing during download")
+
+        model, _, load_timings = load_cnn_model(path, device)
+        calibration = calibration_batches_from_dir(calibration_dir) if quantization == 'static' else None
+        model, quantization_info = quantize_model(model, quantization, calibration, inplace=True)
+        _purge_stale(path)
+
+        _entry.update({
+            'version': version,
+            'path': path,
+            'model': model,
+            'load_timings': load_timings,
+            'quantization': quantization_info,
+        })
+        return model, _info('miss')
+
+
+def _info(outcome):
+    return {
+        'cache': outcome,
+        'version': _entry['version'],
+        'load_timings': _entry['load_timings'],
+        'quantization': _entry['quantization'],
+    }
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats, version=_entry['version'])
+
+
+def clear():
+    """Drop the in-memory model; the artifact on disk is kept"""
+    with _lock:
+        _entry.update({
+            'version': None,
+            'path': None,
+            'model': None,
+            'load_timings': None,
+            'quantization': None,
+            'checked_at': 0.0,
+        })
@@ -2,14 +2,18 @@ import torch
 import torch.nn as nn
 from torchvision import models
 from datetime import datetime
+import inspect
 import os
+import time
 import boto3
 
 class CNNModel(nn.Module):
-    def __init__(self):
+    def __init__(self, pretrained=False):
         super(CNNModel, self).__init__()
-        # Initialize VGG16 with pretrained weights
-        self.vgg16 = models.vgg16(weights=models.VGG16_Weights.IMAGENET1K_V1)
+        # Only pull the ImageNet weights when training from scratch. For inference
+        # every parameter is overwritten by model.pth, so build the bare architecture.
+        weights = models.VGG16_Weights.IMAGENET1K_V1 if pretrained else None
+        self.vgg16 = models.vgg16(weights=weights)
 
         # Freeze feature layers
         for param in self.vgg16.features.parameters():
@@ -22,11 +26,84 @@ class CNNModel(nn.Module):
     def forward(self, x):
         return self.vgg16(x)
 
+
+def _supports_assign():
+    """load_state_dict(assign=True) landed in torch 2.1"""
+    try:
+        return 'assign' in inspect.signature(nn.Module.load_state_dict).parameters
+    except Exception:
+        return False
+
+
+def read_state_dict(model_path, device):
+    """
+    Read a checkpoint with memory-mapped tensor storage where torch supports it,
+    so weights are paged in from disk instead of copied into fresh buffers.
+    """
+    try:
+        state_dict = torch.load(model_path, map_location=device, mmap=True)
+    except TypeError:
+        # torch < 2.1 has no mmap argument
+        state_dict = torch.load(model_path, map_location=device)
+    except RuntimeError:
+        # Legacy (non-zipfile) checkpoints cannot be mmapped
+        state_dict = torch.load(model_path, map_location=device)
+
+    # Handle different types of saved states
+    if isinstance(state_dict, dict):
+        if 'model_state_dict' in state_dict:
+            state_dict = state_dict['model_state_dict']
+        elif 'state_dict' in state_dict:
+            state_dict = state_dict['state_dict']
+    return state_dict
+
+
+def load_cnn_model(model_path, device):
+    """
+    Build CNNModel and load model.pth into it as cheaply as possible.
+
+    On torch >= 2.1 the module is constructed on the meta device (no allocation,
+    no random init) and the checkpoint tensors are assigned in place. Older torch,
+    or a checkpoint that does not cover every parameter, falls back to building
+    the bare architecture on ``device`` and copying the weights in.
+
+    Returns:
+        tuple: (model in eval mode, incompatible keys, timings dict in ms)
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    state_dict = read_state_dict(model_path, device)
+    timings['load_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    model = None
+    incompatible_keys = None
+    if _supports_assign():
+        with torch.device('meta'):
+            meta_model = CNNModel()
+        incompatible_keys = meta_model.load_state_dict(state_dict, strict=False, assign=True)
+        if not incompatible_keys.missing_keys:
+            model = meta_model.to(device)
+            for param in model.vgg16.features.parameters():
+                param.requires_grad = False
+            timings['construction'] = 'meta'
+
+    if model is None:
+        model = CNNModel().to(device)
+        incompatible_keys = model.load_state_dict(state_dict, strict=False)
+        timings['construction'] = 'eager'
+    timings['construct_ms'] = (time.perf_counter() - start) * 1000
+
+    model.eval()
+    return model, incompatible_keys, timings
+
 class ModelService:
     _instance = None
     _model = None
     _device = None
     _initialized = False
+    _load_timings = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -74,21 +151,13 @@ class ModelService:
 
             print(f"Loading model from: {model_path}")
             
-            # Initialize model
-            self._model = CNNModel().to(self._device)
-            
-            # Load state dict
-            state_dict = torch.load(model_path, map_location=self._device)
-            
-            # Handle different types of saved states
-            if isinstance(state_dict, dict):
-                if 'model_state_dict' in state_dict:
-                    state_dict = state_dict['model_state_dict']
-                elif 'state_dict' in state_dict:
-                    state_dict = state_dict['state_dict']
-
-            # Load the state dict
-            incompatible_keys = self._model.load_state_dict(state_dict, strict=False)
+            # Build the model and load the checkpoint
+            self._model, incompatible_keys, self._load_timings = load_cnn_model(model_path, self._device)
+            print(
+                f"Checkpoint loaded in {self._load_timings['load_ms']:.0f} ms, "
+                f"model constructed ({self._load_timings['construction']}) in "
+                f"{self._load_timings['construct_ms']:.0f} ms"
+            )
             
             # Print loading results
             if incompatible_keys.missing_keys:
@@ -112,6 +181,9 @@ class ModelService:
 
     def get_device(self):
         return self._device
+
+    def get_load_timings(self):
+        return self._load_timings
     
     def _download_model_from_s3(self):
         """Download model from S3 if in production environment"""
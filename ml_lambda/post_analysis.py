@@ -0,0 +1,152 @@
+import os
+
+import cold_start
+
+np = cold_start.lazy_import('numpy')
+skimage_segmentation = cold_start.lazy_import('skimage.segmentation')
+
+# SLIC superpixels the attributions are summarised over. The statistics below
+# are a few bincounts over the label map, so their cost grows with the number
+# of pixels, not with segments x pixels.
+SLIC_SEGMENTS = int(os.environ.get('SHAP_SLIC_SEGMENTS', 20))
+TOP_SUPERPIXELS = 5
+
+# Index of each quadrant in quadrant_stats, by (lower half, right half)
+QUADRANTS = ('upper_left', 'upper_right', 'lower_left', 'lower_right')
+
+
+def segment(image_gray, n_segments=None):
+    """
+    Args:
+        image_gray: 2-D image in [0, 1]
+        n_segments: Approximate superpixel count, default SLIC_SEGMENTS
+
+    Returns:
+        ndarray: (H, W) int labels starting at 0
+    """
+    return skimage_segmentation.slic(image_gray, n_segments=n_segments or SLIC_SEGMENTS, compactness=20,
+                                     sigma=1, start_label=0, channel_axis=None)
+
+
+def superpixel_stats(labels, values=None):
+    """
+    Per-superpixel reductions of a 2-D map, one bincount each
+
+    Args:
+        labels: (H, W) superpixel labels
+        values: Optional (H, W) map to sum and average per superpixel
+
+    Returns:
+        dict: Arrays indexed by label: counts, centroid_x, centroid_y and, with
+              values, sums and means. Labels without pixels get a mean of 0 and
+              a NaN centroid.
+    """
+    flat = labels.ravel()
+    height, width = labels.shape
+    minlength = int(flat.max()) + 1
+    counts = np.bincount(flat, minlength=minlength)
+    # Row sums of x and y coordinates, without materialising np.indices
+    sum_x = np.bincount(flat, weights=np.tile(np.arange(width, dtype=np.float64), height), minlength=minlength)
+    sum_y = np.bincount(flat, weights=np.repeat(np.arange(height, dtype=np.float64), width), minlength=minlength)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats = {
+            'counts': counts,
+            'centroid_x': sum_x / counts,
+            'centroid_y': sum_y / counts,
+        }
+        if values is not None:
+            sums = np.bincount(flat, weights=np.asarray(values, dtype=np.float64).ravel(), minlength=minlength)
+            stats['sums'] = sums
+            stats['means'] = np.where(counts > 0, sums / counts, 0.0)
+    return stats
+
+
+def centroids(labels, indices, stats=None):
+    """(x, y) centroid of each superpixel in ``indices``, or None if it has no pixels"""
+    if stats is None:
+        stats = superpixel_stats(labels)
+    counts = stats['counts']
+    result = []
+    for sp in indices:
+        sp = int(sp)
+        if sp < len(counts) and counts[sp] > 0:
+            result.append((float(stats['centroid_x'][sp]), float(stats['centroid_y'][sp])))
+        else:
+            result.append(None)
+    return result
+
+
+def quadrant_stats(mean_shap):
+    """
+    Mean and share of total |importance| for each image quadrant
+
+    Returns:
+        tuple: (quadrant_scores, relative_importances), both keyed by QUADRANTS
+    """
+    height, width = mean_shap.shape
+    quadrant = ((np.arange(height) >= height // 2)[:, None] * 2 + (np.arange(width) >= width // 2)[None, :]).ravel()
+    values = np.asarray(mean_shap, dtype=np.float64).ravel()
+    counts = np.bincount(quadrant, minlength=4)
+    sums = np.bincount(quadrant, weights=values, minlength=4)
+    abs_sums = np.bincount(quadrant, weights=np.abs(values), minlength=4)
+    total = float(abs_sums.sum())
+
+    scores = {name: float(sums[i] / counts[i]) for i, name in enumerate(QUADRANTS)}
+    relative = {name: float(abs_sums[i]) / total for i, name in enumerate(QUADRANTS)}
+    return scores, relative
+
+
+def summarize(attributions, mean_shap, labels, top_k=TOP_SUPERPIXELS):
+    """
+    Everything under result['analysis'], computed from the attribution maps
+
+    Args:
+        attributions: (H, W, 3) attributions for the explained class
+        mean_shap: (H, W) mean |attribution| heatmap
+        labels: (H, W) superpixel labels
+        top_k: Number of superpixels to report
+
+    Returns:
+        tuple: (analysis dict, top superpixel labels most important first)
+    """
+    stats = superpixel_stats(labels, attributions.mean(axis=2))
+    top_indices = np.argsort(stats['means'])[-top_k:][::-1]
+
+    quadrant_scores, relative_importances = quadrant_stats(mean_shap)
+    most_important_quadrant = max(quadrant_scores.items(), key=lambda x: x[1])[0]
+
+    analysis = {
+        'most_important_quadrant': most_important_quadrant,
+        'quadrant_scores': quadrant_scores,
+        'relative_importances': relative_importances,
+        'stability_score': float(1 - (np.std(mean_shap) / (np.mean(mean_shap) + 1e-7))),
+        'importance_score': float(np.mean(np.abs(mean_shap))),
+        'superpixel_analysis': {
+            'num_superpixels': len(stats['counts']),
+            'top_superpixels': [int(idx) for idx in top_indices],
+            'top_shap_scores': stats['means'][top_indices].tolist()
+        }
+    }
+    return analysis, top_indices
+
+
+def agreement(attributions, reference, labels, top_k=TOP_SUPERPIXELS):
+    """
+    How closely one attribution map matches a reference run, for the benchmarks
+
+    Returns:
+        dict: Pearson correlation of the per-pixel maps and the overlap of the
+              top superpixels the analysis reports
+    """
+    a = attributions.mean(axis=2)
+    b = reference.mean(axis=2)
+    correlation = float(np.corrcoef(a.ravel(), b.ravel())[0, 1]) if a.std() > 0 and b.std() > 0 else 0.0
+
+    def top(values):
+        return set(np.argsort(superpixel_stats(labels, values)['means'])[-top_k:].tolist())
+
+    return {
+        'pixel_correlation': correlation,
+        'top_superpixel_overlap': len(top(a) & top(b)) / top_k,
+    }
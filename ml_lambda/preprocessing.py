@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import time
+
+import cold_start
+
+np = cold_start.lazy_import('numpy')
+torch = cold_start.lazy_import('torch')
+
+# ImageNet statistics the model was trained with
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Hand the model NCHW views of NHWC memory (torch.channels_last) instead of
+# copying every batch into contiguous NCHW
+CHANNELS_LAST = os.environ.get('SHAP_CHANNELS_LAST', 'true').lower() in ('1', 'true', 'yes')
+
+
+class BatchNormalizer:
+    """
+    Turns (N, H, W, C) float batches in [0, 1] into normalized (N, C, H, W)
+    tensors with one broadcasted multiply-add.
+
+    The result is written into a buffer that is kept between calls and only
+    grows, so the explainer's repeated batches do not allocate. The returned
+    tensor is a view of that buffer: use it before the next call, and keep
+    one normalizer per service rather than sharing it between threads.
+    """
+
+    def __init__(self, mean=IMAGENET_MEAN, std=IMAGENET_STD, channels_last=None):
+        self.channels_last = CHANNELS_LAST if channels_last is None else channels_last
+        std = torch.tensor(std, dtype=torch.float32)
+        # (x - mean) / std == x * (1 / std) + (-mean / std), broadcast over the channel axis
+        self.scale = (1.0 / std).view(1, 1, 1, -1)
+        self.shift = (-torch.tensor(mean, dtype=torch.float32) / std).view(1, 1, 1, -1)
+        self._buffer = None
+
+    def _buffer_for(self, shape):
+        if self._buffer is None or self._buffer.shape[1:] != shape[1:] or self._buffer.shape[0] < shape[0]:
+            self._buffer = torch.empty(shape, dtype=torch.float32)
+        return self._buffer[:shape[0]]
+
+    def __call__(self, batch):
+        """
+        Args:
+            batch: (N, H, W, C) array or tensor in [0, 1]
+
+        Returns:
+            torch.Tensor: (N, C, H, W) normalized; channels_last in memory unless
+                          disabled, in which case it is a contiguous copy
+        """
+        x = torch.as_tensor(np.asarray(batch, dtype=np.float32))
+        out = self._buffer_for(tuple(x.shape))
+        torch.addcmul(self.shift, x, self.scale, out=out)
+        out = out.permute(0, 3, 1, 2)
+        return out if self.channels_last else out.contiguous()
+
+
+def prepare_model(model, channels_last=None):
+    """Store conv weights channels_last to match BatchNormalizer output, in place"""
+    if CHANNELS_LAST if channels_last is None else channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+def _stacked_normalize(x):
+    """The previous model_pipeline preprocessing, as the benchmark baseline"""
+    transforms = cold_start.import_module('torchvision.transforms')
+    x = torch.Tensor(x).permute(0, 3, 1, 2)
+    normalize = transforms.Normalize(mean=list(IMAGENET_MEAN), std=list(IMAGENET_STD))
+    return torch.stack([normalize(img) for img in x])
+
+
+def _time(fn, runs):
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch preprocessing against per-image Normalize')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 5, 25])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--weights', help='model.pth to time a forward pass with each memory format')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = {}
+    for batch_size in args.batch_sizes:
+        batch = rng.random((batch_size, 224, 224, 3), dtype=np.float32)
+        normalizer = BatchNormalizer(channels_last=True)
+        contiguous = BatchNormalizer(channels_last=False)
+        report[batch_size] = {
+            'stacked_ms': _time(lambda: _stacked_normalize(batch), args.runs),
+            'channels_last_ms': _time(lambda: normalizer(batch), args.runs),
+            'contiguous_ms': _time(lambda: contiguous(batch), args.runs),
+            'max_abs_diff': float((normalizer(batch) - _stacked_normalize(batch)).abs().max()),
+        }
+
+    if args.weights:
+        model_service = cold_start.import_module('model_service')
+        model, _, _ = model_service.load_cnn_model(args.weights, torch.device('cpu'))
+        batch = rng.random((max(args.batch_sizes), 224, 224, 3), dtype=np.float32)
+        with torch.no_grad():
+            contiguous_ms = _time(lambda: model(BatchNormalizer(channels_last=False)(batch)), 3)
+            model = prepare_model(model, channels_last=True)
+            normalizer = BatchNormalizer(channels_last=True)
+            channels_last_ms = _time(lambda: model(normalizer(batch)), 3)
+        report['forward'] = {
+            'batch_size': len(batch),
+            'contiguous_ms': contiguous_ms,
+            'channels_last_ms': channels_last_ms,
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
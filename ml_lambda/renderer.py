@@ -0,0 +1,303 @@
+import argparse
+import io
+import json
+import os
+import time
+import tracemalloc
+
+import cold_start
+import post_analysis
+
+np = cold_start.lazy_import('numpy')
+Image = cold_start.lazy_import('PIL.Image')
+ImageDraw = cold_start.lazy_import('PIL.ImageDraw')
+ImageFont = cold_start.lazy_import('PIL.ImageFont')
+
+# Output of the visualization, see render_panels
+RENDER_PANEL_SIZE = int(os.environ.get('SHAP_RENDER_PANEL_SIZE', 448))
+RENDER_FORMAT = os.environ.get('SHAP_RENDER_FORMAT', 'png').lower()
+RENDER_QUALITY = int(os.environ.get('SHAP_RENDER_QUALITY', 90))
+
+FORMATS = {
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+
+# ColorBrewer RdBu anchors, low to high, as used by matplotlib's 'RdBu_r'
+# (a linear segmented colormap over these 11 colors)
+_RDBU_R_ANCHORS = [
+    (5, 48, 97), (33, 102, 172), (67, 147, 195), (146, 197, 222), (209, 229, 240),
+    (247, 247, 247),
+    (253, 219, 199), (244, 165, 130), (214, 96, 77), (178, 24, 43), (103, 0, 31),
+]
+_lut = None
+
+TITLES = (
+    "Original Image",
+    "SHAP Importance Heatmap",
+    "Overlay of Image and SHAP Values",
+    "Top Superpixels for Aneurysm",
+)
+OVERLAY_ALPHA = 0.6
+BOUNDARY_COLOR = (255, 0, 0)
+
+
+def colormap_lut():
+    """256 x 3 uint8 lookup table for RdBu_r, built once per container"""
+    global _lut
+    if _lut is None:
+        anchors = np.asarray(_RDBU_R_ANCHORS, dtype=np.float64)
+        positions = np.linspace(0.0, 1.0, len(anchors))
+        x = np.linspace(0.0, 1.0, 256)
+        _lut = np.stack(
+            [np.interp(x, positions, anchors[:, c]) for c in range(3)], axis=1
+        ).round().astype(np.uint8)
+    return _lut
+
+
+def apply_colormap(values, vmin, vmax):
+    """Map ``values`` to RGB through the LUT, clipping to [vmin, vmax]"""
+    scale = (vmax - vmin) or 1.0
+    index = np.clip((values - vmin) / scale * 255.0, 0, 255).astype(np.uint8)
+    return colormap_lut()[index]
+
+
+def _resize_nearest(array, size):
+    """Nearest-neighbour upscale of an H x W (x C) array to size x size"""
+    h, w = array.shape[:2]
+    rows = np.arange(size) * h // size
+    cols = np.arange(size) * w // size
+    return array[rows[:, None], cols[None, :]]
+
+
+def _to_uint8_rgb(image_rgb):
+    image = np.asarray(image_rgb)
+    if image.dtype != np.uint8:
+        image = np.clip(image, 0, 255).astype(np.uint8)
+    if image.ndim == 2:
+        image = np.repeat(image[:, :, None], 3, axis=2)
+    return image
+
+
+def _boundaries(labels):
+    """Pixels whose right or lower neighbour belongs to another superpixel"""
+    edges = np.zeros(labels.shape, dtype=bool)
+    horizontal = labels[:, 1:] != labels[:, :-1]
+    vertical = labels[1:, :] != labels[:-1, :]
+    edges[:, 1:] |= horizontal
+    edges[:, :-1] |= horizontal
+    edges[1:, :] |= vertical
+    edges[:-1, :] |= vertical
+    return edges
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def _tick_label(value, value_range):
+    # Float noise next to a real range prints as 0, like matplotlib's ticks
+    if value_range and abs(value) < abs(value_range) * 1e-6:
+        value = 0.0
+    return f"{value:.3g}"
+
+
+def _heatmap_panel(mean_shap, size, colorbar_width):
+    """
+    Seaborn-style heatmap: cells drawn as blocks and the scale centred on 0,
+    plus a colorbar strip on the right
+    """
+    vmin, vmax = float(np.min(mean_shap)), float(np.max(mean_shap))
+    bound = max(abs(vmin), abs(vmax)) or 1.0
+    panel = np.full((size, size + colorbar_width, 3), 255, dtype=np.uint8)
+    heatmap_size = size
+    panel[:, :heatmap_size] = apply_colormap(_resize_nearest(mean_shap, heatmap_size), -bound, bound)
+
+    # Colorbar covers only the data range, like seaborn's with center=0
+    bar_left = heatmap_size + colorbar_width // 4
+    bar_right = heatmap_size + colorbar_width // 2
+    gradient = np.linspace(vmax, vmin, size)[:, None]
+    panel[:, bar_left:bar_right] = apply_colormap(gradient, -bound, bound)
+    return panel, (vmin, vmax), (bar_right, heatmap_size)
+
+
+def render_panels(image_rgb, mean_shap, labels, top_indices, panel_size=None, fmt=None, quality=None):
+    """
+    Composite the original, heatmap, overlay and superpixel panels into one image.
+
+    Equivalent to the matplotlib figure the service used to draw, but built
+    directly as a uint8 array: colormaps go through a precomputed LUT and
+    superpixel boundaries and centroids are vectorized.
+
+    Args:
+        image_rgb: H x W x 3 image the analysis ran on
+        mean_shap: H x W attribution magnitudes
+        labels: H x W superpixel labels
+        top_indices: Superpixel IDs to number, most important first
+        panel_size: Side of each panel in pixels (SHAP_RENDER_PANEL_SIZE)
+        fmt: 'png' or 'webp' (SHAP_RENDER_FORMAT)
+        quality: WebP quality (SHAP_RENDER_QUALITY)
+
+    Returns:
+        tuple: (encoded bytes, content type, file extension)
+    """
+    panel_size = int(panel_size or RENDER_PANEL_SIZE)
+    fmt = (fmt or RENDER_FORMAT).lower()
+    quality = int(quality or RENDER_QUALITY)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown render format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+    image = _to_uint8_rgb(image_rgb)
+    mean_shap = np.asarray(mean_shap, dtype=np.float32)
+    labels = np.asarray(labels)
+
+    font_size = max(panel_size // 24, 10)
+    title_height = font_size * 2
+    margin = max(panel_size // 20, 8)
+    colorbar_width = max(panel_size // 6, 40)
+    widths = [panel_size, panel_size + colorbar_width, panel_size, panel_size]
+    canvas_width = sum(widths) + margin * (len(widths) + 1)
+    canvas_height = title_height + panel_size + margin * 2
+    canvas = np.full((canvas_height, canvas_width, 3), 255, dtype=np.uint8)
+
+    image_big = np.asarray(Image.fromarray(image).resize((panel_size, panel_size), Image.BILINEAR))
+
+    # Overlay: imshow(image) then imshow(mean_shap, alpha=0.6), min-max scaled
+    shap_big = _resize_nearest(mean_shap, panel_size)
+    shap_colors = apply_colormap(shap_big, float(shap_big.min()), float(shap_big.max()))
+    overlay = (image_big * (1.0 - OVERLAY_ALPHA) + shap_colors * OVERLAY_ALPHA).astype(np.uint8)
+
+    # Superpixels with red boundaries, computed at output resolution
+    labels_big = _resize_nearest(labels, panel_size)
+    superpixels = image_big.copy()
+    superpixels[_boundaries(labels_big)] = BOUNDARY_COLOR
+
+    heatmap, (vmin, vmax), (bar_right, _) = _heatmap_panel(mean_shap, panel_size, colorbar_width)
+
+    top = margin + title_height
+    lefts = []
+    left = margin
+    for panel, width in zip((image_big, heatmap, overlay, superpixels), widths):
+        canvas[top:top + panel_size, left:left + width] = panel
+        lefts.append(left)
+        left += width + margin
+
+    result = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(result, 'RGBA')
+    font = _font(font_size)
+
+    for title, left, width in zip(TITLES, lefts, widths):
+        text_width = draw.textlength(title, font=font)
+        draw.text((left + (panel_size - text_width) / 2, margin), title, fill=(0, 0, 0), font=font)
+
+    # Colorbar range labels
+    small_font = _font(max(font_size * 3 // 4, 8))
+    bar_x = lefts[1] + bar_right + 4
+    draw.text((bar_x, top), _tick_label(vmax, vmax - vmin), fill=(0, 0, 0), font=small_font)
+    draw.text((bar_x, top + panel_size - font_size), _tick_label(vmin, vmax - vmin), fill=(0, 0, 0), font=small_font)
+
+    # Numbered boxes at the centroids of the top superpixels
+    scale = panel_size / labels.shape[1], panel_size / labels.shape[0]
+    for rank, centroid in enumerate(post_analysis.centroids(labels, top_indices)):
+        if centroid is None:
+            continue
+        x = lefts[3] + int(centroid[0] * scale[0])
+        y = top + int(centroid[1] * scale[1])
+        text = str(rank + 1)
+        box = draw.textbbox((x, y), text, font=font)
+        pad = max(font_size // 4, 2)
+        draw.rectangle((box[0] - pad, box[1] - pad, box[2] + pad, box[3] + pad), fill=(255, 0, 0, 128))
+        draw.text((x, y), text, fill=(255, 255, 255), font=font)
+
+    pil_format, content_type = FORMATS[fmt]
+    buf = io.BytesIO()
+    if fmt == 'webp':
+        result.save(buf, format=pil_format, quality=quality, method=4)
+    else:
+        result.save(buf, format=pil_format, optimize=False)
+    return buf.getvalue(), content_type, fmt
+
+
+def _synthetic_inputs(image_path=None, n_segments=20):
+    if image_path:
+        with Image.open(image_path) as img:
+            image = np.asarray(img.convert('RGB').resize((224, 224)))
+    else:
+        rng = np.random.default_rng(0)
+        image = (rng.random((224, 224, 3)) * 255).astype(np.uint8)
+
+    ys, xs = np.mgrid[0:224, 0:224]
+    mean_shap = np.exp(-((xs - 140) ** 2 + (ys - 90) ** 2) / 900.0) * 0.02
+
+    try:
+        from skimage.segmentation import slic
+        labels = slic(image, n_segments=n_segments, compactness=20, sigma=1, start_label=0)
+    except ImportError:
+        side = int(np.ceil(np.sqrt(n_segments)))
+        labels = (ys * side // 224) * side + (xs * side // 224)
+
+    sums = np.bincount(labels.ravel(), weights=mean_shap.ravel())
+    counts = np.bincount(labels.ravel())
+    top_indices = np.argsort(sums / np.maximum(counts, 1))[-5:][::-1]
+    return image, mean_shap, labels, top_indices
+
+
+def _measure(fn, runs):
+    fn()  # warm up imports and caches
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(runs):
+        output = fn()
+    elapsed = (time.perf_counter() - start) * 1000 / runs
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    data = output[0]
+    with Image.open(io.BytesIO(data)) as img:
+        size = img.size
+    return {
+        'mean_ms': elapsed,
+        'bytes': len(data),
+        'dimensions': list(size),
+        'python_peak_mb': peak / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the NumPy/PIL renderer against the matplotlib figure')
+    parser.add_argument('--image', help='Image to render (defaults to random noise)')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--panel-size', type=int, default=RENDER_PANEL_SIZE)
+    parser.add_argument('--format', default=RENDER_FORMAT, choices=sorted(FORMATS))
+    parser.add_argument('--output', help='Directory to write both renderings to for visual comparison')
+    args = parser.parse_args()
+
+    inputs = _synthetic_inputs(args.image)
+    report = {
+        'numpy': _measure(lambda: render_panels(*inputs, panel_size=args.panel_size, fmt=args.format), args.runs),
+    }
+
+    try:
+        from shap_service import ShapAnalysisService
+        report['matplotlib'] = _measure(lambda: ShapAnalysisService.render_matplotlib(*inputs), args.runs)
+        report['speedup'] = report['matplotlib']['mean_ms'] / report['numpy']['mean_ms']
+    except ImportError as e:
+        report['matplotlib'] = f"unavailable: {str(e)}"
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        data, _, ext = render_panels(*inputs, panel_size=args.panel_size, fmt=args.format)
+        with open(os.path.join(args.output, f'numpy.{ext}'), 'wb') as f:
+            f.write(data)
+        if isinstance(report['matplotlib'], dict):
+            with open(os.path.join(args.output, 'matplotlib.png'), 'wb') as f:
+                f.write(ShapAnalysisService.render_matplotlib(*inputs)[0])
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
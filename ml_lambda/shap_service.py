@@ -1,68 +1,114 @@
-import shap
-import numpy as np
-import torch
-from torchvision import transforms
-import requests
-import cv2
+import copy
 from datetime import datetime
-from PIL import Image
+import hashlib
 import io
-import matplotlib.pyplot as plt
-import seaborn as sns
-import boto3
-from botocore.exceptions import ClientError
 import os
-from skimage.segmentation import slic, mark_boundaries
-from skimage.color import rgb2gray
+import time
+
+import artifacts
+import batch_tuner
+import cold_start
+import explainers
+import post_analysis
+import preprocessing
+import presets
+import renderer
+
+# Heavy dependencies are imported on first use so a bad event is rejected
+# before torch, shap or OpenCV load; their import times land in the
+# cold-start report.
+shap = cold_start.lazy_import('shap')
+np = cold_start.lazy_import('numpy')
+torch = cold_start.lazy_import('torch')
+requests = cold_start.lazy_import('requests')
+cv2 = cold_start.lazy_import('cv2')
+plt = cold_start.lazy_import('matplotlib.pyplot')
+sns = cold_start.lazy_import('seaborn')
+boto3 = cold_start.lazy_import('boto3')
+botocore_exceptions = cold_start.lazy_import('botocore.exceptions')
+skimage_segmentation = cold_start.lazy_import('skimage.segmentation')
+skimage_color = cold_start.lazy_import('skimage.color')
+model_cache = cold_start.lazy_import('model_cache')
+Image = cold_start.lazy_import('PIL.Image')
+
+# 'numpy' (default) composites panels directly; 'matplotlib' draws the old figure
+RENDERER = os.environ.get('SHAP_RENDERER', 'numpy').lower()
 
 
 # Set matplotlib to use /tmp directory
 os.environ['MPLCONFIGDIR'] = '/tmp'
+# Headless backend, picked up whenever pyplot is first imported
+os.environ.setdefault('MPLBACKEND', 'Agg')
 # Set other temp directories
 os.environ['TMPDIR'] = '/tmp'
 os.environ['HOME'] = '/tmp'
 
-from model_service import CNNModel
+
+def __getattr__(name):
+    # CNNModel stays importable from here without loading torch up front
+    if name == 'CNNModel':
+        return cold_start.import_module('model_service').CNNModel
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class ShapAnalysisService:
     def __init__(self):
-        import matplotlib
-        matplotlib.use('Agg')
         # Force CPU for Lambda
         self.device = torch.device('cpu')
-        self.model = CNNModel().to(self.device)
         
         # Initialize S3 client
         self.s3_client = boto3.client('s3')
         self.model_bucket = 'pytorch-model-mcs09'
         self.output_bucket = 'mcs09-bucket'
         
-        # Download model from S3 to Lambda's temporary storage
-        model_path = '/tmp/model.pth'
-        self.s3_client.download_file(
-            self.model_bucket, 
-            'model.pth', 
-            model_path
+        # Reuse the warm-container model unless the artifact changed in S3
+        start = time.perf_counter()
+        self.model, self.model_info = model_cache.get_model(
+            self.s3_client,
+            self.model_bucket,
+            'model.pth',
+            self.device,
+            quantization=os.environ.get('SHAP_QUANTIZATION', 'none'),
+            calibration_dir=os.environ.get('SHAP_QUANT_CALIBRATION_DIR')
         )
-        
-        # Load the model state
-        state_dict = torch.load(model_path, map_location=self.device)
-        
-        # Handle different state dict formats
-        if isinstance(state_dict, dict):
-            if 'model_state_dict' in state_dict:
-                state_dict = state_dict['model_state_dict']
-            elif 'state_dict' in state_dict:
-                state_dict = state_dict['state_dict']
-        
-        self.model.load_state_dict(state_dict, strict=False)
-        self.model.eval()
-        
-        # Clean up temporary file
-        if os.path.exists(model_path):
-            os.remove(model_path)
+        cold_start.record_phase('model_cache', (time.perf_counter() - start) * 1000)
+        self.load_timings = self.model_info['load_timings']
+        if self.model_info.get('cache') == 'miss' and self.load_timings:
+            cold_start.record_phase('model_build', self.load_timings.get('construct_ms'))
+            cold_start.record_phase('weight_load', self.load_timings.get('load_ms'))
 
-    def save_to_s3(self, image_data, user_id, image_name, request_id=None):
+        self.model = preprocessing.prepare_model(self.model)
+        self.preprocess = preprocessing.BatchNormalizer()
+
+        # Explainer batch size for this model on this container, see batch_tuner
+        self.batch_size, self.batch_tuning = batch_tuner.get_batch_size(
+            self.run_batch,
+            self.model_info.get('version'),
+            quantization=(self.model_info.get('quantization') or {}).get('mode'),
+            s3_client=self.s3_client,
+            bucket=self.output_bucket
+        )
+
+    @classmethod
+    def offline(cls, weights=None):
+        """
+        A service around model.pth from ``weights`` (or an untrained CNNModel
+        when only timing matters), without S3, for the benchmarks
+        """
+        model_service = cold_start.import_module('model_service')
+        if weights:
+            model, _, _ = model_service.load_cnn_model(weights, torch.device('cpu'))
+        else:
+            torch.manual_seed(0)
+            model = model_service.CNNModel().eval()
+
+        service = cls.__new__(cls)
+        service.model = preprocessing.prepare_model(model)
+        service.preprocess = preprocessing.BatchNormalizer()
+        service.batch_size, service.batch_tuning = None, {'source': 'preset'}
+        return service
+
+    def save_to_s3(self, image_data, user_id, image_name, request_id=None, content_type='image/png'):
         """
         Save image to S3 bucket under the request path structure
         
@@ -71,6 +117,7 @@ class ShapAnalysisService:
             user_id: The user's ID
             image_name: Name of the image file
             request_id: Optional request ID for organizing files
+            content_type: MIME type of image_data
         """
         try:
             # If request_id is provided, use the requests path structure
@@ -84,209 +131,330 @@ class ShapAnalysisService:
                 Bucket=self.output_bucket,
                 Key=key,
                 Body=image_data,
-                ContentType='image/png'
+                ContentType=content_type
             )
             return f"https://{self.output_bucket}.s3.amazonaws.com/{key}"
-        except ClientError as e:
+        except botocore_exceptions.ClientError as e:
             print(f"Error saving to S3: {str(e)}")
             return None
 
-    def analyze_image(self, image_url, user_id, request_id):
-        try:
-            start_time = datetime.utcnow()
-            print(f"Analysis started at {start_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
-            print(f"Analysis requested by: krooldonutz")
-            
-            # Image loading and preprocessing
-            response = requests.get(image_url)
-            if response.status_code != 200:
-                raise Exception("Could not download image from URL")
-
-            image_pil = Image.open(io.BytesIO(response.content))
-            image = np.array(image_pil)
-
-            is_grayscale = len(image.shape) == 2 or (len(image.shape) == 3 and image.shape[2] == 1)
-            if is_grayscale:
-                if len(image.shape) == 3:
-                    image = image.squeeze(-1)
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-            else:
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            image_rgb = cv2.resize(image_rgb, (224, 224))
-            image_normalized = (image_rgb - np.min(image_rgb)) / (np.max(image_rgb) - np.min(image_rgb) + 1e-7)
-            image_normalized = image_normalized.astype(np.float32)
-            # image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            # image = cv2.resize(image, (224, 224))
-            # image = (image - np.min(image)) / (np.max(image) - np.min(image) + 1e-7)
-            # image = image.astype(np.float32)
-
-            # Prepare grayscale image for superpixel segmentation
-            if is_grayscale:
-                image_gray = cv2.resize(image, (224, 224))
-                image_gray = (image_gray - np.min(image_gray)) / (np.max(image_gray) - np.min(image_gray) + 1e-7)
-            else:
-                image_gray = rgb2gray(image_normalized)
-
-            # SHAP analysis
-            masker = shap.maskers.Image("inpaint_telea", (224, 224, 3))
-
-            def model_pipeline(x):
-                x = torch.Tensor(x).permute(0, 3, 1, 2)
-                normalize = transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-                x = torch.stack([normalize(img) for img in x])
-                with torch.no_grad():
-                    x = x.to(next(self.model.parameters()).device)
-                    output = self.model(x)
-                    probs = torch.nn.functional.softmax(output, dim=1)
-                return probs.cpu().numpy()
-
-            print("Analyzing the image with SHAP...")
-            explainer = shap.Explainer(model=model_pipeline, masker=masker)
-            shap_values = explainer(
-                np.expand_dims(image_normalized, 0),
-                max_evals=70,
-                batch_size=5,
-                outputs=shap.Explanation.argsort.flip[:1]
-            )
+    @staticmethod
+    def render_matplotlib(image_rgb, mean_shap, labels, top_indices):
+        """
+        The original 20x5 inch, 300 dpi matplotlib/seaborn figure.
 
-            # Model prediction
-            transform = transforms.Compose([
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-            ])
-            
-            image_tensor = transform(Image.fromarray((image_normalized * 255).astype(np.uint8)))
-            image_tensor = image_tensor.unsqueeze(0).to(next(self.model.parameters()).device)
-
-            with torch.no_grad():
-                output = self.model(image_tensor)
-                probs = torch.nn.functional.softmax(output, dim=1)
-                pred = torch.argmax(probs, dim=1).item()
-                conf = probs[0][pred].item()
-
-            # Analysis calculations
-            shap_abs = np.abs(shap_values.values)
-            mean_shap = np.mean(shap_abs, axis=(0, -1))
-            if len(mean_shap.shape) > 2:
-                mean_shap = np.mean(mean_shap, axis=-1)
-
-            labels = slic(image_gray, n_segments=20, compactness=20, sigma=1, start_label=0, channel_axis=None)
-            num_superpixels = np.max(labels) + 1
-            shap_vals_aneurysm = shap_values.values[0, :, :, :, 0].mean(axis=2)  # Use class 0 or 1 based on pred
-            shap_per_superpixel = np.zeros(num_superpixels)
-            for sp in range(num_superpixels):
-                mask = labels == sp
-                if mask.sum() > 0:
-                    shap_per_superpixel[sp] = shap_vals_aneurysm[mask].mean()
-            top_indices = np.argsort(shap_per_superpixel)[-5:][::-1]
-            top_shap_scores = shap_per_superpixel[top_indices].tolist()
-
-            # Generate visualizations
-            plt.figure(figsize=(20, 5))
-            
-            # Original image
-            plt.subplot(1, 4, 1)
-            plt.imshow(image_rgb)
-            plt.title("Original Image")
-            plt.axis('off')
-            
-            # SHAP heatmap
-            plt.subplot(1, 4, 2)
-            sns.heatmap(mean_shap, cmap='RdBu_r', center=0)
-            plt.title("SHAP Importance Heatmap")
-            plt.axis('off')
-            
-            # Overlay
-            plt.subplot(1, 4, 3)
-            plt.imshow(image_rgb)
-            plt.imshow(mean_shap, cmap='RdBu_r', alpha=0.6)
-            plt.title("Overlay of Image and SHAP Values")
-            plt.axis('off')
-            
-            # Superpixel highlight plot
-            plt.subplot(1, 4, 4)
-            boundary_img = mark_boundaries(image_rgb / 255.0, labels, color=(1, 0, 0))
-            plt.imshow(boundary_img)
-            for idx, sp in enumerate(top_indices):
-                mask = labels == sp
-                y, x = np.where(mask)
-                if len(x) > 0 and len(y) > 0:
-                    centroid = (int(np.mean(x)), int(np.mean(y)))
-                    plt.text(centroid[0], centroid[1], str(idx + 1), color='white', fontsize=12,
-                             bbox=dict(facecolor='red', alpha=0.5))
-            plt.title("Top Superpixels for Aneurysm")
-            plt.axis('off')
-
-            # Save plot to s3
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-            buf.seek(0)
+        Kept for SHAP_RENDERER=matplotlib and as the baseline in renderer.py's
+        benchmark.
 
-            # Generate unique filename using timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            image_name = f'shap_analysis_{timestamp}.png'
-            
-            # Save to S3 and get URL
-            s3_url = self.save_to_s3(buf, user_id, image_name, request_id)
-            plt.close()
-
-            # Quadrant analysis
-            h, w = mean_shap.shape
-            quadrants = {
-                'upper_left': mean_shap[:h//2, :w//2],
-                'upper_right': mean_shap[:h//2, w//2:],
-                'lower_left': mean_shap[h//2:, :w//2],
-                'lower_right': mean_shap[h//2:, w//2:]
-            }
-            
-            quadrant_scores = {k: float(np.mean(v)) for k, v in quadrants.items()}
-            most_important_quadrant = max(quadrant_scores.items(), key=lambda x: x[1])[0]
+        Returns:
+            tuple: (PNG bytes, content type, file extension)
+        """
+        plt.figure(figsize=(20, 5))
+        
+        # Original image
+        plt.subplot(1, 4, 1)
+        plt.imshow(image_rgb)
+        plt.title("Original Image")
+        plt.axis('off')
+        
+        # SHAP heatmap
+        plt.subplot(1, 4, 2)
+        sns.heatmap(mean_shap, cmap='RdBu_r', center=0)
+        plt.title("SHAP Importance Heatmap")
+        plt.axis('off')
+        
+        # Overlay
+        plt.subplot(1, 4, 3)
+        plt.imshow(image_rgb)
+        plt.imshow(mean_shap, cmap='RdBu_r', alpha=0.6)
+        plt.title("Overlay of Image and SHAP Values")
+        plt.axis('off')
+        
+        # Superpixel highlight plot
+        plt.subplot(1, 4, 4)
+        boundary_img = skimage_segmentation.mark_boundaries(image_rgb / 255.0, labels, color=(1, 0, 0))
+        plt.imshow(boundary_img)
+        for idx, centroid in enumerate(post_analysis.centroids(labels, top_indices)):
+            if centroid is not None:
+                plt.text(int(centroid[0]), int(centroid[1]), str(idx + 1), color='white', fontsize=12,
+                         bbox=dict(facecolor='red', alpha=0.5))
+        plt.title("Top Superpixels for Aneurysm")
+        plt.axis('off')
 
-            # Calculate relative importances
-            total_importance = float(np.sum(np.abs(mean_shap)))
-            relative_importances = {k: float(np.sum(np.abs(v)))/total_importance 
-                                  for k, v in quadrants.items()}
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+        plt.close()
+        return buf.getvalue(), 'image/png', 'png'
 
-            end_time = datetime.utcnow()
-            analysis_duration = (end_time - start_time).total_seconds()
+    def analyze_image(self, image_url, user_id, request_id, on_analysis=None, preset=None, method=None):
+        """
+        Run an explanation (SHAP by default) in two stages.
+
+        The numeric stage (prediction, quadrant scores, superpixels, stability)
+        runs first. Its raw arrays are stored as attributions.npz and the
+        result is handed to ``on_analysis`` so the caller can persist it
+        before anything is drawn. The render stage then uploads the
+        visualization and fills in result['visualization'].
 
+        Args:
+            image_url: URL of the image to explain
+            user_id: Owner of the request, used for the S3 path
+            request_id: ID of the analysis request
+            on_analysis: Optional callable receiving a copy of the numeric result,
+                         whose visualization is still pending
+            preset: SHAP quality preset (see presets.PRESETS), default SHAP_DEFAULT_PRESET
+            method: Explanation method (see explainers.EXPLAINERS), default SHAP_DEFAULT_METHOD
+
+        Returns:
+            dict: The full result, or {'error', 'status': 'failed'} if the numeric
+                  stage failed. A failed render only marks the visualization failed.
+        """
+        try:
+            result, arrays = self.compute_analysis(image_url, request_id, preset=preset, method=method)
+            result['artifacts'] = {
+                'attributions': self.save_attributions(arrays, user_id, request_id)
+            }
+            if on_analysis is not None:
+                on_analysis(copy.deepcopy(result))
+        except Exception as e:
             return {
+                'error': str(e),
+                'status': 'failed'
+            }
+
+        start = time.perf_counter()
+        result['visualization'] = self.render_visualization(arrays, user_id, request_id)
+        result['metadata']['render_duration'] = time.perf_counter() - start
+        return result
+
+    def compute_analysis(self, image_url, request_id, preset=None, method=None):
+        """
+        Numeric stage: everything in the result except the visualization URL
+
+        Returns:
+            tuple: (result with visualization pending, arrays for
+                    save_attributions and render_visualization)
+        """
+        start_time = datetime.utcnow()
+        print(f"Analysis started at {start_time.strftime('%Y-%m-%d %H:%M:%S')} UTC")
+        print(f"Analysis requested by: krooldonutz")
+        
+        preset, shap_params = presets.resolve(preset)
+        if self.batch_size:
+            shap_params['batch_size'] = self.batch_size
+        explainer = explainers.create(method, self)
+
+        # Image loading and preprocessing
+        response = requests.get(image_url)
+        if response.status_code != 200:
+            raise Exception("Could not download image from URL")
+        image_rgb, image_normalized, image_gray = self.load_image(response.content)
+
+        print(f"Analyzing the image with {explainer.name} ({preset} preset)...")
+        attributions, probs = explainer.explain(image_normalized, shap_params)
+
+        # Model prediction, from the explainer's own evaluation of the image
+        pred = int(np.argmax(probs))
+        conf = float(probs[pred])
+
+        # Analysis calculations
+        mean_shap = np.mean(np.abs(attributions), axis=-1)
+        labels = post_analysis.segment(image_gray)
+        analysis, top_indices = post_analysis.summarize(attributions, mean_shap, labels)
+
+        end_time = datetime.utcnow()
+        analysis_duration = (end_time - start_time).total_seconds()
+
+        result = {
             'prediction': {
                 'result': 'aneurysm detected' if pred == 1 else 'no aneurysm detected',
                 'confidence': float(conf),
                 'confidence_level': "high" if conf > 0.8 else "moderate" if conf > 0.6 else "low"
             },
-            'analysis': {
-                'most_important_quadrant': most_important_quadrant,
-                'quadrant_scores': quadrant_scores,
-                'relative_importances': relative_importances,
-                'stability_score': float(1 - (np.std(mean_shap) / (np.mean(mean_shap) + 1e-7))),
-                'importance_score': float(np.mean(np.abs(mean_shap))),
-                'superpixel_analysis': {
-                        'num_superpixels': int(num_superpixels),
-                        'top_superpixels': [int(idx) for idx in top_indices],
-                        'top_shap_scores': top_shap_scores
-                }
-            },
+            'analysis': analysis,
             'metadata': {
                 'analysis_duration': analysis_duration,
                 'start_time': start_time.isoformat(),
-                'end_time': end_time.isoformat()
+                'end_time': end_time.isoformat(),
+                'model_version': self.model_info.get('version'),
+                'model_cache': self.model_info.get('cache'),
+                'quantization': (self.model_info.get('quantization') or {}).get('mode'),
+                'method': explainer.name,
+                'preset': preset,
+                'batch_size_source': self.batch_tuning['source'],
+                'shap_params': explainer.params(shap_params),
+                'cold_start': cold_start.report()
             },
+            # Filled in by render_visualization
             'visualization': {
-                'url': s3_url
+                'status': 'pending',
+                'url': None
             },
             'request_id': request_id
         }
+        arrays = {
+            'image_rgb': image_rgb,
+            'attributions': attributions,
+            'mean_shap': mean_shap,
+            'labels': labels,
+            'top_indices': top_indices
+        }
+        return result, arrays
+
+    @staticmethod
+    def load_image(image_bytes):
+        """
+        Decode and resize an image for the explainer
+
+        Returns:
+            tuple: (224x224 RGB uint8, RGB float32 scaled to [0, 1], grayscale
+                    in [0, 1] for superpixel segmentation)
+        """
+        image_pil = Image.open(io.BytesIO(image_bytes))
+        image = np.array(image_pil)
+
+        is_grayscale = len(image.shape) == 2 or (len(image.shape) == 3 and image.shape[2] == 1)
+        if is_grayscale:
+            if len(image.shape) == 3:
+                image = image.squeeze(-1)
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+        else:
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image_rgb = cv2.resize(image_rgb, (224, 224))
+        image_normalized = (image_rgb - np.min(image_rgb)) / (np.max(image_rgb) - np.min(image_rgb) + 1e-7)
+        image_normalized = image_normalized.astype(np.float32)
+        # image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # image = cv2.resize(image, (224, 224))
+        # image = (image - np.min(image)) / (np.max(image) - np.min(image) + 1e-7)
+        # image = image.astype(np.float32)
+
+        # Prepare grayscale image for superpixel segmentation
+        if is_grayscale:
+            image_gray = cv2.resize(image, (224, 224))
+            image_gray = (image_gray - np.min(image_gray)) / (np.max(image_gray) - np.min(image_gray) + 1e-7)
+        else:
+            image_gray = skimage_color.rgb2gray(image_normalized)
+
+        return image_rgb, image_normalized, image_gray
+
+    def run_batch(self, batch):
+        """One forward pass of an (N, 224, 224, 3) batch, bypassing the pipeline cache"""
+        with torch.no_grad():
+            return self.model(self.preprocess(batch).to(next(self.model.parameters()).device))
+
+    def model_pipeline(self):
+        """
+        Model callable for the explainer: (N, 224, 224, 3) images in [0, 1] to
+        (N, classes) probabilities.
+
+        Outputs are cached by input bytes for the life of the returned
+        callable, i.e. one analysis, so an image the explainer already
+        evaluated is never run through the model twice.
+        """
+        cache = {}
+
+        def pipeline(x):
+            x = np.asarray(x, dtype=np.float32)
+            keys = [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in x]
+            missing = [i for i, key in enumerate(keys) if key not in cache]
+            if missing:
+                batch = x if len(missing) == len(x) else x[missing]
+                with torch.no_grad():
+                    probs = torch.nn.functional.softmax(self.run_batch(batch), dim=1).cpu().numpy()
+                for i, row_probs in zip(missing, probs):
+                    cache[keys[i]] = row_probs
+            return np.stack([cache[key] for key in keys])
+
+        return pipeline
+
+    def explain(self, image_normalized, params):
+        """
+        Run the SHAP PartitionExplainer for the top class
+
+        Args:
+            image_normalized: (224, 224, 3) float32 image in [0, 1]
+            params: 'masker', 'max_evals' and 'batch_size', see presets.PRESETS
+
+        Returns:
+            tuple: (shap.Explanation with values of shape (1, 224, 224, 3, 1),
+                    class probabilities for the unmasked image)
+        """
+        masker = shap.maskers.Image(params['masker'], (224, 224, 3))
+        model_pipeline = self.model_pipeline()
+        explainer = shap.Explainer(model=model_pipeline, masker=masker)
+        shap_values = explainer(
+            np.expand_dims(image_normalized, 0),
+            max_evals=params['max_evals'],
+            batch_size=params['batch_size'],
+            outputs=shap.Explanation.argsort.flip[:1]
+        )
+        # The explainer evaluates the unmasked image to pick the class to
+        # explain, so this is answered from the cache
+        probs = model_pipeline(np.expand_dims(image_normalized, 0))[0]
+        return shap_values, probs
+
+    def save_attributions(self, arrays, user_id, request_id):
+        """
+        Store the attribution map and superpixel labels next to result.json,
+        so new views and metrics cost a read instead of another SHAP run
+
+        Returns:
+            dict: Where the .npz lives and how big it is, or None if the upload failed
+        """
+        data = artifacts.pack(arrays['attributions'], arrays['labels'], arrays['mean_shap'])
+        key = f'requests/{user_id}/{request_id}/{artifacts.FILE_NAME}'
+        try:
+            self.s3_client.put_object(
+                Bucket=self.output_bucket,
+                Key=key,
+                Body=data,
+                ContentType=artifacts.CONTENT_TYPE
+            )
+        except botocore_exceptions.ClientError as e:
+            print(f"Error saving SHAP attributions to S3: {str(e)}")
+            return None
+        return {
+            'key': key,
+            'bytes': len(data),
+            'shape': [int(n) for n in arrays['attributions'].shape],
+            'dtype': 'float16'
+        }
+
+    def render_visualization(self, arrays, user_id, request_id):
+        """
+        Render stage: draw the panels and upload them next to result.json
+
+        Returns:
+            dict: {'status': 'completed', 'url'} or {'status': 'failed', 'url': None, 'error'}
+        """
+        try:
+            panels = (arrays['image_rgb'], arrays['mean_shap'], arrays['labels'], arrays['top_indices'])
+            if RENDERER == 'matplotlib':
+                image_data, content_type, extension = self.render_matplotlib(*panels)
+            else:
+                image_data, content_type, extension = renderer.render_panels(*panels)
 
+            # Generate unique filename using timestamp
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            image_name = f'shap_analysis_{timestamp}.{extension}'
+
+            # Save to S3 and get URL
+            s3_url = self.save_to_s3(image_data, user_id, image_name, request_id, content_type=content_type)
         except Exception as e:
+            print(f"Error rendering SHAP visualization: {str(e)}")
             return {
-                'error': str(e),
-                'status': 'failed'
-            }
\ No newline at end of file
+                'status': 'failed',
+                'url': None,
+                'error': str(e)
+            }
+
+        if s3_url is None:
+            return {
+                'status': 'failed',
+                'url': None,
+                'error': 'Could not upload the visualization'
+            }
+        return {
+            'status': 'completed',
+            'url': s3_url
+        }
\ No newline at end of file
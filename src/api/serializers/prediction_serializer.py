@@ -1,13 +1,56 @@
+from django.conf import settings
 from rest_framework import serializers
 from models.image_prediction import ImagePrediction
 from models.user import User
+from ..service.prediction_service import SHAP_METHODS, SHAP_PRESETS
+
+
+class ShapOptionField(serializers.Field):
+    """
+    include_shap: true/false, or the name of a SHAP quality preset
+    ('fast', 'standard', 'thorough'); true runs SHAP_DEFAULT_PRESET
+    """
+    default_error_messages = {
+        'invalid': f"Must be a boolean or one of {', '.join(SHAP_PRESETS)}."
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data in SHAP_PRESETS:
+            return data
+        try:
+            return serializers.BooleanField().to_internal_value(data)
+        except serializers.ValidationError:
+            self.fail('invalid')
+
+    def to_representation(self, value):
+        return value
+
 
 class ImagePredictionSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    include_shap = serializers.BooleanField(default=False, write_only=True)
+    include_shap = ShapOptionField(default=False, write_only=True)
+    explanation_method = serializers.ChoiceField(choices=SHAP_METHODS, required=False, write_only=True)
     image_url = serializers.URLField(max_length=2000)  # Add max_length validation
 
     class Meta:
         model = ImagePrediction
-        fields = ['id', 'user', 'image_url', 'prediction', 'created_at', 'include_shap', 'shap_explanation']
-        read_only_fields = ['id', 'prediction', 'created_at', 'shap_explanation']
\ No newline at end of file
+        fields = ['id', 'user', 'image_url', 'prediction', 'created_at', 'include_shap', 'explanation_method',
+                  'shap_explanation']
+        read_only_fields = ['id', 'prediction', 'created_at', 'shap_explanation']
+
+class BatchImagePredictionSerializer(serializers.Serializer):
+    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    image_urls = serializers.ListField(
+        child=serializers.URLField(max_length=2000),
+        allow_empty=False,
+        max_length=getattr(settings, 'PREDICTION_BATCH_MAX_SIZE', 50)
+    )
+    include_shap = ShapOptionField(default=False)
+    explanation_method = serializers.ChoiceField(choices=SHAP_METHODS, required=False)
+
+
+class BatchPredictionResultSerializer(serializers.Serializer):
+    image_url = serializers.URLField()
+    status = serializers.ChoiceField(choices=['completed', 'failed'])
+    prediction = ImagePredictionSerializer(required=False)
+    error = serializers.CharField(required=False)
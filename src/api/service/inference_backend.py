@@ -0,0 +1,235 @@
+import json
+import threading
+import time
+import requests
+from django.conf import settings
+
+
+class InferenceBackend:
+    """
+    Common interface for prediction backends.
+
+    Every backend takes an image URL and returns the SageMaker endpoint's result
+    schema, so callers and the stored ImagePrediction.prediction column do not
+    care where inference ran:
+
+        {'prediction': str, 'confidence': float, 'probabilities': [...], 'metadata': {...}}
+    """
+    name = None
+
+    def predict(self, image_url, image_bytes=None):
+        """
+        Args:
+            image_url: URL of the image to classify
+            image_bytes: The image content, when the caller has already downloaded it
+        """
+        raise NotImplementedError
+
+    def model_version(self):
+        """
+        Identifies the model behind this backend; part of the prediction cache key.
+        None when the backend cannot tell, which turns the prediction cache off.
+        """
+        raise NotImplementedError
+
+
+class EndpointResolver:
+    """
+    TTL cache for a SageMaker control-plane lookup: the endpoint name, or the
+    config it currently runs.
+
+    ``fetch`` (list_endpoints, describe_endpoint) runs at most once per TTL.
+    Once a value is cached, an expired entry is still returned immediately while
+    a single background thread refreshes it; callers only block on the very
+    first lookup. A non-empty ``setting`` (SAGEMAKER_ENDPOINT_NAME for the name)
+    skips the lookup altogether.
+    """
+
+    def __init__(self, fetch, ttl=60, setting='SAGEMAKER_ENDPOINT_NAME'):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.setting = setting
+        self._name = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self):
+        configured = getattr(settings, self.setting, None) if self.setting else None
+        if isinstance(configured, str) and configured:
+            return configured
+
+        if self._name is None:
+            with self._lock:
+                if self._name is None:
+                    self._store(self.fetch())
+            return self._name
+
+        if time.monotonic() - self._fetched_at >= self.ttl:
+            self._refresh_in_background()
+        return self._name
+
+    def invalidate(self):
+        """Forget the cached name, e.g. after the endpoint was deleted"""
+        with self._lock:
+            self._name = None
+            self._fetched_at = 0.0
+
+    def _store(self, name):
+        self._name = name
+        self._fetched_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='sagemaker-endpoint-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self._store(self.fetch())
+        except Exception as e:
+            # Keep serving the last known endpoint; retry after another TTL
+            print(f"Error refreshing SageMaker endpoint lookup: {str(e)}")
+            self._fetched_at = time.monotonic()
+        finally:
+            self._refreshing = False
+
+
+class SageMakerInferenceBackend(InferenceBackend):
+    name = 'sagemaker'
+
+    def __init__(self, get_runtime_client, get_endpoint_name, get_endpoint_config_name):
+        self.get_runtime_client = get_runtime_client
+        self.get_endpoint_name = get_endpoint_name
+        self.get_endpoint_config_name = get_endpoint_config_name
+
+    def model_version(self):
+        # UpdateEndpoint swaps the model behind an unchanged endpoint name, but
+        # always onto a new endpoint config, so the config name is the version
+        return f"{self.name}:{self.get_endpoint_name()}:{self.get_endpoint_config_name()}"
+
+    def predict(self, image_url, image_bytes=None):
+        # Get runtime client
+        runtime = self.get_runtime_client()
+
+        # Get endpoint name
+        endpoint_name = self.get_endpoint_name()
+
+        # Invoke endpoint
+        response = runtime.invoke_endpoint(
+            EndpointName=endpoint_name,
+            ContentType='application/json',
+            Body=json.dumps({"url": image_url})
+        )
+
+        # Parse response
+        return json.loads(response['Body'].read().decode())
+
+
+class HttpInferenceBackend(InferenceBackend):
+    """
+    Any server that speaks the SageMaker container protocol (POST /invocations),
+    e.g. the endpoint image running locally under docker.
+    """
+    name = 'http'
+
+    def __init__(self, base_url, timeout=30, version=None):
+        if not base_url:
+            raise ValueError("PREDICTION_HTTP_URL must be set for the http prediction backend")
+        self.url = base_url.rstrip('/') + '/invocations'
+        self.timeout = timeout
+        self.version = version
+        self.session = requests.Session()
+
+    def model_version(self):
+        # The URL stays the same when a new model is deployed behind it, so
+        # without PREDICTION_HTTP_MODEL_VERSION results are not cached
+        if not isinstance(self.version, str) or not self.version:
+            return None
+        return f"{self.name}:{self.url}:{self.version}"
+
+    def predict(self, image_url, image_bytes=None):
+        response = self.session.post(
+            self.url,
+            data=json.dumps({"url": image_url}),
+            headers={'Content-Type': 'application/json'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+class LocalInferenceBackend(InferenceBackend):
+    """
+    In-process inference through ModelService and its micro-batching queue.
+
+    torch is only imported when this backend is selected, so SageMaker-only
+    deployments do not need it installed.
+    """
+    name = 'local'
+
+    def __init__(self, timeout=30):
+        from ml.model_service import ModelService
+        self.model_service = ModelService()
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def model_version(self):
+        return f"{self.name}:{self.model_service.get_model_version()}"
+
+    def predict(self, image_url, image_bytes=None):
+        if image_bytes is None:
+            response = self.session.get(image_url, timeout=self.timeout)
+            if response.status_code != 200:
+                raise Exception("Could not download image from URL")
+            image_bytes = response.content
+
+        image_tensor = self.model_service.preprocess(image_bytes)
+        probs = self.model_service.predict(image_tensor, timeout=self.timeout)[0].tolist()
+
+        pred = max(range(len(probs)), key=lambda i: probs[i])
+        return {
+            'prediction': 'aneurysm detected' if pred == 1 else 'no aneurysm detected',
+            'confidence': float(probs[pred]),
+            'probabilities': probs,
+            'metadata': {
+                'backend': self.name,
+                'inference_backend': (self.model_service.get_backend_info() or {}).get('backend'),
+                'quantization': (self.model_service.get_quantization_info() or {}).get('mode', 'none'),
+            }
+        }
+
+
+_backends = {}
+
+
+def get_inference_backend(prediction_service, name=None):
+    """
+    Resolve the backend named by settings.PREDICTION_BACKEND (default 'sagemaker').
+
+    Backends are created once per process; the SageMaker backend is bound to the
+    PredictionService that asked for it.
+    """
+    name = name or getattr(settings, 'PREDICTION_BACKEND', 'sagemaker')
+    if name == SageMakerInferenceBackend.name:
+        return SageMakerInferenceBackend(
+            prediction_service.get_runtime_client,
+            prediction_service.get_endpoint_name,
+            prediction_service.get_endpoint_config_name
+        )
+
+    if name not in _backends:
+        timeout = getattr(settings, 'PREDICTION_TIMEOUT', 30)
+        if name == LocalInferenceBackend.name:
+            _backends[name] = LocalInferenceBackend(timeout=timeout)
+        elif name == HttpInferenceBackend.name:
+            _backends[name] = HttpInferenceBackend(
+                getattr(settings, 'PREDICTION_HTTP_URL', None),
+                timeout=timeout,
+                version=getattr(settings, 'PREDICTION_HTTP_MODEL_VERSION', None)
+            )
+        else:
+            raise ValueError(f"Unknown prediction backend '{name}', expected sagemaker, local or http")
+    return _backends[name]
@@ -0,0 +1,59 @@
+import threading
+
+
+class JobNotifier:
+    """
+    In-process wake-up for requests waiting on a SHAP job.
+
+    Waiters block on a per-request_id Event; whoever records a terminal status
+    in this process (the Lambda callback, a poll) calls notify() and every
+    waiter returns at once without touching storage. Nothing crosses process
+    boundaries, so waiters still re-read the job row on a slow interval.
+    """
+
+    def __init__(self):
+        self._events = {}
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def wait(self, request_id, timeout):
+        """
+        Returns:
+            bool: True if notified, False on timeout
+        """
+        with self._lock:
+            event = self._events.setdefault(request_id, threading.Event())
+            self._waiters[request_id] = self._waiters.get(request_id, 0) + 1
+        try:
+            return event.wait(timeout)
+        finally:
+            with self._lock:
+                self._waiters[request_id] -= 1
+                if not self._waiters[request_id]:
+                    del self._waiters[request_id]
+                    if self._events.get(request_id) is event:
+                        del self._events[request_id]
+
+    def notify(self, request_id):
+        with self._lock:
+            event = self._events.pop(request_id, None)
+        if event is not None:
+            event.set()
+
+    def waiting(self):
+        with self._lock:
+            return sum(self._waiters.values())
+
+
+_notifier = None
+_lock = threading.Lock()
+
+
+def get_job_notifier():
+    """Process-wide JobNotifier"""
+    global _notifier
+    if _notifier is None:
+        with _lock:
+            if _notifier is None:
+                _notifier = JobNotifier()
+    return _notifier
@@ -0,0 +1,95 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+
+
+class PredictionCache:
+    """
+    Two-tier cache of inference results keyed by SHA-256 of the image bytes
+    and the model version that produced them.
+
+    The first tier is an in-process LRU; the second is the Django cache, which
+    is shared between workers when CACHES points at Redis. A result found only
+    in the shared tier is promoted into the LRU.
+    """
+
+    def __init__(self, max_entries=1024, timeout=60 * 60 * 24 * 7):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0}
+
+    @staticmethod
+    def hash_image(image_bytes):
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def make_key(image_hash, model_version):
+        return f"prediction:{model_version}:{image_hash}"
+
+    def get(self, image_hash, model_version):
+        """
+        Returns:
+            A copy of the cached prediction result, or None on a miss
+        """
+        key = self.make_key(image_hash, model_version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return copy.deepcopy(self._entries[key])
+
+        result = cache.get(key)
+        with self._lock:
+            if result is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['shared_hits'] += 1
+            self._remember(key, result)
+        return copy.deepcopy(result)
+
+    def set(self, image_hash, model_version, result):
+        key = self.make_key(image_hash, model_version)
+        cache.set(key, result, self.timeout)
+        with self._lock:
+            self._stats['stores'] += 1
+            self._remember(key, copy.deepcopy(result))
+
+    def _remember(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+_prediction_cache = None
+_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide PredictionCache configured from settings"""
+    global _prediction_cache
+    if _prediction_cache is None:
+        with _lock:
+            if _prediction_cache is None:
+                _prediction_cache = PredictionCache(
+                    max_entries=int(getattr(settings, 'PREDICTION_CACHE_MAX_ENTRIES', 1024)),
+                    timeout=int(getattr(settings, 'PREDICTION_CACHE_TIMEOUT', 60 * 60 * 24 * 7)),
+                )
+    return _prediction_cache
@@ -1,14 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import time
 import uuid
-import boto3
 import json
+import requests
+from django.db import connection, transaction
+from django.utils import timezone
 from models.image_prediction import ImagePrediction
+from models.shap_job import ShapJob
 from django.conf import settings
+from django.core.cache import cache
 from functools import lru_cache
+from .inference_backend import get_inference_backend, EndpointResolver
+from .prediction_cache import get_prediction_cache
+from .singleflight import get_single_flight, acquire_shared_lock, release_shared_lock
+from .shap_status import ShapResultIndex, result_outcome
+from .shap_artifacts import ShapArtifacts
+from .job_notifier import get_job_notifier
+from . import status_cache
+from utils.aws_clients import get_client
 
+# SHAP quality presets understood by the shap-analysis Lambda (ml_lambda/presets.py)
+SHAP_PRESETS = ('fast', 'standard', 'thorough')
+# Explanation methods it can run (ml_lambda/explainers.py); the gradient ones
+# take a single forward/backward pass or a few dozen instead of max_evals
+SHAP_METHODS = ('shap_partition', 'gradcam', 'integrated_gradients')
+
+
+def shap_preset(include_shap):
+    """
+    Args:
+        include_shap: False, True (SHAP_DEFAULT_PRESET) or a SHAP_PRESETS name
+
+    Returns:
+        The preset to run, or None when no SHAP analysis was requested
+    """
+    if not include_shap:
+        return None
+    if include_shap is True:
+        return getattr(settings, 'SHAP_DEFAULT_PRESET', 'standard')
+    if include_shap not in SHAP_PRESETS:
+        raise ValueError(f"Unknown SHAP preset '{include_shap}', expected one of {', '.join(SHAP_PRESETS)}")
+    return include_shap
+
+
+def explanation_method(method=None):
+    """
+    Args:
+        method: A SHAP_METHODS name, or None for SHAP_DEFAULT_METHOD
+
+    Returns:
+        The method the Lambda should run
+    """
+    if not method:
+        return getattr(settings, 'SHAP_DEFAULT_METHOD', 'shap_partition')
+    if method not in SHAP_METHODS:
+        raise ValueError(f"Unknown explanation method '{method}', expected one of {', '.join(SHAP_METHODS)}")
+    return method
 
 
 class PredictionService:
+    _endpoint_resolver = None
+    _endpoint_config_resolver = None
 
     def __init__(self):
         self.shap_service = None
@@ -16,73 +69,230 @@ class PredictionService:
    
     def get_runtime_client(self):
         """
-        Get or create boto3 runtime client with caching
+        Get the shared, pooled SageMaker runtime client
+        """
+        return get_client('sagemaker-runtime')
+
+    @classmethod
+    def get_endpoint_resolver(cls):
+        """
+        Process-wide TTL cache of the endpoint name (see EndpointResolver)
         """
-        return boto3.client('sagemaker-runtime')
-    
+        if cls._endpoint_resolver is None:
+            cls._endpoint_resolver = EndpointResolver(
+                cls._list_endpoint_name,
+                ttl=float(getattr(settings, 'SAGEMAKER_ENDPOINT_TTL', 60))
+            )
+        return cls._endpoint_resolver
+
+    @staticmethod
+    def _list_endpoint_name():
+        """
+        Get the first available SageMaker endpoint name from the control plane
+        """
+        response = get_client('sagemaker').list_endpoints()
+        if response['Endpoints']:
+            return response['Endpoints'][0]['EndpointName']
+        raise Exception("No SageMaker endpoints found")
+
     def get_endpoint_name(self):
         """
         Get the first available SageMaker endpoint name
         """
         try:
-            # Create SageMaker client
-            sagemaker_client = boto3.client('sagemaker')
-            
-            # List endpoints
-            response = sagemaker_client.list_endpoints()
-            
-            # Get first endpoint name
-            if response['Endpoints']:
-                return response['Endpoints'][0]['EndpointName']
-            raise Exception("No SageMaker endpoints found")
+            return self.get_endpoint_resolver().get()
         except Exception as e:
             raise Exception(f"Error getting endpoint name: {str(e)}")
 
-    def invoke_endpoint(self, image_url):
+    @classmethod
+    def get_endpoint_config_resolver(cls):
         """
-        Invoke SageMaker endpoint with image URL
+        Process-wide TTL cache of the endpoint's current config name, refreshed
+        on the same SAGEMAKER_ENDPOINT_TTL as the endpoint name
         """
-        try:
-            # Get runtime client
-            runtime = self.get_runtime_client()
-            
-            # Get endpoint name
-            endpoint_name = self.get_endpoint_name()
-            
-            # Prepare the input
-            input_data = {
-                "url": image_url
-            }
-            
-            # Invoke endpoint
-            response = runtime.invoke_endpoint(
-                EndpointName=endpoint_name,
-                ContentType='application/json',
-                Body=json.dumps(input_data)
+        if cls._endpoint_config_resolver is None:
+            cls._endpoint_config_resolver = EndpointResolver(
+                cls._describe_endpoint_config_name,
+                ttl=float(getattr(settings, 'SAGEMAKER_ENDPOINT_TTL', 60)),
+                setting=None
             )
-            
-            # Parse response
-            result = json.loads(response['Body'].read().decode())
-            return result
+        return cls._endpoint_config_resolver
+
+    @classmethod
+    def _describe_endpoint_config_name(cls):
+        endpoint_name = cls.get_endpoint_resolver().get()
+        response = get_client('sagemaker').describe_endpoint(EndpointName=endpoint_name)
+        return response['EndpointConfigName']
+
+    def get_endpoint_config_name(self):
+        """
+        Get the endpoint config the SageMaker endpoint is serving, which
+        changes whenever the endpoint is updated to a new model
+        """
+        try:
+            return self.get_endpoint_config_resolver().get()
+        except Exception as e:
+            raise Exception(f"Error getting endpoint config: {str(e)}")
+
+    def get_inference_backend(self):
+        """
+        Get the prediction backend selected by settings.PREDICTION_BACKEND
+        """
+        return get_inference_backend(self)
+
+    def invoke_endpoint(self, image_url, image_bytes=None):
+        """
+        Run inference for an image URL on the configured backend
+        (SageMaker, in-process ModelService or a SageMaker-compatible HTTP server)
+        """
+        try:
+            backend = self.get_inference_backend()
+            return backend.predict(image_url, image_bytes=image_bytes)
+        except Exception as e:
+            raise Exception(f"Error invoking inference backend: {str(e)}")
+
+    def fetch_image(self, image_url):
+        """
+        Download an image so it can be content-hashed
+        """
+        response = requests.get(image_url, timeout=getattr(settings, 'PREDICTION_TIMEOUT', 30))
+        if response.status_code != 200:
+            raise Exception("Could not download image from URL")
+        return response.content
+
+    def get_image_identity(self, image_url):
+        """
+        Download an image and hash its content
+
+        Returns:
+            tuple: (image bytes, SHA-256 hex digest), or (None, None) if the
+                   image could not be fetched; callers then fall back to the URL
+        """
+        try:
+            image_bytes = self.fetch_image(image_url)
+            return image_bytes, get_prediction_cache().hash_image(image_bytes)
+        except Exception as e:
+            print(f"Could not hash image {image_url}: {str(e)}")
+            return None, None
+
+    def get_prediction_result(self, image_url, image_bytes=None):
+        """
+        Get the inference result for an image, skipping the backend when the same
+        image bytes were already classified by the same model version
+        """
+        if not getattr(settings, 'PREDICTION_CACHE_ENABLED', True):
+            return self.invoke_endpoint(image_url, image_bytes=image_bytes)
+
+        try:
+            if image_bytes is None:
+                image_bytes = self.fetch_image(image_url)
+            image_hash = get_prediction_cache().hash_image(image_bytes)
+            model_version = self.get_inference_backend().model_version()
         except Exception as e:
-            raise Exception(f"Error invoking SageMaker endpoint: {str(e)}")
+            # Caching is best effort; let the backend report any real problem
+            print(f"Prediction cache unavailable for {image_url}: {str(e)}")
+            return self.invoke_endpoint(image_url, image_bytes=image_bytes)
+
+        if model_version is None:
+            # No model identity to key on; an old result could outlive its model
+            return self.invoke_endpoint(image_url, image_bytes=image_bytes)
+
+        prediction_cache = get_prediction_cache()
+        result = prediction_cache.get(image_hash, model_version)
+        if result is not None:
+            return result
+
+        result = self.invoke_endpoint(image_url, image_bytes=image_bytes)
+        prediction_cache.set(image_hash, model_version, result)
+        return result
+
+    def get_cache_stats(self):
+        return dict(get_prediction_cache().stats(), single_flight=get_single_flight().stats())
             
-    def perform_shap_analysis(self, image_url, user_id):
+    def perform_shap_analysis(self, image_url, user_id, image_hash=None, preset=None, method=None):
         """
         Invoke SHAP analysis Lambda function asynchronously and save request ID
         Returns request ID for tracking
+
+        ``preset`` picks the SHAP quality preset (default SHAP_DEFAULT_PRESET) and
+        ``method`` the explanation method (default SHAP_DEFAULT_METHOD).
+        Identical requests (same user, image content, preset and method) are coalesced: within
+        this process by single-flight, across processes by a short-lived lock in
+        the shared cache holding the request ID of the run already in flight.
+        The lock is released when that run completes or fails.
         """
+        if image_hash is None:
+            _, image_hash = self.get_image_identity(image_url)
+        identity = image_hash or image_url
+        preset = shap_preset(preset or True)
+        method = explanation_method(method)
+        return get_single_flight().do(
+            f"shap:{user_id}:{method}:{preset}:{identity}",
+            lambda: self._start_shap_analysis(image_url, user_id, identity, preset, method)
+        )
+
+    def _start_shap_analysis(self, image_url, user_id, identity, preset, method):
+        lock_key = f"singleflight:shap:{user_id}:{method}:{preset}:{identity}"
+        request_id = str(uuid.uuid4())
+        shap_request = {
+            'status': 'processing',
+            'request_id': request_id,
+            'preset': preset,
+            'method': method,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+        try:
+            acquired, in_flight = acquire_shared_lock(
+                lock_key, shap_request, int(getattr(settings, 'SHAP_DEDUPE_TTL', 300))
+            )
+        except Exception as e:
+            # Without the shared cache we can still run, just without cross-process dedupe
+            print(f"SHAP dedupe lock unavailable: {str(e)}")
+            acquired, in_flight = True, shap_request
+
+        if not acquired and in_flight:
+            reused = self._reusable_shap_request(in_flight)
+            if reused is not None:
+                print(f"Reusing SHAP analysis {reused.get('request_id')} for user {user_id}")
+                return reused
+            # The run behind the lock failed; start over instead of joining it
+            release_shared_lock(lock_key)
+            acquired, in_flight = acquire_shared_lock(
+                lock_key, shap_request, int(getattr(settings, 'SHAP_DEDUPE_TTL', 300))
+            )
+            if not acquired and in_flight:
+                return in_flight
+
+        try:
+            # Lets the run's terminal update release the dedupe lock
+            cache.set(self._shap_lock_index_key(request_id), lock_key,
+                      int(getattr(settings, 'SHAP_DEDUPE_TTL', 300)))
+        except Exception as e:
+            print(f"SHAP dedupe lock index unavailable: {str(e)}")
+
         try:
-            lambda_client = boto3.client('lambda', region_name='ap-southeast-1')
-            request_id = str(uuid.uuid4())
+            ShapJob.objects.create(
+                request_id=request_id,
+                user_id=user_id,
+                image_url=image_url,
+                status=ShapJob.QUEUED
+            )
+
+            lambda_client = get_client('lambda', region_name='ap-southeast-1')
             # Prepare Lambda event
             lambda_event = {
                 "body": {
                     "image_url": image_url,
                     "user_id": str(user_id),
-                    "request_id": request_id 
+                    "request_id": request_id,
+                    "preset": preset,
+                    "method": method
                 }
             }
+            callback_url = getattr(settings, 'SHAP_CALLBACK_URL', None)
+            if isinstance(callback_url, str) and callback_url:
+                lambda_event["body"]["callback_url"] = callback_url
             
             # Invoke Lambda asynchronously
             response = lambda_client.invoke(
@@ -92,97 +302,467 @@ class PredictionService:
             )
             
             
-            return {
-                'status': 'processing',
-                'request_id': request_id,
-                'timestamp': datetime.utcnow().isoformat()
-            }
+            return shap_request
             
         except Exception as e:
             print(f"Error initiating SHAP analysis: {str(e)}")
+            # Let a retry start a fresh run instead of joining the failed one
+            try:
+                release_shared_lock(lock_key)
+            except Exception:
+                pass
+            ShapJob.objects.filter(request_id=request_id).update(
+                status=ShapJob.FAILED,
+                error={'error': str(e)},
+                completed_at=timezone.now()
+            )
             return {
                 'status': 'failed',
                 'error': str(e),
                 'timestamp': datetime.utcnow().isoformat()
             }
 
+    @staticmethod
+    def _shap_lock_index_key(request_id):
+        return f"singleflight:shap-run:{request_id}"
+
+    def _reusable_shap_request(self, in_flight):
+        """
+        What an identical request gets instead of starting its own run
+
+        Returns:
+            The in-flight request while its job is still going, a copy of the
+            result once it completed, or None if it failed
+        """
+        job = ShapJob.objects.filter(request_id=in_flight.get('request_id')).first()
+        if job is None or not job.is_terminal:
+            return in_flight
+        if job.status == ShapJob.COMPLETED and job.result:
+            return dict(job.result, request_id=job.request_id)
+        return None
+
+    def _release_shap_dedupe(self, request_id):
+        """Once a run is finished, the next identical request starts a fresh one"""
+        try:
+            index_key = self._shap_lock_index_key(request_id)
+            lock_key = cache.get(index_key)
+            if lock_key:
+                in_flight = cache.get(lock_key)
+                # Leave the lock alone if a newer run already holds it
+                if isinstance(in_flight, dict) and in_flight.get('request_id') == request_id:
+                    release_shared_lock(lock_key)
+                cache.delete(index_key)
+        except Exception as e:
+            print(f"Could not release SHAP dedupe lock for {request_id}: {str(e)}")
+
     def check_shap_analysis_status(self, request_id, user_id):
+        """
+        Check the status of a SHAP analysis request
+
+        Answers come from the shared status cache when possible (see
+        status_cache); concurrent misses for one request_id share a single
+        lookup.
+        """
+        cached = status_cache.get_status(request_id)
+        if cached is not None:
+            return dict(cached)
+
+        current_status = get_single_flight().do(
+            f"shap-status:{request_id}",
+            lambda: self._lookup_shap_status(request_id, user_id)
+        )
+        return dict(current_status)
+
+    def _lookup_shap_status(self, request_id, user_id):
+        """
+        One read on the indexed ShapJob.request_id; the Lambda keeps the row
+        current through the status callback. Unfinished jobs are also checked
+        against S3, for when there is no callback.
+        """
+        current_status = self._read_shap_status(request_id, user_id)
+        status_cache.store_status(request_id, current_status)
+        return current_status
+
+    def _read_shap_status(self, request_id, user_id):
+        try:
+            job = ShapJob.objects.filter(request_id=request_id).first()
+        except Exception as e:
+            return {
+                'status': 'error',
+                'error': str(e)
+            }
+
+        if job is None:
+            return self._check_shap_analysis_status_s3(request_id, user_id)
+        if job.is_terminal:
+            return self._job_status(job)
+        return self._refresh_job_from_s3(job)
+
+    def _refresh_job_from_s3(self, job):
+        """
+        The callback only runs when SHAP_CALLBACK_URL is set, and can be lost,
+        so an unfinished job is checked against the result files the Lambda
+        writes under its owner's prefix
+        """
+        try:
+            outcome, data = self._fetch_shap_outcome_s3(job.request_id, job.user_id)
+        except Exception as e:
+            print(f"Could not check S3 for SHAP job {job.request_id}: {str(e)}")
+            return self._job_status(job)
+
+        if outcome == 'processing' or outcome == job.status:
+            return self._job_status(job)
+        return self._advance_shap_job(
+            job.request_id,
+            outcome,
+            result=data if outcome in (ShapJob.ANALYZED, ShapJob.COMPLETED) else None,
+            error=data if outcome == ShapJob.FAILED else None
+        )
+
+    def _job_status(self, job):
+        if job.status == ShapJob.COMPLETED:
+            return {
+                'status': 'completed'
+            }
+        if job.status == ShapJob.FAILED:
+            return {
+                'status': 'failed',
+                'error': job.error
+            }
+        if job.status == ShapJob.ANALYZED:
+            return self._partial_status(job.request_id)
+        return {
+            'status': 'processing',
+            'request_id': job.request_id,
+            'job_status': job.status
+        }
+
+    def wait_for_shap_status(self, request_id, user_id, timeout=None, since='processing'):
+        """
+        Long-poll: return as soon as the job leaves processing, or after ``timeout``
+
+        A client that already holds the partial result passes since='partial'
+        to keep waiting until the visualization is in.
+
+        The wait is woken in-process by the callback or a poll that records the
+        outcome. A callback delivered to another worker, or no callback at all,
+        is picked up by rechecking the status every SHAP_WAIT_RECHECK_SECONDS.
+
+        Returns:
+            The same status dict as check_shap_analysis_status; still
+            'processing' (or ``since``) if the timeout expired first
+        """
+        max_timeout = float(getattr(settings, 'SHAP_WAIT_MAX_TIMEOUT', 25))
+        recheck = float(getattr(settings, 'SHAP_WAIT_RECHECK_SECONDS', 5))
+        timeout = max_timeout if timeout is None else min(max(float(timeout), 0.0), max_timeout)
+        deadline = time.monotonic() + timeout
+        waiting = ('processing', since)
+
+        while True:
+            current_status = self.check_shap_analysis_status(request_id, user_id)
+            remaining = deadline - time.monotonic()
+            if current_status.get('status') not in waiting or remaining <= 0:
+                return current_status
+            get_job_notifier().wait(request_id, min(remaining, recheck))
+
+    def get_shap_attributions(self, request_id, user_id, scale=None):
+        """
+        Raw SHAP arrays of a finished analysis, for client-side rendering
+
+        Args:
+            request_id: ID of the SHAP analysis request
+            user_id: Owner of the prediction
+            scale: None for a presigned URL of the whole .npz, or a
+                   shap_artifacts.SCALES factor for a downsampled heatmap and
+                   label grid as JSON
+
+        Returns:
+            dict: The URL or grid, or {'status': 'error', 'error'}
+        """
+        prediction = ImagePrediction.objects.filter(request_id=request_id, user_id=user_id).first()
+        if prediction is None:
+            return {
+                'status': 'error',
+                'error': f"Prediction not found for request_id {request_id}"
+            }
+
+        stored = ((prediction.shap_explanation or {}).get('artifacts') or {}).get('attributions')
+        if not stored:
+            return {
+                'status': 'error',
+                'error': f"SHAP attributions not found for request_id {request_id}"
+            }
+
+        artifacts = ShapArtifacts(get_client('s3'), 'mcs09-bucket', stored['key'])
+        if scale is None:
+            expires_in = int(getattr(settings, 'SHAP_ARTIFACT_URL_EXPIRY', 3600))
+            return {
+                'request_id': request_id,
+                'format': 'npz',
+                'url': artifacts.url(expires_in),
+                'expires_in': expires_in,
+                'bytes': stored.get('bytes'),
+                'shape': stored.get('shape')
+            }
+
+        # A run's arrays never change once written
+        cache_key = f"shap-heatmap:{request_id}:{scale}"
+        grid = cache.get(cache_key)
+        if grid is None:
+            try:
+                grid = artifacts.heatmap(scale)
+            except Exception as e:
+                return {
+                    'status': 'error',
+                    'error': str(e)
+                }
+            cache.set(cache_key, grid, int(getattr(settings, 'SHAP_ARTIFACT_CACHE_TIMEOUT', 60 * 60 * 24)))
+        return dict(grid, request_id=request_id, format='json')
+
+    def handle_shap_callback(self, payload):
+        """
+        Apply a status update pushed by the shap-analysis Lambda
+
+        Args:
+            payload: {'request_id', 'status': 'running'|'analyzed'|'completed'|'failed',
+                      'result' (analyzed, completed) or 'error' (failed)}
+
+        Returns:
+            The job status in the same shape as check_shap_analysis_status
+        """
+        return self._advance_shap_job(
+            payload.get('request_id'),
+            payload.get('status'),
+            result=payload.get('result'),
+            error=payload.get('error')
+        )
+
+    def _advance_shap_job(self, request_id, new_status, result=None, error=None):
+        """
+        Move a job to ``new_status`` and copy it onto its predictions, whether
+        the callback or a status check found out
+        """
+        with transaction.atomic():
+            job = ShapJob.objects.select_for_update().filter(request_id=request_id).first()
+            if job is None:
+                return {
+                    'status': 'error',
+                    'error': f"No SHAP job found for request_id {request_id}"
+                }
+
+            if job.status == new_status:
+                # Already applied, by a retried callback or an earlier status check
+                return self._job_status(job)
+
+            try:
+                job.transition(new_status, result=result, error=error)
+            except ValueError as e:
+                return {
+                    'status': 'error',
+                    'error': str(e)
+                }
+            job.save()
+            self._record_job_on_predictions(job)
+
+        current_status = self._job_status(job)
+        self._publish_shap_status(request_id, current_status)
+        return current_status
+
+    def _record_job_on_predictions(self, job):
+        """
+        Copy an analyzed, completed or failed job onto every prediction tracking it
+        """
+        if job.status in (ShapJob.ANALYZED, ShapJob.COMPLETED):
+            # Only update the shap_explanation column; an analyzed result
+            # is replaced once the visualization URL arrives
+            ImagePrediction.objects.filter(request_id=job.request_id).update(shap_explanation=job.result)
+        elif job.status == ShapJob.FAILED:
+            for prediction in ImagePrediction.objects.filter(request_id=job.request_id):
+                shap_column = prediction.prediction or {}
+                shap_column['shap_analysis'] = {
+                    'status': 'failed',
+                    'error': job.error,
+                    'completion_time': job.completed_at.isoformat()
+                }
+                prediction.prediction = shap_column
+                prediction.save()
+
+    def _sync_finished_shap(self, request_ids):
+        """
+        Rows saved after their job already moved on missed that update;
+        copy the job's outcome onto them now
+        """
+        request_ids = [request_id for request_id in request_ids if request_id]
+        if not request_ids:
+            return
+        try:
+            finished = ShapJob.objects.filter(request_id__in=request_ids).exclude(
+                status__in=(ShapJob.QUEUED, ShapJob.RUNNING)
+            )
+            for job in finished:
+                self._record_job_on_predictions(job)
+        except Exception as e:
+            print(f"Could not sync finished SHAP jobs: {str(e)}")
+
+    def _check_shap_analysis_status_s3(self, request_id, user_id):
         """
         Check the status of a SHAP analysis request and update ImagePrediction if completed
+
+        Only used for runs started before ShapJob existed; these never get a callback.
         """
         try:
-            s3_client = boto3.client('s3')
-            bucket = 'mcs09-bucket'
             try:
                 prediction = ImagePrediction.objects.get(
                     request_id=request_id
                 )
-                
-                try:
-                    result = s3_client.get_object(
-                        Bucket=bucket,
-                        Key=f'requests/{str(prediction.user.id)}/{request_id}/result.json'  
-                    )
-                    result_data = json.loads(result['Body'].read().decode('utf-8'))
-                    
-                    # Only update the shap_explanation column
-                    prediction.shap_explanation = result_data
-                    prediction.save()
-                    
-                    return {
-                        'status': 'completed'
-                    }
-                    
-                except s3_client.exceptions.NoSuchKey:
-                    # Check for error.json using the correct path structure
-                    try:
-                        error = s3_client.get_object(
-                            Bucket=bucket,
-                            Key=f'requests/{user_id}/{request_id}/error.json'  # Direct UUID path
-                        )
-                        error_data = json.loads(error['Body'].read().decode('utf-8'))
-                        
-                        # Update prediction with error status
-                        shap_column = prediction.prediction or {}
-                        shap_column['shap_analysis'] = {
-                            'status': 'failed',
-                            'error': error_data,
-                            'completion_time': datetime.utcnow().isoformat()
-                        }
-                        
-                        prediction.prediction = shap_column
-                        prediction.save()
-                        
-                        return {
-                            'status': 'failed',
-                            'error': error_data
-                        }
-                        
-                    except s3_client.exceptions.NoSuchKey:
-                        # If neither exists, it's still processing
-                        return {
-                            'status': 'processing',
-                            'request_id': request_id
-                        }
-                        
             except ImagePrediction.DoesNotExist:
                 return {
                     'status': 'error',
                     'error': f"No prediction found for request_id {request_id}"
                 }
-                
+
+            # The Lambda writes both files under the prediction owner's prefix,
+            # whatever user_id the caller passed
+            outcome, data = self._fetch_shap_outcome_s3(request_id, prediction.user.id)
+            if self._apply_shap_outcome(prediction, None, outcome, data):
+                prediction.save()
+                self._publish_shap_status(request_id, self._outcome_status(request_id, outcome, data))
+            return self._outcome_status(request_id, outcome, data)
+
         except Exception as e:
             return {
                 'status': 'error',
                 'error': str(e)
             }
 
-    def create_prediction(self, user, image_url, include_shap=False):
+    def _fetch_shap_outcome_s3(self, request_id, user_id):
+        """
+        Probe S3 for the Lambda's result.json, then error.json
+
+        Returns:
+            tuple: ('completed', result) / ('analyzed', partial result) /
+                   ('failed', error) / ('processing', None)
+        """
+        s3_client = get_client('s3')
+        bucket = 'mcs09-bucket'
+        try:
+            result = s3_client.get_object(
+                Bucket=bucket,
+                Key=f'requests/{str(user_id)}/{request_id}/result.json'
+            )
+            data = json.loads(result['Body'].read().decode('utf-8'))
+            return result_outcome(data), data
+        except s3_client.exceptions.NoSuchKey:
+            pass
+
+        try:
+            error = s3_client.get_object(
+                Bucket=bucket,
+                Key=f'requests/{str(user_id)}/{request_id}/error.json'
+            )
+            return 'failed', json.loads(error['Body'].read().decode('utf-8'))
+        except s3_client.exceptions.NoSuchKey:
+            # If neither exists, it's still processing
+            return 'processing', None
+
+    def _apply_shap_outcome(self, prediction, job, outcome, data):
+        """
+        Record an outcome on the prediction (and its job, if any) without saving
+
+        Returns:
+            bool: Whether anything changed
+        """
+        if outcome == 'analyzed':
+            if prediction.shap_explanation == data:
+                # Still rendering; already recorded on an earlier poll
+                return False
+            prediction.shap_explanation = data
+        elif outcome == 'completed':
+            # Only update the shap_explanation column
+            prediction.shap_explanation = data
+        elif outcome == 'failed':
+            shap_column = prediction.prediction or {}
+            shap_column['shap_analysis'] = {
+                'status': 'failed',
+                'error': data,
+                'completion_time': datetime.utcnow().isoformat()
+            }
+            prediction.prediction = shap_column
+        else:
+            return False
+
+        if job is not None and job.can_transition(outcome):
+            job.transition(
+                outcome,
+                result=data if outcome in ('analyzed', 'completed') else None,
+                error=data if outcome == 'failed' else None
+            )
+            # bulk_update skips auto_now
+            job.updated_at = timezone.now()
+        return True
+
+    def _publish_shap_status(self, request_id, current_status):
+        """
+        Replace the cached status and, once there is something to show, wake
+        long-poll waiters
+        """
+        status_cache.invalidate(request_id)
+        status_cache.store_status(request_id, current_status)
+        if current_status.get('status') in status_cache.TERMINAL_STATUSES:
+            self._release_shap_dedupe(request_id)
+        if current_status.get('status') in status_cache.TERMINAL_STATUSES + ('partial',):
+            get_job_notifier().notify(request_id)
+
+    def _outcome_status(self, request_id, outcome, data):
+        if outcome == 'completed':
+            return {
+                'status': 'completed'
+            }
+        if outcome == 'failed':
+            return {
+                'status': 'failed',
+                'error': data
+            }
+        if outcome == 'analyzed':
+            return self._partial_status(request_id)
+        return {
+            'status': 'processing',
+            'request_id': request_id
+        }
+
+    def _partial_status(self, request_id):
+        """
+        Numbers are stored on the prediction's shap_explanation; only the
+        visualization is still being rendered
+        """
+        return {
+            'status': 'partial',
+            'request_id': request_id,
+            'job_status': ShapJob.ANALYZED,
+            'visualization': 'pending'
+        }
+
+    def create_prediction(self, user, image_url, include_shap=False, method=None):
         """
         Create and save prediction record with optional async SHAP analysis
+
+        ``include_shap`` is False, True for the default SHAP preset, or a
+        preset name ('fast', 'standard', 'thorough'); ``method`` is one of
+        SHAP_METHODS. Concurrent identical requests (same user, image content,
+        SHAP preset and method) share one backend call and one record.
         """
+        preset = shap_preset(include_shap)
+        method = explanation_method(method) if preset else None
+        image_bytes, image_hash = self.get_image_identity(image_url)
+        operation = f'predict+shap:{method}:{preset}' if preset else 'predict'
+        return get_single_flight().do(
+            f"{operation}:{user.id}:{image_hash or image_url}",
+            lambda: self._create_prediction(user, image_url, preset, method, image_bytes, image_hash)
+        )
+
+    def _create_prediction(self, user, image_url, preset, method, image_bytes, image_hash):
         try:
-            prediction_result = self.invoke_endpoint(image_url)
+            prediction_result = self.get_prediction_result(image_url, image_bytes=image_bytes)
             
             prediction_data = {
                 'user': user,
@@ -195,11 +775,13 @@ class PredictionService:
             prediction = ImagePrediction.objects.create(**prediction_data)
             
             # If SHAP analysis is requested, initiate it and update record
-            if include_shap:
-                shap_request = self.perform_shap_analysis(image_url, user.id)
+            if preset:
+                shap_request = self.perform_shap_analysis(image_url, user.id, image_hash=image_hash,
+                                                          preset=preset, method=method)
                 prediction.shap_explanation = shap_request
                 prediction.request_id = prediction.shap_explanation.get("request_id")
                 prediction.save()
+                self._sync_finished_shap([prediction.request_id])
             
             return prediction
                 
@@ -207,41 +789,246 @@ class PredictionService:
             raise Exception(f"Error creating prediction: {str(e)}")
 
 
+    def create_predictions(self, user, image_urls, include_shap=False, method=None):
+        """
+        Create predictions for many images in one call
+
+        Inference fans out over a bounded thread pool (PREDICTION_BATCH_CONCURRENCY)
+        and every successful prediction is written with a single bulk_create.
+        One bad image does not fail the batch. ``include_shap`` and ``method``
+        take the same values as in create_prediction.
+
+        Returns:
+            list: One dict per input URL, in input order, with 'status'
+                  'completed' plus the saved 'prediction', or 'failed' plus 'error'
+        """
+        preset = shap_preset(include_shap)
+        method = explanation_method(method) if preset else None
+        try:
+            max_workers = min(len(image_urls), int(getattr(settings, 'PREDICTION_BATCH_CONCURRENCY', 8)))
+
+            def run(image_url):
+                image_bytes, image_hash = self.get_image_identity(image_url)
+                try:
+                    return image_url, image_hash, self.get_prediction_result(image_url, image_bytes=image_bytes), None
+                except Exception as e:
+                    return image_url, image_hash, None, str(e)
+
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+                outcomes = list(executor.map(run, image_urls))
+
+            results = []
+            predictions = []
+            for image_url, image_hash, prediction_result, error in outcomes:
+                if error is not None:
+                    results.append({'image_url': image_url, 'status': 'failed', 'error': error})
+                    continue
+
+                # bulk_create skips ImagePrediction.save(), so fill created_by here
+                prediction = ImagePrediction(
+                    user=user,
+                    image_url=image_url,
+                    prediction=prediction_result,
+                    shap_explanation=None,
+                    created_by=user.username
+                )
+                if preset:
+                    shap_request = self.perform_shap_analysis(image_url, user.id, image_hash=image_hash,
+                                                              preset=preset, method=method)
+                    prediction.shap_explanation = shap_request
+                    prediction.request_id = shap_request.get("request_id")
+
+                predictions.append(prediction)
+                results.append({'image_url': image_url, 'status': 'completed', 'prediction': prediction})
+
+            if predictions:
+                self._bulk_create_predictions(predictions)
+                if preset:
+                    self._sync_finished_shap({prediction.request_id for prediction in predictions})
+
+            return results
+
+        except Exception as e:
+            raise Exception(f"Error creating predictions: {str(e)}")
+
+    def _bulk_create_predictions(self, predictions):
+        """
+        Insert all predictions in one statement and make sure each has its primary key
+        """
+        for prediction in predictions:
+            prediction.insert_token = uuid.uuid4().hex
+        with transaction.atomic():
+            created = ImagePrediction.objects.bulk_create(predictions)
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            return created
+
+        # MySQL does not return ids from a bulk INSERT; read them back by each
+        # row's unique insert token, which overlapping batches cannot share
+        saved = {
+            row.insert_token: row
+            for row in ImagePrediction.objects.filter(
+                insert_token__in=[p.insert_token for p in predictions]
+            ).only('id', 'insert_token', 'created_at')
+        }
+        for prediction in predictions:
+            row = saved[prediction.insert_token]
+            prediction.pk = row.pk
+            prediction.created_at = row.created_at
+        return created
+
     def get_user_predictions(self, user):
         """
         Get prediction history for a user and return list of SHAP analysis statuses
+
+        Finished analyses are answered from the database. The pending ones are
+        resolved with one S3 LIST plus a GET per newly finished run, and
+        everything that changed is written back with bulk_update, so a poll
+        costs in proportion to the pending jobs rather than the whole history.
+
         Returns: List of status dictionaries for predictions with SHAP analyses
         """
         try:
-            predictions = ImagePrediction.objects.filter(
-                user=user
-            ).order_by('-created_at')
+            predictions = list(
+                ImagePrediction.objects.filter(user=user).order_by('-created_at')
+            )
+
+            tracked = []
+            for prediction in predictions:
+                shap_column = prediction.shap_explanation
+                if shap_column and isinstance(shap_column, dict) and shap_column.get('request_id'):
+                    tracked.append((prediction, shap_column['request_id']))
+
+            jobs = {
+                job.request_id: job
+                for job in ShapJob.objects.filter(request_id__in=[request_id for _, request_id in tracked])
+            }
+
+            statuses = {}
+            pending = []
+            for prediction, request_id in tracked:
+                job = jobs.get(request_id)
+                stored = self._stored_shap_status(prediction, job)
+                if stored is None:
+                    pending.append((prediction, request_id, job))
+                else:
+                    statuses[prediction.id] = stored
+
+            changed_predictions, changed_jobs = self._refresh_pending_shap(pending, statuses)
+
+            with transaction.atomic():
+                if changed_predictions:
+                    ImagePrediction.objects.bulk_update(changed_predictions, ['shap_explanation', 'prediction'])
+                if changed_jobs:
+                    ShapJob.objects.bulk_update(
+                        changed_jobs,
+                        ['status', 'result', 'error', 'started_at', 'completed_at', 'updated_at']
+                    )
+
+            for prediction in changed_predictions:
+                self._publish_shap_status(prediction.request_id, statuses[prediction.id])
 
             status_results = []
+            for prediction, _ in tracked:
+                # Add prediction ID to status result
+                current_status = dict(statuses[prediction.id], prediction_id=prediction.id)
+                status_results.append(current_status)
+            return status_results
 
-            # Check and collect status for predictions with processing SHAP analyses
-            for prediction in predictions:
+        except Exception as e:
+            raise Exception(f"Error fetching predictions: {str(e)}")
+
+    def _stored_shap_status(self, prediction, job):
+        """
+        The status already recorded in the database, or None if the job is still pending
+        """
+        if job is not None and job.is_terminal:
+            self._backfill_terminal_job(prediction, job)
+            return self._job_status(job)
+
+        shap_column = prediction.shap_explanation or {}
+        if shap_column.get('status') == 'completed':
+            return self._outcome_status(prediction.request_id, 'completed', shap_column)
+        failure = (prediction.prediction or {}).get('shap_analysis') or {}
+        if failure.get('status') == 'failed':
+            return self._outcome_status(prediction.request_id, 'failed', failure.get('error'))
+        return None
+
+    def _backfill_terminal_job(self, prediction, job):
+        """
+        Write a finished job onto a row that missed the update, so later
+        listings read it straight from the row
+        """
+        try:
+            if job.status == ShapJob.COMPLETED and job.result:
+                if (prediction.shap_explanation or {}).get('status') != 'processing':
+                    return
+                prediction.shap_explanation = job.result
+                ImagePrediction.objects.filter(pk=prediction.pk).update(shap_explanation=job.result)
+            elif job.status == ShapJob.FAILED:
+                if (prediction.prediction or {}).get('shap_analysis'):
+                    return
+                shap_column = dict(prediction.prediction or {})
+                shap_column['shap_analysis'] = {
+                    'status': 'failed',
+                    'error': job.error,
+                    'completion_time': job.completed_at.isoformat() if job.completed_at else None
+                }
+                prediction.prediction = shap_column
+                ImagePrediction.objects.filter(pk=prediction.pk).update(prediction=shap_column)
+        except Exception as e:
+            print(f"Could not backfill SHAP job {job.request_id} onto prediction {prediction.id}: {str(e)}")
+
+    def _refresh_pending_shap(self, pending, statuses):
+        """
+        Look up pending SHAP runs and collect the rows that changed
+
+        One LIST per prediction owner finds which runs have finished; only
+        those bodies are fetched, concurrently (PREDICTION_POLL_CONCURRENCY).
+        """
+        if not pending:
+            return [], []
+
+        indexes = {}
+        for prediction, _, _ in pending:
+            owner_id = prediction.user_id
+            if owner_id not in indexes:
                 try:
-                    shap_column = prediction.shap_explanation
-                    if shap_column and isinstance(shap_column, dict):
-                        status = shap_column.get('status')
-                        request_id = shap_column.get('request_id')
-                        # Check if SHAP analysis exists
-                        if request_id:
-                            # Get current status
-                            current_status = self.check_shap_analysis_status(
-                                request_id, 
-                                user.id
-                            )
-                            # Add prediction ID to status result
-                            current_status['prediction_id'] = prediction.id
-                            status_results.append(current_status)
-                            
+                    indexes[owner_id] = ShapResultIndex(get_client('s3'), 'mcs09-bucket', owner_id).load()
                 except Exception as e:
-                    print(f"Error processing prediction {prediction.id}: {str(e)}")
-                    continue
+                    indexes[owner_id] = e
 
-            return status_results
+        max_workers = min(len(pending), int(getattr(settings, 'PREDICTION_POLL_CONCURRENCY', 8)))
 
-        except Exception as e:
-            raise Exception(f"Error fetching predictions: {str(e)}")
\ No newline at end of file
+        def fetch(item):
+            prediction, request_id, _ = item
+            index = indexes[prediction.user_id]
+            if isinstance(index, Exception):
+                return None, f"Could not list SHAP results: {str(index)}"
+            try:
+                return index.fetch(request_id), None
+            except Exception as e:
+                return None, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            outcomes = list(executor.map(fetch, pending))
+
+        changed_predictions = []
+        changed_jobs = []
+        for (prediction, request_id, job), (outcome, error) in zip(pending, outcomes):
+            if error is not None:
+                print(f"Error processing prediction {prediction.id}: {error}")
+                statuses[prediction.id] = {'status': 'error', 'error': error}
+                continue
+
+            status, data = outcome
+            if self._apply_shap_outcome(prediction, job, status, data):
+                changed_predictions.append(prediction)
+                if job is not None:
+                    changed_jobs.append(job)
+
+            if job is not None and status == 'processing':
+                statuses[prediction.id] = self._job_status(job)
+            else:
+                statuses[prediction.id] = self._outcome_status(request_id, status, data)
+        return changed_predictions, changed_jobs
@@ -0,0 +1,131 @@
+import ast
+import io
+import struct
+import zipfile
+
+# Downsampling factors offered for heatmap grids; 224 / 8 = 28 cells a side
+SCALES = (1, 2, 4, 8)
+
+# numpy dtype strings written by the Lambda's artifacts.pack
+_STRUCT_CODES = {
+    '<f2': 'e',
+    '<f4': 'f',
+    '<f8': 'd',
+    '|u1': 'B',
+    '<u2': 'H',
+    '<i4': 'i',
+    '<i8': 'q',
+}
+
+
+def read_npy(data):
+    """
+    Minimal .npy reader, so serving stored arrays does not need numpy in the API
+
+    Returns:
+        tuple: (shape, flat tuple of values in C order)
+    """
+    if data[:6] != b'\x93NUMPY':
+        raise ValueError("Not an .npy array")
+    if data[6] == 1:
+        header_len = struct.unpack('<H', data[8:10])[0]
+        offset = 10
+    else:
+        header_len = struct.unpack('<I', data[8:12])[0]
+        offset = 12
+    header = ast.literal_eval(data[offset:offset + header_len].decode('latin1'))
+    offset += header_len
+
+    code = _STRUCT_CODES.get(header['descr'])
+    if code is None or header['fortran_order']:
+        raise ValueError(f"Unsupported array layout {header['descr']}")
+    shape = tuple(header['shape'])
+    count = 1
+    for size in shape:
+        count *= size
+    return shape, struct.unpack_from(f'<{count}{code}', data, offset)
+
+
+def read_npz(data):
+    """
+    Returns:
+        dict: array name -> (shape, values)
+    """
+    arrays = {}
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for name in archive.namelist():
+            arrays[name[:-len('.npy')]] = read_npy(archive.read(name))
+    return arrays
+
+
+def block_mean(shape, values, factor, scale=1.0):
+    """Downsample a 2-D array by averaging factor x factor blocks"""
+    height, width = shape[0] // factor, shape[1] // factor
+    row_length = shape[1]
+    area = factor * factor
+    rows = []
+    for r in range(height):
+        block_rows = [values[(r * factor + i) * row_length:(r * factor + i + 1) * row_length] for i in range(factor)]
+        rows.append([
+            sum(sum(row[c * factor:(c + 1) * factor]) for row in block_rows) * scale / area
+            for c in range(width)
+        ])
+    return rows
+
+
+def subsample(shape, values, factor):
+    """Downsample a 2-D label map by keeping the top-left label of each block"""
+    row_length = shape[1]
+    return [
+        list(values[r * row_length:(r + 1) * row_length:factor])
+        for r in range(0, (shape[0] // factor) * factor, factor)
+    ]
+
+
+class ShapArtifacts:
+    """
+    The raw arrays a SHAP run stored next to its result.json.
+
+    attributions.npz holds the (H, W, 3) attribution map and the mean |SHAP|
+    heatmap as float16 scaled into [-1, 1] (see *_scale), plus the uint16
+    superpixel labels. Clients can take the whole file or a downsampled
+    heatmap/labels grid for drawing their own overlays.
+    """
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+
+    def url(self, expires_in=3600):
+        """Presigned URL of the .npz itself"""
+        return self.s3_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.key},
+            ExpiresIn=expires_in
+        )
+
+    def load(self):
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)
+        return read_npz(response['Body'].read())
+
+    def heatmap(self, scale=1):
+        """
+        Heatmap and superpixel labels downsampled by ``scale``
+
+        Returns:
+            dict: {'scale', 'shape', 'heatmap': rows of floats, 'labels': rows of ints}
+        """
+        if scale not in SCALES:
+            raise ValueError(f"scale must be one of {', '.join(str(s) for s in SCALES)}")
+
+        arrays = self.load()
+        heatmap_shape, heatmap = arrays['heatmap']
+        heatmap_scale = arrays['heatmap_scale'][1][0]
+        labels_shape, labels = arrays['labels']
+        return {
+            'scale': scale,
+            'shape': [heatmap_shape[0] // scale, heatmap_shape[1] // scale],
+            'heatmap': block_mean(heatmap_shape, heatmap, scale, heatmap_scale),
+            'labels': subsample(labels_shape, labels, scale)
+        }
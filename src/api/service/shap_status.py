@@ -0,0 +1,82 @@
+import json
+
+RESULT_FILE = 'result.json'
+ERROR_FILE = 'error.json'
+REQUEST_FILE = 'request.json'
+
+
+def result_outcome(result):
+    """
+    The Lambda writes result.json twice: first with status 'analyzed' once the
+    numbers are ready, then with status 'completed' once the visualization URL
+    is in. Older runs only ever wrote the final file.
+    """
+    if isinstance(result, dict) and result.get('status') == 'analyzed':
+        return 'analyzed'
+    return 'completed'
+
+
+class ShapResultIndex:
+    """
+    What the shap-analysis Lambda has written for one user, from a single
+    paginated ListObjectsV2 over requests/{user_id}/.
+
+    The Lambda writes request.json when a run starts and result.json or
+    error.json when it ends, all under requests/{user_id}/{request_id}/. Listing
+    the prefix once tells us the state of every run, so only runs that have
+    actually finished need a GET for their body.
+    """
+
+    def __init__(self, s3_client, bucket, user_id):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = f'requests/{user_id}/'
+        self.files = {}
+        self.pages = 0
+        self.objects = 0
+
+    def load(self):
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            self.pages += 1
+            for item in page.get('Contents', []):
+                self.objects += 1
+                # requests/{user_id}/{request_id}/{file}
+                parts = item['Key'][len(self.prefix):].split('/')
+                if len(parts) == 2:
+                    self.files.setdefault(parts[0], set()).add(parts[1])
+        return self
+
+    def key(self, request_id, file_name):
+        return f'{self.prefix}{request_id}/{file_name}'
+
+    def outcome(self, request_id):
+        """
+        Returns:
+            'completed', 'failed' or 'processing' (only request.json, or nothing yet).
+            A listing cannot tell a partial result.json from a final one; fetch() can.
+        """
+        files = self.files.get(request_id, ())
+        if RESULT_FILE in files:
+            return 'completed'
+        if ERROR_FILE in files:
+            return 'failed'
+        return 'processing'
+
+    def fetch(self, request_id):
+        """
+        Fetch the body that goes with the run's outcome
+
+        Returns:
+            tuple: (outcome, parsed result/error, or None while processing);
+                   outcome is 'analyzed' while the visualization is pending
+        """
+        outcome = self.outcome(request_id)
+        if outcome == 'processing':
+            return outcome, None
+        file_name = RESULT_FILE if outcome == 'completed' else ERROR_FILE
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key(request_id, file_name))
+        data = json.loads(response['Body'].read().decode('utf-8'))
+        if outcome == 'completed':
+            outcome = result_outcome(data)
+        return outcome, data
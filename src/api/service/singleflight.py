@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import Future
+from django.core.cache import cache
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key.
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight wait on the same Future and get the same result (or exception).
+    Nothing is remembered once the call finishes, so this only absorbs
+    double-clicks and client retries, it is not a cache.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, fn, timeout=None):
+        """
+        Args:
+            key: Identifies identical work, e.g. "predict:<user>:<image hash>"
+            fn: Zero-argument callable doing the work
+            timeout: Seconds a waiting caller blocks before giving up
+
+        Returns:
+            The result of ``fn``, shared by every concurrent caller
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats['calls'] += 1
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+
+def acquire_shared_lock(key, value, timeout):
+    """
+    Claim ``key`` in the shared cache for ``timeout`` seconds.
+
+    ``cache.add`` only writes when the key is absent, so with Redis exactly one
+    worker across all processes wins. The loser gets back whatever the winner
+    stored, which lets it reuse the winner's work instead of repeating it.
+
+    Returns:
+        tuple: (acquired, stored value)
+    """
+    if cache.add(key, value, timeout):
+        return True, value
+    existing = cache.get(key)
+    if existing is None:
+        # Expired between add() and get(); try once more
+        if cache.add(key, value, timeout):
+            return True, value
+    return False, existing
+
+
+def release_shared_lock(key):
+    cache.delete(key)
+
+
+_single_flight = None
+_lock = threading.Lock()
+
+
+def get_single_flight():
+    """Process-wide SingleFlight"""
+    global _single_flight
+    if _single_flight is None:
+        with _lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+def _key(request_id):
+    return f"shap-status:{request_id}"
+
+
+def _timeout(status):
+    """
+    Terminal answers never change, so they are kept until evicted. 'processing',
+    'partial' and unknown request IDs are cached briefly so a polling storm from several
+    tabs costs one backend check per TTL. Other errors are not cached.
+    """
+    state = status.get('status')
+    if state in TERMINAL_STATUSES:
+        return None
+    if state in ('processing', 'partial'):
+        return float(getattr(settings, 'SHAP_STATUS_PROCESSING_TTL', 3))
+    if state == 'error' and 'not found' in str(status.get('error', '')).lower():
+        return float(getattr(settings, 'SHAP_STATUS_NEGATIVE_TTL', 5))
+    return 0
+
+
+def get_status(request_id):
+    try:
+        return cache.get(_key(request_id))
+    except Exception as e:
+        print(f"SHAP status cache unavailable: {str(e)}")
+        return None
+
+
+def store_status(request_id, status):
+    """Cache ``status`` for as long as its state allows"""
+    timeout = _timeout(status)
+    if timeout == 0:
+        return
+    try:
+        cache.set(_key(request_id), status, timeout)
+    except Exception as e:
+        print(f"SHAP status cache unavailable: {str(e)}")
+
+
+def invalidate(request_id):
+    try:
+        cache.delete(_key(request_id))
+    except Exception as e:
+        print(f"SHAP status cache unavailable: {str(e)}")
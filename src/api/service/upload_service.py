@@ -3,6 +3,7 @@ from models.user import User
 from models.file import File
 import boto3
 import utils.mcs09_constants as constants
+from utils.aws_clients import get_client
 
 class UploadService:
     @staticmethod
@@ -26,7 +27,7 @@ class UploadService:
             if not file or not user_id:
                 raise ValueError("File and user_id are required")
 
-            s3 = boto3.client('s3')
+            s3 = get_client('s3')
             file_key = f"{user_id}/{file.name}"
             
             # Upload to S3
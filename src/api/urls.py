@@ -14,7 +14,7 @@ from rest_framework_simplejwt.views import (
 from .views.health_view import HealthView
 from .views.protected_view import ProfileView
 from .views.search_view import PatientSearchView, UserSearchView, DoctorSearchView, DoctorPatientsView
-from .views.prediction_view import ImagePredictionView  
+from .views.prediction_view import ImagePredictionView, ShapCallbackView
 from .views.report_view import ReportView  # Add this import
 
 # Group URL patterns by feature/functionality
@@ -44,9 +44,14 @@ urlpatterns = [
     # Analysis and prediction endpoints
     path('analysis/', include([
         path('predictions/create/', ImagePredictionView.as_view({'post': 'create_prediction'}), name='create-prediction'),
+        path('predictions/batch/', ImagePredictionView.as_view({'post': 'create_batch_prediction'}), name='create-batch-prediction'),
         path('predictions/history/', ImagePredictionView.as_view({'get': 'get_history'}), name='prediction-history'),
         path('predictions/status/', ImagePredictionView.as_view({'post': 'check_shap_status'}), name='check-status'),
+        path('predictions/status/wait/', ImagePredictionView.as_view({'get': 'wait_for_shap_status'}), name='wait-status'),
         path('predictions/poll/', ImagePredictionView.as_view({'post': 'update_shap_statuses'}), name='prediction-poll'),
+        path('predictions/cache/stats/', ImagePredictionView.as_view({'get': 'get_cache_stats'}), name='prediction-cache-stats'),
+        path('predictions/shap/attributions/', ImagePredictionView.as_view({'get': 'get_shap_attributions'}), name='shap-attributions'),
+        path('shap/callback/', ShapCallbackView.as_view(), name='shap-callback'),
     ])),
     
     # AI-generated reports endpoints
@@ -1,15 +1,23 @@
+import json
 from requests import request
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
 
 from rest_framework.decorators import action
 from models.image_prediction import ImagePrediction
 from ..service.prediction_service import PredictionService
-from ..serializers.prediction_serializer import ImagePredictionSerializer
+from ..service.shap_artifacts import SCALES
+from ..serializers.prediction_serializer import (
+    ImagePredictionSerializer,
+    BatchImagePredictionSerializer,
+    BatchPredictionResultSerializer,
+)
+from utils.callback_signing import verify, SIGNATURE_HEADER, TIMESTAMP_HEADER
 
 
 class ImagePredictionView(viewsets.ViewSet):
@@ -41,7 +49,8 @@ class ImagePredictionView(viewsets.ViewSet):
             prediction = self.prediction_service.create_prediction(
                 user=serializer.validated_data['user'],
                 image_url=serializer.validated_data['image_url'],
-                include_shap=serializer.validated_data.get('include_shap', False)
+                include_shap=serializer.validated_data.get('include_shap', False),
+                method=serializer.validated_data.get('explanation_method')
             )
 
             # Create a new serializer instance with the prediction object
@@ -53,6 +62,64 @@ class ImagePredictionView(viewsets.ViewSet):
                 'error': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @extend_schema(
+        request=BatchImagePredictionSerializer,
+        responses={
+            200: BatchPredictionResultSerializer(many=True),
+            207: BatchPredictionResultSerializer(many=True),
+            400: {"type": "object", "properties": {"error": {"type": "string"}}}
+        },
+        description="Create predictions for a list of image URLs. Items are processed "
+                    "independently; 207 is returned when any of them failed."
+    )
+    def create_batch_prediction(self, request):
+        try:
+            data = request.data.copy()
+            if 'user' not in data:
+                data['user'] = request.user.id
+
+            serializer = BatchImagePredictionSerializer(data=data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            results = self.prediction_service.create_predictions(
+                user=serializer.validated_data['user'],
+                image_urls=serializer.validated_data['image_urls'],
+                include_shap=serializer.validated_data.get('include_shap', False),
+                method=serializer.validated_data.get('explanation_method')
+            )
+
+            response_serializer = BatchPredictionResultSerializer(results, many=True)
+            any_failed = any(result['status'] == 'failed' for result in results)
+            return Response(
+                response_serializer.data,
+                status=status.HTTP_207_MULTI_STATUS if any_failed else status.HTTP_200_OK
+            )
+
+        except Exception as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @extend_schema(
+        responses={
+            200: {
+                "type": "object",
+                "properties": {
+                    "memory_hits": {"type": "integer"},
+                    "shared_hits": {"type": "integer"},
+                    "misses": {"type": "integer"},
+                    "stores": {"type": "integer"},
+                    "entries": {"type": "integer"},
+                    "hit_rate": {"type": "number"}
+                }
+            }
+        },
+        description="Hit and miss counters of this worker's content-hash prediction cache"
+    )
+    def get_cache_stats(self, request):
+        return Response(self.prediction_service.get_cache_stats())
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -192,4 +259,203 @@ class ImagePredictionView(viewsets.ViewSet):
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='user_id', description='ID of the user', required=False, type=str),
+            OpenApiParameter(name='request_id', description='ID of the request', required=True, type=str),
+            OpenApiParameter(
+                name='timeout',
+                description='Seconds to wait for the analysis to finish (capped by SHAP_WAIT_MAX_TIMEOUT)',
+                required=False,
+                type=float
+            ),
+            OpenApiParameter(
+                name='since',
+                description="Status the client already has: 'processing' (default) or 'partial'",
+                required=False,
+                type=str
+            )
+        ],
+        responses={
+            200: {"type": "object", "properties": {"status": {"type": "string"}}},
+            400: {"type": "object", "properties": {"error": {"type": "string"}}}
+        },
+        description="Long-poll for a SHAP analysis. Responds as soon as the analysis completes or fails, "
+                    "or with status 'processing' once the timeout expires; clients then simply ask again. "
+                    "Status 'partial' means the numeric analysis is available and the visualization is "
+                    "still rendering; pass since=partial to wait for the rest."
+    )
+    def wait_for_shap_status(self, request):
+        """
+        Wait for a prediction analysis to leave processing
+        """
+        try:
+            request_id = request.query_params.get('request_id')
+            if not request_id:
+                return Response(
+                    {'error': 'request_id is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                timeout = request.query_params.get('timeout')
+                timeout = float(timeout) if timeout is not None else None
+            except ValueError:
+                return Response(
+                    {'error': 'timeout must be a number of seconds'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            since = request.query_params.get('since', 'processing')
+            if since not in ('processing', 'partial'):
+                return Response(
+                    {'error': "since must be 'processing' or 'partial'"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            status_result = self.prediction_service.wait_for_shap_status(
+                request_id=request_id,
+                user_id=request.query_params.get('user_id') or request.user.id,
+                timeout=timeout,
+                since=since
+            )
+
+            if status_result.get('status') == 'error':
+                return Response(
+                    status_result,
+                    status=status.HTTP_404_NOT_FOUND if 'not found' in status_result.get('error', '')
+                    else status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            return Response(status_result)
+
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='user_id', description='ID of the user', required=False, type=str),
+            OpenApiParameter(name='request_id', description='ID of the SHAP analysis request', required=True, type=str),
+            OpenApiParameter(
+                name='scale',
+                description='Downsampling factor (1, 2, 4 or 8) for a JSON heatmap and label grid; '
+                            'omit for a presigned URL of the full .npz',
+                required=False,
+                type=int
+            )
+        ],
+        responses={
+            200: {"type": "object", "properties": {"url": {"type": "string"}, "heatmap": {"type": "array"}}},
+            400: {"type": "object", "properties": {"error": {"type": "string"}}},
+            404: {"type": "object", "properties": {"error": {"type": "string"}}}
+        },
+        description="Raw SHAP attribution map and superpixel labels of an analysis, for client-side heatmaps"
+    )
+    def get_shap_attributions(self, request):
+        """
+        Serve the stored SHAP arrays, whole or as a downsampled grid
+        """
+        try:
+            request_id = request.query_params.get('request_id')
+            if not request_id:
+                return Response(
+                    {'error': 'request_id is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            scale = request.query_params.get('scale')
+            if scale is not None:
+                try:
+                    scale = int(scale)
+                except ValueError:
+                    scale = None
+                if scale not in SCALES:
+                    return Response(
+                        {'error': f"scale must be one of {', '.join(str(s) for s in SCALES)}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            result = self.prediction_service.get_shap_attributions(
+                request_id=request_id,
+                user_id=request.query_params.get('user_id') or request.user.id,
+                scale=scale
+            )
+
+            if result.get('status') == 'error':
+                return Response(
+                    result,
+                    status=status.HTTP_404_NOT_FOUND if 'not found' in result.get('error', '')
+                    else status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            return Response(result)
+
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class ShapCallbackView(APIView):
+    """
+    Receives job status updates from the shap-analysis Lambda.
+
+    The Lambda has no user token, so the request is authenticated by an
+    HMAC signature over the raw body with SHAP_CALLBACK_SECRET instead.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        request={
+            "type": "object",
+            "properties": {
+                "request_id": {"type": "string"},
+                "status": {"type": "string", "enum": ["running", "analyzed", "completed", "failed"]},
+                "result": {"type": "object"},
+                "error": {"type": "object"}
+            }
+        },
+        responses={
+            200: {"type": "object", "properties": {"status": {"type": "string"}}},
+            403: {"type": "object", "properties": {"error": {"type": "string"}}},
+            404: {"type": "object", "properties": {"error": {"type": "string"}}},
+            409: {"type": "object", "properties": {"error": {"type": "string"}}}
+        },
+        description="Signed status callback for asynchronous SHAP analysis jobs"
+    )
+    def post(self, request):
+        body = request.body
+        if not verify(
+            body,
+            getattr(settings, 'SHAP_CALLBACK_SECRET', ''),
+            request.headers.get(TIMESTAMP_HEADER),
+            request.headers.get(SIGNATURE_HEADER),
+            max_skew=getattr(settings, 'SHAP_CALLBACK_MAX_SKEW', 300)
+        ):
+            return Response({'error': 'Invalid signature'}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return Response({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = PredictionService().handle_shap_callback(payload)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if result.get('status') == 'error':
+            return Response(
+                result,
+                status=status.HTTP_404_NOT_FOUND if 'No SHAP job' in result.get('error', '')
+                else status.HTTP_409_CONFLICT
+            )
+        return Response(result)
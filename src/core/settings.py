@@ -80,6 +80,88 @@ DATABASES = {
 # Model directory
 MODEL_DIR = os.path.join(BASE_DIR, 'models')
 
+# Prediction backend for PredictionService.invoke_endpoint: 'sagemaker', 'local' or 'http'
+PREDICTION_BACKEND = os.environ.get('PREDICTION_BACKEND', 'sagemaker')
+# Base URL of a SageMaker-protocol server (POST /invocations) for the http backend
+PREDICTION_HTTP_URL = os.environ.get('PREDICTION_HTTP_URL')
+# Version of the model served at PREDICTION_HTTP_URL; change it on every deploy.
+# Unset, http predictions are not cached
+PREDICTION_HTTP_MODEL_VERSION = os.environ.get('PREDICTION_HTTP_MODEL_VERSION')
+PREDICTION_TIMEOUT = int(os.environ.get('PREDICTION_TIMEOUT', 30))
+# analysis/predictions/batch/: max URLs per request and concurrent inference calls
+PREDICTION_BATCH_MAX_SIZE = int(os.environ.get('PREDICTION_BATCH_MAX_SIZE', 50))
+PREDICTION_BATCH_CONCURRENCY = int(os.environ.get('PREDICTION_BATCH_CONCURRENCY', 8))
+# Pending SHAP statuses checked in parallel by analysis/predictions/poll/
+PREDICTION_POLL_CONCURRENCY = int(os.environ.get('PREDICTION_POLL_CONCURRENCY', 8))
+
+# Content-hash prediction cache: in-process LRU in front of the Django cache
+PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'True') == 'True'
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_MAX_ENTRIES', 1024))
+PREDICTION_CACHE_TIMEOUT = int(os.environ.get('PREDICTION_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+# Longest an in-flight SHAP run claims its (user, image hash) in the shared
+# cache; duplicate requests reuse its request ID until it finishes
+SHAP_DEDUPE_TTL = int(os.environ.get('SHAP_DEDUPE_TTL', 300))
+# SHAP quality preset (fast, standard, thorough) used when a request sets
+# include_shap=true rather than naming one
+SHAP_DEFAULT_PRESET = os.environ.get('SHAP_DEFAULT_PRESET', 'standard')
+# Explanation method (shap_partition, gradcam, integrated_gradients) used when
+# a request does not set explanation_method
+SHAP_DEFAULT_METHOD = os.environ.get('SHAP_DEFAULT_METHOD', 'shap_partition')
+# The shap-analysis Lambda reports job status to SHAP_CALLBACK_URL (the public
+# URL of api/analysis/shap/callback/), signed with SHAP_CALLBACK_SECRET.
+# Without it, status checks find finished jobs from the result files in S3
+SHAP_CALLBACK_URL = os.environ.get('SHAP_CALLBACK_URL')
+SHAP_CALLBACK_SECRET = os.environ.get('SHAP_CALLBACK_SECRET', '')
+SHAP_CALLBACK_MAX_SKEW = int(os.environ.get('SHAP_CALLBACK_MAX_SKEW', 300))
+# analysis/predictions/status/wait/ holds a request at most SHAP_WAIT_MAX_TIMEOUT
+# seconds (keep it under the API Gateway limit) and re-reads the job row every
+# SHAP_WAIT_RECHECK_SECONDS in case the callback reached another worker
+SHAP_WAIT_MAX_TIMEOUT = float(os.environ.get('SHAP_WAIT_MAX_TIMEOUT', 25))
+SHAP_WAIT_RECHECK_SECONDS = float(os.environ.get('SHAP_WAIT_RECHECK_SECONDS', 5))
+# Status checks are cached per request_id: 'processing' for a few seconds,
+# unknown request IDs briefly, completed/failed until evicted
+SHAP_STATUS_PROCESSING_TTL = float(os.environ.get('SHAP_STATUS_PROCESSING_TTL', 3))
+SHAP_STATUS_NEGATIVE_TTL = float(os.environ.get('SHAP_STATUS_NEGATIVE_TTL', 5))
+# analysis/predictions/shap/attributions/ hands out presigned .npz URLs valid for
+# SHAP_ARTIFACT_URL_EXPIRY seconds and caches downsampled heatmap grids
+SHAP_ARTIFACT_URL_EXPIRY = int(os.environ.get('SHAP_ARTIFACT_URL_EXPIRY', 3600))
+SHAP_ARTIFACT_CACHE_TIMEOUT = int(os.environ.get('SHAP_ARTIFACT_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Django cache. Per-process memory by default; set REDIS_URL to share cached
+# predictions between workers (RedisCache needs the redis package in requirements.txt)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+
+# SageMaker endpoint resolution: pin a name to skip discovery, otherwise
+# list_endpoints() is cached for SAGEMAKER_ENDPOINT_TTL seconds
+SAGEMAKER_ENDPOINT_NAME = os.environ.get('SAGEMAKER_ENDPOINT_NAME')
+SAGEMAKER_ENDPOINT_TTL = int(os.environ.get('SAGEMAKER_ENDPOINT_TTL', 60))
+
+# Shared boto3 client pools and retries (see utils.aws_clients)
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 50))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+AWS_RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'standard')
+AWS_CONNECT_TIMEOUT = int(os.environ.get('AWS_CONNECT_TIMEOUT', 5))
+AWS_READ_TIMEOUT = int(os.environ.get('AWS_READ_TIMEOUT', 60))
+
+# In-process inference micro-batching (see ml.batching)
+ML_BATCH_MAX_SIZE = int(os.environ.get('ML_BATCH_MAX_SIZE', 8))
+ML_BATCH_MAX_WAIT_MS = int(os.environ.get('ML_BATCH_MAX_WAIT_MS', 10))
+ML_BATCH_QUEUE_SIZE = int(os.environ.get('ML_BATCH_QUEUE_SIZE', 256))
+
+# Inference backend for ModelService: 'eager', 'torchscript' or 'onnx' (see ml.compiled_backends)
+ML_INFERENCE_BACKEND = os.environ.get('ML_INFERENCE_BACKEND', 'eager')
+ML_BACKEND_PARITY_ATOL = float(os.environ.get('ML_BACKEND_PARITY_ATOL', 1e-3))
+
+# Int8 quantization for ModelService: 'none', 'dynamic' or 'static' (see ml.quantization)
+ML_QUANTIZATION = os.environ.get('ML_QUANTIZATION', 'none')
+ML_QUANT_CALIBRATION_DIR = os.environ.get('ML_QUANT_CALIBRATION_DIR')
+
 # Rest Framework settings
 REST_FRAMEWORK = {
     # 'DEFAULT_AUTHENTICATION_CLASSES': [
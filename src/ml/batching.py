@@ -0,0 +1,192 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class _BatchItem:
+    __slots__ = ('payload', 'size', 'future', 'enqueued_at')
+
+    def __init__(self, payload, size):
+        self.payload = payload
+        self.size = size
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchingEngine:
+    """
+    Dynamic micro-batching for model inference.
+
+    Callers on any thread submit a payload and get a Future back. A single
+    worker thread drains the bounded queue, waiting up to ``max_wait_ms`` or
+    until ``max_batch_size`` images have been collected, then hands the whole
+    batch to ``runner`` in one call.
+
+    ``runner`` receives the list of payloads and must return a list of results
+    in the same order. It is responsible for the actual forward pass, which
+    keeps this class free of any torch dependency.
+    """
+
+    def __init__(self, runner, max_batch_size=8, max_wait_ms=10, max_queue_size=256, name='inference-batcher'):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.runner = runner
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Item pulled off the queue that did not fit in the previous batch
+        self._carry = None
+
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._batches = 0
+        self._requests = 0
+        self._images = 0
+        self._errors = 0
+        self._rejected = 0
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def shutdown(self, timeout=None):
+        """Stop the worker after the queue has been drained"""
+        self._stopped.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def submit(self, payload, size=1, timeout=None):
+        """
+        Queue a payload for the next batch.
+
+        Args:
+            payload: The input handed to ``runner``
+            size: Number of images contained in the payload
+            timeout: Seconds to wait for room in the queue, ``None`` blocks
+
+        Returns:
+            concurrent.futures.Future resolving to this payload's result
+
+        Raises:
+            queue.Full: If the queue is still full after ``timeout``
+        """
+        if self._stopped.is_set():
+            raise RuntimeError("Batching engine has been shut down")
+        self.start()
+
+        item = _BatchItem(payload, size)
+        try:
+            self._queue.put(item, timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise
+
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, depth)
+        return item.future
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the deadline passes"""
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                return []
+
+        batch = [first]
+        images = first.size
+        deadline = time.monotonic() + self.max_wait
+
+        while images < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if images + item.size > self.max_batch_size:
+                self._carry = item
+                break
+            batch.append(item)
+            images += item.size
+
+        return batch
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty() and self._carry is None):
+            batch = self._collect()
+            if not batch:
+                continue
+
+            # Skip callers that gave up while queued
+            batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            try:
+                results = self.runner([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"Batch runner returned {len(results)} results for {len(batch)} requests"
+                    )
+                for item, result in zip(batch, results):
+                    item.future.set_result(result)
+                failed = False
+            except Exception as e:
+                logger.error(f"Batched inference failed: {str(e)}")
+                for item in batch:
+                    item.future.set_exception(e)
+                failed = True
+            finished = time.monotonic()
+
+            images = sum(item.size for item in batch)
+            with self._stats_lock:
+                self._batches += 1
+                self._requests += len(batch)
+                self._images += images
+                self._batch_sizes[images] += 1
+                self._total_wait += sum(started - item.enqueued_at for item in batch)
+                self._total_run += finished - started
+                if failed:
+                    self._errors += 1
+
+    def stats(self):
+        """Snapshot of queue depth and batch-size distribution"""
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'queue_capacity': self._queue.maxsize,
+                'batches': self._batches,
+                'requests': self._requests,
+                'images': self._images,
+                'errors': self._errors,
+                'rejected': self._rejected,
+                'batch_size_distribution': dict(sorted(self._batch_sizes.items())),
+                'mean_batch_size': self._images / self._batches if self._batches else 0.0,
+                'mean_wait_ms': 1000 * self._total_wait / self._requests if self._requests else 0.0,
+                'mean_run_ms': 1000 * self._total_run / self._batches if self._batches else 0.0,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            }
@@ -0,0 +1,182 @@
+import os
+import time
+
+import torch
+
+INPUT_SHAPE = (1, 3, 224, 224)
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+
+class EagerBackend:
+    name = 'eager'
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.model(batch.to(self.device))
+
+
+class TorchScriptBackend:
+    """Frozen TorchScript graph; conv/relu stacks are fused when the graph is frozen"""
+    name = 'torchscript'
+    suffix = '.torchscript.pt'
+
+    def __init__(self, module, device):
+        self.module = module
+        self.device = device
+
+    @classmethod
+    def export(cls, model, device, path):
+        example = torch.randn(*INPUT_SHAPE, device=device)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            frozen = torch.jit.freeze(traced.eval())
+        frozen.save(path)
+
+    @classmethod
+    def load(cls, path, device):
+        module = torch.jit.load(path, map_location=device)
+        # Inference-only rewrites (conv/bn folding, mkldnn layouts) do not survive
+        # serialisation, so they are applied after every load instead of at export
+        module = torch.jit.optimize_for_inference(module)
+        return cls(module, device)
+
+    def __call__(self, batch):
+        with torch.no_grad():
+            return self.module(batch.to(self.device))
+
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider"""
+    name = 'onnx'
+    suffix = '.onnx'
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    @classmethod
+    def export(cls, model, device, path):
+        example = torch.randn(*INPUT_SHAPE, device=device)
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                example,
+                path,
+                input_names=['input'],
+                output_names=['logits'],
+                dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+                opset_version=17,
+            )
+
+    @classmethod
+    def load(cls, path, device):
+        # Optional dependency, only needed when the onnx backend is selected
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        return cls(session)
+
+    def __call__(self, batch):
+        logits = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+_COMPILED = {
+    TorchScriptBackend.name: TorchScriptBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+
+def artifact_path(model_path, backend_name, quantization='none'):
+    """
+    Compiled artifacts are cached next to model.pth, e.g. model.torchscript.pt.
+    A quantized graph has different weights and kernels from the fp32 one, so
+    the mode is part of the name: model.dynamic.torchscript.pt.
+    """
+    root, _ = os.path.splitext(model_path)
+    if quantization and quantization != 'none':
+        root = f"{root}.{quantization}"
+    return root + _COMPILED[backend_name].suffix
+
+
+def _is_fresh(artifact, model_path):
+    return os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(model_path)
+
+
+def check_parity(reference, candidate, device, atol=1e-3, batch_size=2):
+    """
+    Compare logits from the eager model and a compiled backend on a fixed random batch
+
+    Returns:
+        dict: max absolute difference and whether it is within ``atol``
+    """
+    generator = torch.Generator().manual_seed(0)
+    batch = torch.randn(batch_size, *INPUT_SHAPE[1:], generator=generator)
+    expected = reference(batch).cpu()
+    actual = candidate(batch).cpu()
+    max_abs_diff = float((expected - actual).abs().max())
+    return {
+        'max_abs_diff': max_abs_diff,
+        'atol': atol,
+        'passed': max_abs_diff <= atol,
+    }
+
+
+def build_backend(name, model, device, model_path, atol=1e-3, quantization='none'):
+    """
+    Build the configured inference backend, exporting and caching the compiled
+    artifact if it is missing or older than model.pth. ``quantization`` is the
+    mode applied to ``model`` and selects which cached artifact is used.
+
+    Falls back to eager (and says why in the returned info) if the export, the
+    runtime or the parity check fails, so a bad artifact never serves traffic.
+
+    Returns:
+        tuple: (callable backend taking an NCHW tensor and returning logits, info dict)
+    """
+    eager = EagerBackend(model, device)
+    info = {'requested': name, 'backend': eager.name}
+    if name not in BACKENDS:
+        info['error'] = f"Unknown inference backend '{name}', expected one of {', '.join(BACKENDS)}"
+        print(f"❌ {info['error']}")
+        return eager, info
+    if name == eager.name:
+        return eager, info
+
+    backend_cls = _COMPILED[name]
+    path = artifact_path(model_path, name, quantization)
+    info['artifact'] = path
+    try:
+        start = time.perf_counter()
+        if _is_fresh(path, model_path):
+            info['artifact_cache'] = 'hit'
+        else:
+            print(f"Exporting {name} artifact to: {path}")
+            backend_cls.export(model, device, path)
+            info['artifact_cache'] = 'miss'
+        info['export_ms'] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        backend = backend_cls.load(path, device)
+        info['load_ms'] = (time.perf_counter() - start) * 1000
+
+        info['parity'] = check_parity(eager, backend, device, atol=atol)
+        if not info['parity']['passed']:
+            raise ValueError(
+                f"{name} logits differ from eager by {info['parity']['max_abs_diff']:.2e} (atol {atol})"
+            )
+    except Exception as e:
+        info['error'] = str(e)
+        print(f"❌ Falling back to eager inference: {str(e)}")
+        if os.path.exists(path):
+            os.remove(path)
+        return eager, info
+
+    info['backend'] = name
+    print(f"✓ Serving predictions from {name} backend (max logit diff {info['parity']['max_abs_diff']:.2e})")
+    return backend, info
@@ -1,16 +1,27 @@
 from django.conf import settings
 import torch
 import torch.nn as nn
-from torchvision import models
+from torchvision import models, transforms
+from PIL import Image
 from datetime import datetime
+import inspect
+import io
 import os
+import threading
+import time
 import boto3
 
+from .batching import BatchingEngine
+from .compiled_backends import build_backend
+from .quantization import quantize_model, calibration_batches_from_dir
+
 class CNNModel(nn.Module):
-    def __init__(self):
+    def __init__(self, pretrained=False):
         super(CNNModel, self).__init__()
-        # Initialize VGG16 with pretrained weights
-        self.vgg16 = models.vgg16(weights=models.VGG16_Weights.IMAGENET1K_V1)
+        # Only pull the ImageNet weights when training from scratch. For inference
+        # every parameter is overwritten by model.pth, so build the bare architecture.
+        weights = models.VGG16_Weights.IMAGENET1K_V1 if pretrained else None
+        self.vgg16 = models.vgg16(weights=weights)
 
         # Freeze feature layers
         for param in self.vgg16.features.parameters():
@@ -23,11 +34,91 @@ class CNNModel(nn.Module):
     def forward(self, x):
         return self.vgg16(x)
 
+
+def _supports_assign():
+    """load_state_dict(assign=True) landed in torch 2.1"""
+    try:
+        return 'assign' in inspect.signature(nn.Module.load_state_dict).parameters
+    except Exception:
+        return False
+
+
+def read_state_dict(model_path, device):
+    """
+    Read a checkpoint with memory-mapped tensor storage where torch supports it,
+    so weights are paged in from disk instead of copied into fresh buffers.
+    """
+    try:
+        state_dict = torch.load(model_path, map_location=device, mmap=True)
+    except TypeError:
+        # torch < 2.1 has no mmap argument
+        state_dict = torch.load(model_path, map_location=device)
+    except RuntimeError:
+        # Legacy (non-zipfile) checkpoints cannot be mmapped
+        state_dict = torch.load(model_path, map_location=device)
+
+    # Handle different types of saved states
+    if isinstance(state_dict, dict):
+        if 'model_state_dict' in state_dict:
+            state_dict = state_dict['model_state_dict']
+        elif 'state_dict' in state_dict:
+            state_dict = state_dict['state_dict']
+    return state_dict
+
+
+def load_cnn_model(model_path, device):
+    """
+    Build CNNModel and load model.pth into it as cheaply as possible.
+
+    On torch >= 2.1 the module is constructed on the meta device (no allocation,
+    no random init) and the checkpoint tensors are assigned in place. Older torch,
+    or a checkpoint that does not cover every parameter, falls back to building
+    the bare architecture on ``device`` and copying the weights in.
+
+    Returns:
+        tuple: (model in eval mode, incompatible keys, timings dict in ms)
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    state_dict = read_state_dict(model_path, device)
+    timings['load_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    model = None
+    incompatible_keys = None
+    if _supports_assign():
+        with torch.device('meta'):
+            meta_model = CNNModel()
+        incompatible_keys = meta_model.load_state_dict(state_dict, strict=False, assign=True)
+        if not incompatible_keys.missing_keys:
+            model = meta_model.to(device)
+            for param in model.vgg16.features.parameters():
+                param.requires_grad = False
+            timings['construction'] = 'meta'
+
+    if model is None:
+        model = CNNModel().to(device)
+        incompatible_keys = model.load_state_dict(state_dict, strict=False)
+        timings['construction'] = 'eager'
+    timings['construct_ms'] = (time.perf_counter() - start) * 1000
+
+    model.eval()
+    return model, incompatible_keys, timings
+
 class ModelService:
     _instance = None
     _model = None
     _device = None
     _initialized = False
+    _load_timings = None
+    _backend = None
+    _backend_info = None
+    _quantization_info = None
+    _transform = None
+    _model_version = None
+    _batcher = None
+    _batcher_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -76,22 +167,16 @@ class ModelService:
                 raise FileNotFoundError("Could not find or download model.pth")
 
             print(f"Loading model from: {model_path}")
+            stat = os.stat(model_path)
+            self._model_version = f"{stat.st_size}-{int(stat.st_mtime)}"
             
-            # Initialize model
-            self._model = CNNModel().to(self._device)
-            
-            # Load state dict
-            state_dict = torch.load(model_path, map_location=self._device)
-            
-            # Handle different types of saved states
-            if isinstance(state_dict, dict):
-                if 'model_state_dict' in state_dict:
-                    state_dict = state_dict['model_state_dict']
-                elif 'state_dict' in state_dict:
-                    state_dict = state_dict['state_dict']
-
-            # Load the state dict
-            incompatible_keys = self._model.load_state_dict(state_dict, strict=False)
+            # Build the model and load the checkpoint
+            self._model, incompatible_keys, self._load_timings = load_cnn_model(model_path, self._device)
+            print(
+                f"Checkpoint loaded in {self._load_timings['load_ms']:.0f} ms, "
+                f"model constructed ({self._load_timings['construction']}) in "
+                f"{self._load_timings['construct_ms']:.0f} ms"
+            )
             
             # Print loading results
             if incompatible_keys.missing_keys:
@@ -106,6 +191,17 @@ class ModelService:
             self._model.eval()
             print("✓ Model loaded successfully and set to evaluation mode")
 
+            self._apply_quantization()
+
+            self._backend, self._backend_info = build_backend(
+                getattr(settings, 'ML_INFERENCE_BACKEND', 'eager'),
+                self._model,
+                self._device,
+                model_path,
+                atol=getattr(settings, 'ML_BACKEND_PARITY_ATOL', 1e-3),
+                quantization=(self._quantization_info or {}).get('mode', 'none'),
+            )
+
         except Exception as e:
             print(f"\n❌ Error loading model: {str(e)}")
             raise
@@ -115,6 +211,108 @@ class ModelService:
 
     def get_device(self):
         return self._device
+
+    def get_load_timings(self):
+        return self._load_timings
+
+    def _apply_quantization(self):
+        """Optionally swap the fp32 model for an int8 one (CPU only)"""
+        mode = getattr(settings, 'ML_QUANTIZATION', 'none')
+        if mode == 'none':
+            return
+        if self._device.type != 'cpu':
+            print(f"Skipping {mode} quantization: int8 kernels are CPU only")
+            return
+
+        calibration = None
+        if mode == 'static':
+            calibration = calibration_batches_from_dir(getattr(settings, 'ML_QUANT_CALIBRATION_DIR', None))
+        self._model, self._quantization_info = quantize_model(self._model, mode, calibration, inplace=True)
+        print(
+            f"✓ Applied {self._quantization_info['mode']} quantization: "
+            f"{self._quantization_info['size_mb_fp32']:.0f} MB -> {self._quantization_info['size_mb']:.0f} MB"
+        )
+
+    def get_model_version(self):
+        """Checkpoint identity plus anything that changes its outputs"""
+        backend = (self._backend_info or {}).get('backend', 'eager')
+        quantization = (self._quantization_info or {}).get('mode', 'none')
+        return f"{self._model_version}-{backend}-{quantization}"
+
+    def get_quantization_info(self):
+        return self._quantization_info
+
+    def get_backend(self):
+        """Callable mapping an NCHW tensor to logits for the configured backend"""
+        return self._backend
+
+    def get_backend_info(self):
+        return self._backend_info
+
+    def get_batcher(self):
+        """
+        Get the shared micro-batching engine, creating it on first use
+        """
+        if self._batcher is None:
+            # Concurrent first requests must share one engine and worker thread
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = BatchingEngine(
+                        runner=self._run_batch,
+                        max_batch_size=getattr(settings, 'ML_BATCH_MAX_SIZE', 8),
+                        max_wait_ms=getattr(settings, 'ML_BATCH_MAX_WAIT_MS', 10),
+                        max_queue_size=getattr(settings, 'ML_BATCH_QUEUE_SIZE', 256),
+                    )
+        return self._batcher
+
+    def preprocess(self, image_bytes):
+        """
+        Decode image bytes into the normalised (3, 224, 224) tensor the model expects
+        """
+        if self._transform is None:
+            self._transform = transforms.Compose([
+                transforms.Resize((224, 224)),
+                transforms.ToTensor(),
+                transforms.Normalize(
+                    mean=[0.485, 0.456, 0.406],
+                    std=[0.229, 0.224, 0.225]
+                )
+            ])
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return self._transform(image.convert('RGB'))
+
+    def predict_async(self, image_tensor, timeout=None):
+        """
+        Queue a preprocessed image tensor for batched inference
+
+        Args:
+            image_tensor: Normalised tensor of shape (3, H, W) or (N, 3, H, W)
+            timeout: Seconds to wait for room in the queue
+
+        Returns:
+            Future resolving to a CPU tensor of class probabilities, shape (N, 2)
+        """
+        if image_tensor.dim() == 3:
+            image_tensor = image_tensor.unsqueeze(0)
+        return self.get_batcher().submit(image_tensor, size=image_tensor.shape[0], timeout=timeout)
+
+    def predict(self, image_tensor, timeout=None):
+        """Blocking wrapper around predict_async"""
+        return self.predict_async(image_tensor, timeout=timeout).result(timeout)
+
+    def get_batching_stats(self):
+        if self._batcher is None:
+            return None
+        return self._batcher.stats()
+
+    def _run_batch(self, tensors):
+        """Run one forward pass over every queued request and split the probabilities back out"""
+        sizes = [t.shape[0] for t in tensors]
+        batch = torch.cat(tensors, dim=0)
+        with torch.no_grad():
+            output = self._backend(batch)
+            probs = torch.nn.functional.softmax(output, dim=1).cpu()
+        return list(torch.split(probs, sizes, dim=0))
     
     def _download_model_from_s3(self):
         """Download model from S3 if in production environment"""
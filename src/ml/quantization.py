@@ -0,0 +1,228 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+
+QUANTIZATION_MODES = ('none', 'dynamic', 'static')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def quantize_dynamic(model):
+    """
+    Dynamic int8 quantization of the nn.Linear layers, in place.
+
+    The VGG16 classifier holds ~120M of the 138M parameters, so this is where
+    almost all of the memory saving comes from. Weights are stored as int8 and
+    activations are quantized on the fly, so no calibration data is needed.
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        model,
+        {nn.Linear},
+        dtype=torch.qint8,
+        inplace=True,
+    )
+
+
+def _fuse_conv_relu(features):
+    """Fuse each Conv2d followed by ReLU in the VGG feature stack"""
+    pairs = []
+    modules = list(features.named_children())
+    for (name, module), (next_name, next_module) in zip(modules, modules[1:]):
+        if isinstance(module, nn.Conv2d) and isinstance(next_module, nn.ReLU):
+            pairs.append([name, next_name])
+    if pairs:
+        torch.ao.quantization.fuse_modules(features, pairs, inplace=True)
+    return features
+
+
+def quantize_static_features(model, calibration_batches, backend='fbgemm'):
+    """
+    Static int8 quantization of the convolutional feature extractor.
+
+    Conv/ReLU pairs are fused, observers are calibrated on ``calibration_batches``
+    (an iterable of normalised NCHW tensors) and the stack is wrapped in
+    quant/dequant stubs so the fp32 classifier still receives float input.
+    """
+    torch.backends.quantized.engine = backend
+    features = _fuse_conv_relu(copy.deepcopy(model.vgg16.features).eval())
+    wrapped = nn.Sequential(
+        torch.ao.quantization.QuantStub(),
+        features,
+        torch.ao.quantization.DeQuantStub(),
+    ).eval()
+    wrapped.qconfig = torch.ao.quantization.get_default_qconfig(backend)
+    torch.ao.quantization.prepare(wrapped, inplace=True)
+
+    with torch.no_grad():
+        for batch in calibration_batches:
+            wrapped(batch)
+
+    torch.ao.quantization.convert(wrapped, inplace=True)
+    model.vgg16.features = wrapped
+    return model
+
+
+def quantize_model(model, mode, calibration_batches=None, inplace=False):
+    """
+    Return a quantized version of ``model`` for ``mode``.
+
+    ``static`` quantizes the conv features statically and the linear layers
+    dynamically. Without calibration data it degrades to ``dynamic``.
+    Pass ``inplace=True`` when the fp32 model is not needed afterwards, to avoid
+    holding two copies of the weights at peak.
+
+    Returns:
+        tuple: (model, info dict describing what was applied)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}', expected one of {', '.join(QUANTIZATION_MODES)}")
+
+    info = {'requested': mode, 'mode': mode, 'size_mb_fp32': state_dict_size_mb(model)}
+    if mode == 'none':
+        info['size_mb'] = info['size_mb_fp32']
+        return model, info
+
+    start = time.perf_counter()
+    quantized = (model if inplace else copy.deepcopy(model)).cpu().eval()
+    if mode == 'static':
+        if calibration_batches:
+            quantized = quantize_static_features(quantized, calibration_batches)
+        else:
+            print("No calibration images available, applying dynamic quantization only")
+            info['mode'] = 'dynamic'
+    quantized = quantize_dynamic(quantized)
+
+    info['quantize_ms'] = (time.perf_counter() - start) * 1000
+    info['size_mb'] = state_dict_size_mb(quantized)
+    return quantized, info
+
+
+def _tensor_bytes(value):
+    if isinstance(value, torch.Tensor):
+        if value.is_quantized:
+            return value.int_repr().element_size() * value.numel()
+        return value.element_size() * value.numel()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def state_dict_size_mb(model):
+    """
+    Size of the model weights, the number that matters for Lambda memory.
+
+    Counted from the state dict (which includes dynamic-quant packed params)
+    rather than serialised, so it costs nothing on a 1024 MB container.
+    """
+    return sum(_tensor_bytes(v) for v in model.state_dict().values()) / (1024 * 1024)
+
+
+def list_images(image_dir):
+    return sorted(
+        os.path.join(image_dir, name)
+        for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def load_image_tensor(path):
+    """Same RGB / 224x224 / ImageNet normalisation used for inference"""
+    from PIL import Image
+    from torchvision import transforms
+
+    transform = transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225]
+        )
+    ])
+    with Image.open(path) as image:
+        return transform(image.convert('RGB'))
+
+
+def calibration_batches_from_dir(image_dir, batch_size=8, limit=64):
+    """Load up to ``limit`` images from ``image_dir`` as normalised batches"""
+    if not image_dir or not os.path.isdir(image_dir):
+        return []
+    tensors = [load_image_tensor(path) for path in list_images(image_dir)[:limit]]
+    return [torch.stack(tensors[i:i + batch_size]) for i in range(0, len(tensors), batch_size)]
+
+
+def drift_report(fp32_model, quantized_model, image_dir):
+    """
+    Compare a quantized model against the fp32 model on every image in ``image_dir``
+
+    Returns:
+        dict: prediction agreement, probability drift, latency and weight size
+    """
+    paths = list_images(image_dir)
+    if not paths:
+        raise ValueError(f"No images found in {image_dir}")
+
+    agreements = 0
+    prob_diffs = []
+    fp32_time = 0.0
+    quantized_time = 0.0
+    disagreements = []
+
+    with torch.no_grad():
+        for path in paths:
+            x = load_image_tensor(path).unsqueeze(0)
+
+            start = time.perf_counter()
+            fp32_probs = torch.nn.functional.softmax(fp32_model(x), dim=1)[0]
+            fp32_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            quantized_probs = torch.nn.functional.softmax(quantized_model(x), dim=1)[0]
+            quantized_time += time.perf_counter() - start
+
+            fp32_pred = int(torch.argmax(fp32_probs))
+            quantized_pred = int(torch.argmax(quantized_probs))
+            if fp32_pred == quantized_pred:
+                agreements += 1
+            else:
+                disagreements.append(os.path.basename(path))
+            prob_diffs.append(float((fp32_probs - quantized_probs).abs().max()))
+
+    n = len(paths)
+    return {
+        'num_images': n,
+        'prediction_agreement': agreements / n,
+        'disagreements': disagreements,
+        'mean_abs_prob_diff': sum(prob_diffs) / n,
+        'max_abs_prob_diff': max(prob_diffs),
+        'fp32_mean_latency_ms': 1000 * fp32_time / n,
+        'quantized_mean_latency_ms': 1000 * quantized_time / n,
+        'fp32_size_mb': state_dict_size_mb(fp32_model),
+        'quantized_size_mb': state_dict_size_mb(quantized_model),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report int8 quantization drift against the fp32 model')
+    parser.add_argument('--model', required=True, help='Path to model.pth')
+    parser.add_argument('--images', required=True, help='Folder of evaluation images')
+    parser.add_argument('--mode', default='dynamic', choices=QUANTIZATION_MODES[1:])
+    parser.add_argument('--calibration', help='Folder of calibration images for static mode (defaults to --images)')
+    args = parser.parse_args()
+
+    from .model_service import load_cnn_model
+
+    fp32_model, _, _ = load_cnn_model(args.model, torch.device('cpu'))
+    calibration = calibration_batches_from_dir(args.calibration or args.images) if args.mode == 'static' else None
+    quantized_model, info = quantize_model(fp32_model, args.mode, calibration)
+
+    report = drift_report(fp32_model, quantized_model, args.images)
+    report['quantization'] = info
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,9 @@ class ImagePrediction(models.Model):
     image_url = models.URLField(max_length=2000)
     prediction = models.JSONField(null=True)
     shap_explanation = models.JSONField(null=True)
-    request_id = models.CharField(max_length=255, null=True, blank=True)
+    request_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    # Set on rows written with bulk_create so their ids can be read back on MySQL
+    insert_token = models.CharField(max_length=32, null=True, blank=True, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
     created_by = models.CharField(max_length=100)
     
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('models', '0014_imageprediction_request_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageprediction',
+            name='request_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='ShapJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(max_length=255, unique=True)),
+                ('image_url', models.URLField(max_length=2000)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shap_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'shap_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('models', '0015_shapjob_imageprediction_request_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shapjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('analyzed', 'Analyzed'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('models', '0016_alter_shapjob_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageprediction',
+            name='insert_token',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
@@ -3,4 +3,5 @@ from .user import User
 from .report import Report
 from .hospital import Hospital
 from .image_prediction import ImagePrediction
+from .shap_job import ShapJob
 # This file allows Django to discover your User model
\ No newline at end of file
@@ -0,0 +1,88 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+
+class ShapJob(models.Model):
+    """
+    One asynchronous SHAP analysis run.
+
+    The shap-analysis Lambda reports progress through the signed callback
+    endpoint, so a status check is a single read on the indexed request_id
+    instead of probing S3 for result.json / error.json.
+
+    ANALYZED means the numeric analysis is stored in ``result`` while the
+    visualization is still being rendered; the job is not terminal yet.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    ANALYZED = 'analyzed'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (ANALYZED, 'Analyzed'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+    TERMINAL_STATUSES = (COMPLETED, FAILED)
+    TRANSITIONS = {
+        QUEUED: (RUNNING, ANALYZED, COMPLETED, FAILED),
+        RUNNING: (ANALYZED, COMPLETED, FAILED),
+        ANALYZED: (COMPLETED, FAILED),
+        COMPLETED: (),
+        FAILED: (),
+    }
+
+    request_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='shap_jobs'
+    )
+    image_url = models.URLField(max_length=2000)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        db_table = 'shap_job'
+
+    def __str__(self):
+        return f"SHAP job {self.request_id} ({self.status})"
+
+    @property
+    def is_terminal(self):
+        return self.status in self.TERMINAL_STATUSES
+
+    def can_transition(self, new_status):
+        return new_status in self.TRANSITIONS.get(self.status, ())
+
+    def transition(self, new_status, result=None, error=None):
+        """
+        Move the job to ``new_status``, stamping started_at/completed_at.
+
+        Raises:
+            ValueError: If the state machine does not allow the move
+        """
+        if not self.can_transition(new_status):
+            raise ValueError(f"Cannot move SHAP job {self.request_id} from {self.status} to {new_status}")
+
+        now = timezone.now()
+        self.status = new_status
+        if new_status == self.RUNNING:
+            self.started_at = now
+        if new_status in self.TERMINAL_STATUSES:
+            self.completed_at = now
+            self.started_at = self.started_at or now
+        if result is not None:
+            self.result = result
+        if error is not None:
+            self.error = error
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 import sys
 from unittest.mock import MagicMock, patch
@@ -105,6 +106,7 @@ MOCK_MODULES = {
     'cv2': MagicMock(),
     'botocore': MagicMock(),
     'botocore.exceptions': MagicMock(),
+    'botocore.config': MagicMock(),
     'django.conf': MagicMock(),
     'django.db': MagicMock(),
     'django.db.models': MagicMock(),
@@ -112,6 +114,58 @@ MOCK_MODULES = {
     'io': MagicMock()
 }
 
+# The real numpy, for tests of array code; everything else sees mock_np.
+# numpy loads submodules lazily, so import the ones tests use while it is visible.
+import numpy as real_numpy
+import numpy.random
+import numpy.testing
+
+# The real io and Pillow, for tests that encode and decode images. Pillow imports
+# its plugins and helpers lazily from the PIL package, so wrap such tests in
+# using_real_pil() to make the real one visible again.
+import io as real_io
+import PIL.Image as real_pil_image
+import PIL.ImageDraw
+import PIL.ImageFont
+real_pil_image.init()
+REAL_PIL_MODULES = {name: module for name, module in sys.modules.items()
+                    if name == 'PIL' or name.startswith('PIL.')}
+
+# The real torch, when installed, for tests that need actual tensors. Its modules
+# are kept out of sys.modules so every other test keeps seeing mock_torch; wrap
+# such tests in using_real_torch() and import the code under test inside it.
+try:
+    import torch as real_torch
+    import torch.ao.quantization
+    try:
+        # Reference transforms for the preprocessing tests
+        import torchvision.transforms
+    except ImportError:
+        pass
+    REAL_TORCH_MODULES = {name: module for name, module in sys.modules.items()
+                          if name.split('.')[0] in ('torch', 'torchvision')}
+    for name in REAL_TORCH_MODULES:
+        del sys.modules[name]
+except ImportError:
+    real_torch = None
+    REAL_TORCH_MODULES = {}
+
+
+def using_real_torch():
+    return patch.dict('sys.modules', dict(REAL_TORCH_MODULES, numpy=real_numpy))
+
+
+def using_real_pil():
+    return patch.dict('sys.modules', REAL_PIL_MODULES)
+
+
+def load_module(name, path):
+    """Execute a fresh copy of the module at ``path``, bound to whatever sys.modules holds now"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 # Apply mocks before any test imports
 for mod_name, mock in MOCK_MODULES.items():
     sys.modules[mod_name] = mock
@@ -0,0 +1,98 @@
+import json
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+import batch_tuner
+
+from .conftest import real_numpy
+
+
+@pytest.fixture(autouse=True)
+def reset_choices(monkeypatch):
+    """Auto mode, a fixed hardware signature and no remembered choices"""
+    monkeypatch.setattr(batch_tuner, 'BATCH_SIZE', 'auto')
+    monkeypatch.setattr(batch_tuner, 'MEMORY_CEILING_MB', 800.0)
+    monkeypatch.setattr(batch_tuner, 'hardware_signature', lambda: {'memory_mb': '1024', 'cpus': 2})
+    batch_tuner.clear()
+    yield
+    batch_tuner.clear()
+
+
+def _measurement(batch_size, images_per_second, peak_rss_mb):
+    return {'batch_size': batch_size, 'images_per_second': images_per_second, 'peak_rss_mb': peak_rss_mb}
+
+
+def test_choose_prefers_smallest_size_near_best_throughput():
+    measurements = [
+        _measurement(1, 2.0, 500),
+        _measurement(4, 2.9, 600),
+        _measurement(8, 3.0, 700),
+        _measurement(16, 4.0, 900),  # fastest, but over the ceiling
+    ]
+
+    assert batch_tuner.choose(measurements) == 4
+    assert batch_tuner.choose(measurements, ceiling_mb=1000) == 16
+    # Nothing fits: the smallest batch keeps the footprint lowest
+    assert batch_tuner.choose(measurements, ceiling_mb=400) == 1
+    assert batch_tuner.choose([]) is None
+
+
+def test_probe_stops_before_a_size_expected_to_exceed_ceiling(monkeypatch):
+    monkeypatch.setattr(batch_tuner, 'np', real_numpy)
+    run_batch = MagicMock()
+
+    with patch('batch_tuner.peak_rss_mb', side_effect=[500.0, 620.0, 780.0]):
+        measurements = batch_tuner.probe(run_batch, candidates=[16, 1, 8, 4])
+
+    # Warm-up, then 1, 4 and 8; 16 would reach ~1100 MB
+    assert [len(call.args[0]) for call in run_batch.call_args_list] == [1, 1, 4, 8]
+    assert [m['batch_size'] for m in measurements] == [1, 4, 8]
+    assert measurements[-1]['peak_rss_mb'] == 780.0
+
+
+def test_choice_is_probed_once_and_shared_through_s3():
+    s3 = MagicMock()
+    s3.get_object.side_effect = Exception('NoSuchKey')
+    measurements = [_measurement(1, 2.0, 500), _measurement(4, 3.0, 600)]
+
+    with patch('batch_tuner.probe', return_value=measurements) as mock_probe:
+        first, info1 = batch_tuner.get_batch_size(MagicMock(), 'v1', s3_client=s3, bucket='bucket')
+        second, info2 = batch_tuner.get_batch_size(MagicMock(), 'v1', s3_client=s3, bucket='bucket')
+
+    assert (first, second) == (4, 4)
+    assert (info1['source'], info2['source']) == ('probe', 'memory')
+    mock_probe.assert_called_once()
+    stored = s3.put_object.call_args.kwargs
+    assert stored['Key'] == 'tuning/batch_size/v1/none/memory_mb1024-cpus2.json'
+
+    # A new container with the same model and hardware reads the stored choice
+    batch_tuner.clear()
+    s3.get_object.side_effect = None
+    s3.get_object.return_value = {'Body': MagicMock(read=MagicMock(return_value=stored['Body']))}
+    with patch('batch_tuner.probe') as mock_probe:
+        batch_size, info = batch_tuner.get_batch_size(MagicMock(), 'v1', s3_client=s3, bucket='bucket')
+
+    assert batch_size == 4
+    assert info['source'] == 's3'
+    assert info['measurements'] == json.loads(stored['Body'])['measurements']
+    mock_probe.assert_not_called()
+
+
+def test_new_model_version_is_probed_again():
+    with patch('batch_tuner.probe', return_value=[_measurement(8, 3.0, 600)]) as mock_probe:
+        batch_tuner.get_batch_size(MagicMock(), 'v1')
+        batch_tuner.get_batch_size(MagicMock(), 'v2')
+
+    assert mock_probe.call_count == 2
+
+
+def test_fixed_and_preset_modes_skip_the_probe(monkeypatch):
+    with patch('batch_tuner.probe') as mock_probe:
+        monkeypatch.setattr(batch_tuner, 'BATCH_SIZE', 'preset')
+        assert batch_tuner.get_batch_size(MagicMock(), 'v1') == (None, {'source': 'preset'})
+
+        monkeypatch.setattr(batch_tuner, 'BATCH_SIZE', '12')
+        assert batch_tuner.get_batch_size(MagicMock(), 'v1') == (12, {'source': 'config'})
+
+    mock_probe.assert_not_called()
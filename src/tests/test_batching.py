@@ -0,0 +1,118 @@
+import threading
+import time
+import pytest
+
+from ml.batching import BatchingEngine
+
+
+def _doubling_runner(calls):
+    def runner(payloads):
+        calls.append(list(payloads))
+        return [p * 2 for p in payloads]
+    return runner
+
+
+def test_concurrent_requests_are_batched():
+    """Requests submitted together should share a single runner call"""
+    calls = []
+    engine = BatchingEngine(_doubling_runner(calls), max_batch_size=8, max_wait_ms=200)
+    try:
+        barrier = threading.Barrier(4)
+        futures = [None] * 4
+
+        def worker(i):
+            barrier.wait()
+            futures[i] = engine.submit(i)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert [f.result(timeout=2) for f in futures] == [0, 2, 4, 6]
+        assert len(calls) == 1
+        stats = engine.stats()
+        assert stats['requests'] == 4
+        assert stats['batch_size_distribution'] == {4: 1}
+    finally:
+        engine.shutdown(timeout=2)
+
+
+def test_batch_size_limit_is_respected():
+    calls = []
+    engine = BatchingEngine(_doubling_runner(calls), max_batch_size=2, max_wait_ms=50)
+    try:
+        futures = [engine.submit(i) for i in range(5)]
+        assert [f.result(timeout=2) for f in futures] == [0, 2, 4, 6, 8]
+        assert all(len(c) <= 2 for c in calls)
+        assert engine.stats()['images'] == 5
+    finally:
+        engine.shutdown(timeout=2)
+
+
+def test_runner_error_propagates_to_every_caller():
+    def failing_runner(payloads):
+        raise ValueError("boom")
+
+    engine = BatchingEngine(failing_runner, max_batch_size=4, max_wait_ms=20)
+    try:
+        futures = [engine.submit(i) for i in range(2)]
+        for f in futures:
+            with pytest.raises(ValueError):
+                f.result(timeout=2)
+        assert engine.stats()['errors'] >= 1
+    finally:
+        engine.shutdown(timeout=2)
+
+
+def test_full_queue_rejects_submission():
+    release = threading.Event()
+
+    def slow_runner(payloads):
+        release.wait(2)
+        return payloads
+
+    engine = BatchingEngine(slow_runner, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+    try:
+        first = engine.submit('a')
+        time.sleep(0.05)  # let the worker pick up the first item
+        engine.submit('b')
+        with pytest.raises(Exception):
+            engine.submit('c', timeout=0.01)
+        assert engine.stats()['rejected'] == 1
+        release.set()
+        assert first.result(timeout=2) == 'a'
+    finally:
+        release.set()
+        engine.shutdown(timeout=2)
+
+
+def test_model_service_creates_one_batcher_under_concurrent_first_use():
+    """Concurrent first requests must share a single engine and worker thread"""
+    from unittest.mock import patch, MagicMock
+    from ml import model_service
+
+    def slow_engine(**kwargs):
+        time.sleep(0.05)
+        return MagicMock()
+
+    # Skip the singleton's model load; only the batcher is under test
+    service = object.__new__(model_service.ModelService)
+    service._batcher = None
+    barrier = threading.Barrier(8)
+    batchers = []
+
+    def worker():
+        barrier.wait()
+        batchers.append(service.get_batcher())
+
+    with patch.object(model_service, 'BatchingEngine', side_effect=slow_engine) as mock_engine:
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    mock_engine.assert_called_once()
+    assert len({id(b) for b in batchers}) == 1
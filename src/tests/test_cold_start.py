@@ -0,0 +1,29 @@
+import sys
+import unittest
+
+import cold_start
+
+
+class TestColdStart(unittest.TestCase):
+    def test_lazy_module_imports_on_first_use(self):
+        sys.modules.pop('colorsys', None)
+        lazy = cold_start.lazy_import('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+
+        self.assertEqual(lazy.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn('colorsys', sys.modules)
+        self.assertIn('colorsys', cold_start.report()['imports_ms'])
+
+    def test_report_includes_phases(self):
+        with cold_start.phase('model_cache'):
+            pass
+        cold_start.record_phase('weight_load', 12.5)
+
+        report = cold_start.report()
+        self.assertIn('model_cache', report['phases_ms'])
+        self.assertEqual(report['phases_ms']['weight_load'], 12.5)
+        self.assertIn('cold_start', report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import sys
+from unittest.mock import patch, MagicMock
+
+# Import and set up mocked dependencies
+from .conftest import mock_torch
+
+sys.modules['torch'] = mock_torch
+
+from ml import compiled_backends
+from ml.compiled_backends import build_backend, artifact_path
+
+
+def test_artifacts_live_next_to_checkpoint():
+    assert artifact_path('/srv/api/model.pth', 'torchscript') == '/srv/api/model.torchscript.pt'
+    assert artifact_path('/srv/api/model.pth', 'onnx') == '/srv/api/model.onnx'
+    assert artifact_path('/srv/api/model.pth', 'onnx', 'none') == '/srv/api/model.onnx'
+    assert artifact_path('/srv/api/model.pth', 'torchscript', 'dynamic') == '/srv/api/model.dynamic.torchscript.pt'
+    assert artifact_path('/srv/api/model.pth', 'onnx', 'static') == '/srv/api/model.static.onnx'
+
+
+def test_unknown_backend_falls_back_to_eager():
+    backend, info = build_backend('tensorrt', MagicMock(), 'cpu', 'model.pth')
+    assert backend.name == 'eager'
+    assert info['backend'] == 'eager'
+    assert 'error' in info
+
+
+def test_parity_failure_falls_back_to_eager(tmp_path, monkeypatch):
+    # conftest stubs os.path.exists globally; artifact freshness needs the real check
+    monkeypatch.setattr(compiled_backends.os.path, 'exists', os.path.isfile)
+    model_path = tmp_path / 'model.pth'
+    model_path.write_bytes(b'weights')
+
+    def fake_export(model, device, path):
+        with open(path, 'wb') as f:
+            f.write(b'graph')
+
+    with patch.object(compiled_backends.TorchScriptBackend, 'export', side_effect=fake_export), \
+         patch.object(compiled_backends.TorchScriptBackend, 'load', return_value=MagicMock()), \
+         patch('ml.compiled_backends.check_parity', return_value={'max_abs_diff': 1.0, 'atol': 1e-3, 'passed': False}):
+        backend, info = build_backend('torchscript', MagicMock(), 'cpu', str(model_path))
+
+    assert backend.name == 'eager'
+    assert info['requested'] == 'torchscript'
+    assert 'differ' in info['error']
+    # A compiled artifact that failed parity must not be reused
+    assert not os.path.isfile(artifact_path(str(model_path), 'torchscript'))
+
+
+def test_artifact_built_for_another_quantization_mode_is_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setattr(compiled_backends.os.path, 'exists', os.path.isfile)
+    model_path = tmp_path / 'model.pth'
+    model_path.write_bytes(b'weights')
+    # A fresh fp32 artifact from an earlier ML_QUANTIZATION=none run
+    (tmp_path / 'model.torchscript.pt').write_bytes(b'fp32 graph')
+
+    def fake_export(model, device, path):
+        with open(path, 'wb') as f:
+            f.write(b'int8 graph')
+
+    with patch.object(compiled_backends.TorchScriptBackend, 'export', side_effect=fake_export) as mock_export, \
+         patch.object(compiled_backends.TorchScriptBackend, 'load', return_value=MagicMock()) as mock_load, \
+         patch('ml.compiled_backends.check_parity', return_value={'max_abs_diff': 0.0, 'atol': 1e-3, 'passed': True}):
+        _, info = build_backend('torchscript', MagicMock(), 'cpu', str(model_path), quantization='dynamic')
+
+    assert info['artifact_cache'] == 'miss'
+    mock_export.assert_called_once()
+    assert mock_load.call_args.args[0] == str(tmp_path / 'model.dynamic.torchscript.pt')
+    assert (tmp_path / 'model.torchscript.pt').read_bytes() == b'fp32 graph'
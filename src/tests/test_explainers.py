@@ -0,0 +1,107 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+import explainers
+
+from .conftest import real_numpy, real_torch, using_real_torch
+
+
+class TestExplainers(unittest.TestCase):
+    def test_resolve_defaults_and_rejects_unknown_methods(self):
+        with patch.object(explainers, 'DEFAULT_METHOD', 'shap_partition'):
+            self.assertEqual(explainers.resolve(None), 'shap_partition')
+        self.assertEqual(explainers.resolve('gradcam'), 'gradcam')
+        with self.assertRaises(ValueError):
+            explainers.resolve('lime')
+
+    def test_shap_partition_returns_top_class_attributions(self):
+        values = real_numpy.arange(2 * 3 * 3 * 1, dtype=real_numpy.float32).reshape(1, 2, 3, 3, 1)
+        service = MagicMock()
+        service.explain.return_value = (MagicMock(values=values), [0.2, 0.8])
+        params = {'masker': 'inpaint_telea', 'max_evals': 70, 'batch_size': 5, 'ig_steps': 32}
+
+        explainer = explainers.create('shap_partition', service)
+        attributions, probs = explainer.explain('image', params)
+
+        service.explain.assert_called_once_with('image', params)
+        self.assertEqual(attributions.shape, (2, 3, 3))
+        self.assertEqual(probs, [0.2, 0.8])
+        # Only the parameters the method ran with are recorded
+        self.assertEqual(explainer.params(params), {'masker': 'inpaint_telea', 'max_evals': 70, 'batch_size': 5})
+        self.assertEqual(explainers.create('gradcam', service).params(params), {})
+        self.assertEqual(explainers.create('integrated_gradients', service).params(params),
+                         {'ig_steps': 32, 'batch_size': 5})
+
+
+@unittest.skipIf(real_torch is None, 'needs torch')
+class TestGradientExplainers(unittest.TestCase):
+    """Grad-CAM and integrated gradients on a tiny conv net with the real torch"""
+
+    def setUp(self):
+        modules = using_real_torch()
+        modules.start()
+        self.addCleanup(modules.stop)
+        for name, module in (('torch', real_torch), ('np', real_numpy)):
+            attribute = patch.object(explainers, name, module)
+            attribute.start()
+            self.addCleanup(attribute.stop)
+
+        nn = real_torch.nn
+        real_torch.manual_seed(0)
+        self.model = nn.Sequential(
+            nn.Conv2d(3, 8, 5, stride=4, padding=2), nn.ReLU(),
+            nn.Conv2d(8, 8, 3, stride=2, padding=1), nn.ReLU(),
+            nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(8, 2),
+        ).eval()
+        # Record the batch size of every forward pass
+        self.batches = []
+        self.model.register_forward_hook(lambda module, inputs, output: self.batches.append(inputs[0].shape[0]))
+
+        def preprocess(batch):
+            x = real_torch.from_numpy(batch).permute(0, 3, 1, 2)
+            return (x - 0.45) / 0.22
+
+        self.service = MagicMock(model=self.model, preprocess=preprocess)
+        self.image = real_numpy.random.default_rng(0).random((224, 224, 3), dtype=real_numpy.float32)
+
+    def _probabilities(self, image):
+        x = self.service.preprocess(real_numpy.expand_dims(image, 0))
+        with real_torch.no_grad():
+            return real_torch.nn.functional.softmax(self.model(x), dim=1)[0].numpy()
+
+    def test_gradcam_map_is_non_negative_image_sized(self):
+        attributions, probs = explainers.create('gradcam', self.service).explain(self.image, {})
+
+        self.assertEqual(attributions.shape, (224, 224, 3))
+        self.assertEqual(attributions.dtype, real_numpy.float32)
+        self.assertGreaterEqual(float(attributions.min()), 0.0)
+        # One map, repeated over the colour channels
+        real_numpy.testing.assert_array_equal(attributions[..., 0], attributions[..., 2])
+        # One forward and one backward pass
+        self.assertEqual(self.batches, [1])
+        real_numpy.testing.assert_allclose(probs, self._probabilities(self.image), rtol=1e-5)
+
+    def test_integrated_gradients_add_up_to_the_output_change(self):
+        attributions, probs = explainers.create('integrated_gradients', self.service).explain(
+            self.image, {'ig_steps': 64, 'batch_size': 16})
+
+        self.assertEqual(attributions.shape, (224, 224, 3))
+        self.assertEqual(attributions.dtype, real_numpy.float32)
+        pred = int(probs.argmax())
+        expected = probs[pred] - self._probabilities(real_numpy.zeros_like(self.image))[pred]
+        self.assertGreater(abs(expected), 1e-3)
+        self.assertAlmostEqual(float(attributions.sum()), float(expected), delta=0.02 * abs(expected))
+
+    def test_integrated_gradients_follow_preset_steps_and_batch_size(self):
+        params = {'masker': 'inpaint_telea', 'max_evals': 70, 'ig_steps': 12, 'batch_size': 5}
+        explainer = explainers.create('integrated_gradients', self.service)
+
+        explainer.explain(self.image, params)
+
+        # One pass for the prediction, then 12 path points 5 at a time
+        self.assertEqual(self.batches, [1, 5, 5, 2])
+        self.assertEqual(explainer.params(params), {'ig_steps': 12, 'batch_size': 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
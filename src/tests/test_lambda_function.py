@@ -67,9 +67,50 @@ class TestLambdaFunction(unittest.TestCase):
         mock_service_instance.analyze_image.assert_called_once_with(
             'https://example.com/test.jpg',
             'test_user',
-            'test_request_123'
+            'test_request_123',
+            on_analysis=unittest.mock.ANY,
+            preset='standard',
+            method='shap_partition'
         )
 
+    @patch('lambda_function.ShapAnalysisService')
+    @patch('lambda_function.boto3.client')
+    def test_numeric_result_is_stored_before_visualization(self, mock_boto3_client, mock_shap_service):
+        mock_s3 = MagicMock()
+        mock_boto3_client.return_value = mock_s3
+
+        def analyze_image(image_url, user_id, request_id, on_analysis=None, preset=None, method=None):
+            on_analysis({'analysis': {'stability_score': 0.9}, 'visualization': {'status': 'pending', 'url': None}})
+            return {'analysis': {'stability_score': 0.9}, 'visualization': {'status': 'completed', 'url': 'https://example.com/shap.png'}}
+        mock_shap_service.return_value.analyze_image.side_effect = analyze_image
+
+        response = lambda_handler(self.test_event, self.test_context)
+
+        self.assertEqual(response['statusCode'], 202)
+        results = [
+            json.loads(c.kwargs['Body']) for c in mock_s3.put_object.call_args_list
+            if c.kwargs['Key'] == 'requests/test_user/test_request_123/result.json'
+        ]
+        self.assertEqual([r['status'] for r in results], ['analyzed', 'completed'])
+        self.assertEqual(results[0]['visualization']['status'], 'pending')
+        self.assertEqual(results[1]['visualization']['url'], 'https://example.com/shap.png')
+
+    def test_unknown_preset_is_rejected(self):
+        event = {'body': dict(json.loads(self.test_event['body']), preset='slow')}
+
+        response = lambda_handler(event, self.test_context)
+
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('slow', json.loads(response['body'])['error'])
+
+    def test_unknown_method_is_rejected(self):
+        event = {'body': dict(json.loads(self.test_event['body']), method='lime')}
+
+        response = lambda_handler(event, self.test_context)
+
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('lime', json.loads(response['body'])['error'])
+
     def test_invalid_request_missing_parameters(self):
         # Test with missing parameters
         invalid_event = {
@@ -0,0 +1,128 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Import and set up mocked dependencies
+from .conftest import mock_torch
+
+sys.modules['torch'] = mock_torch
+sys.modules.setdefault('torch.nn', mock_torch.nn)
+
+import model_cache
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(tmp_path, monkeypatch):
+    """Start every test with an empty warm-container cache"""
+    monkeypatch.setattr(model_cache, 'MODEL_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(model_cache, 'MODEL_REVALIDATE_SECONDS', 0)
+    # conftest stubs os.path.exists globally; the cache needs the real check
+    monkeypatch.setattr(model_cache.os.path, 'exists', os.path.isfile)
+    model_cache.clear()
+    yield
+    model_cache.clear()
+
+
+def _s3_client(etag):
+    s3 = MagicMock()
+    s3.head_object.return_value = {'ETag': f'"{etag}"'}
+
+    def download(bucket, key, path, ExtraArgs=None):
+        with open(path, 'wb') as f:
+            f.write(b'weights')
+
+    s3.download_file.side_effect = download
+    return s3
+
+
+def test_warm_invocation_reuses_model():
+    """Same ETag should skip the download and the deserialisation"""
+    s3 = _s3_client('abc123')
+    model = MagicMock()
+    with patch('model_cache.load_cnn_model', return_value=(model, None, {'load_ms': 1})) as mock_load:
+        first, info1 = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+        second, info2 = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+
+    assert first is second is model
+    assert info1['cache'] == 'miss'
+    assert info2['cache'] == 'hit'
+    assert info2['version'] == 'abc123'
+    # Revalidation HEADs plus the post-download ETag check
+    assert s3.head_object.call_count == 3
+    s3.download_file.assert_called_once()
+    mock_load.assert_called_once()
+
+
+def test_changed_etag_reloads_model():
+    s3 = _s3_client('v1')
+    with patch('model_cache.load_cnn_model', side_effect=[
+        (MagicMock(), None, {}),
+        (MagicMock(), None, {}),
+    ]) as mock_load:
+        old_model, _ = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+        s3.head_object.return_value = {'ETag': '"v2"'}
+        new_model, info = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+
+    assert old_model is not new_model
+    assert info['version'] == 'v2'
+    assert mock_load.call_count == 2
+    assert s3.download_file.call_count == 2
+
+
+def test_failed_revalidation_serves_cached_model():
+    s3 = _s3_client('v1')
+    with patch('model_cache.load_cnn_model', return_value=(MagicMock(), None, {})):
+        model, _ = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+        s3.head_object.side_effect = Exception('network down')
+        cached, info = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+
+    assert cached is model
+    assert info['cache'] == 'stale'
+
+
+def test_quantization_mode_is_part_of_cache_key():
+    """Switching to int8 reloads from the local artifact without re-downloading"""
+    s3 = _s3_client('v1')
+    fp32, int8 = MagicMock(), MagicMock()
+    with patch('model_cache.load_cnn_model', return_value=(MagicMock(), None, {})), \
+         patch('model_cache.quantize_model', side_effect=[
+             (fp32, {'requested': 'none', 'mode': 'none'}),
+             (int8, {'requested': 'dynamic', 'mode': 'dynamic'}),
+         ]):
+        first, _ = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+        second, info = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu', quantization='dynamic')
+
+    assert first is fp32
+    assert second is int8
+    assert info['quantization']['mode'] == 'dynamic'
+    s3.download_file.assert_called_once()
+
+
+def test_versioned_download_is_pinned_to_resolved_version():
+    s3 = _s3_client('abc123')
+    s3.head_object.return_value = {'ETag': '"abc123"', 'VersionId': 'v7'}
+    with patch('model_cache.load_cnn_model', return_value=(MagicMock(), None, {})):
+        _, info = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+
+    assert info['version'] == 'v7'
+    assert s3.download_file.call_args.kwargs['ExtraArgs'] == {'VersionId': 'v7'}
+    s3.head_object.assert_called_once()
+
+
+def test_overwrite_during_unversioned_download_is_not_cached_under_old_etag(tmp_path):
+    """The artifact is re-resolved instead of storing new weights under the old ETag"""
+    s3 = _s3_client('old')
+    s3.head_object.side_effect = [
+        {'ETag': '"old"'},  # revalidation
+        {'ETag': '"new"'},  # overwritten before the download finished
+        {'ETag': '"new"'},  # resolved again
+        {'ETag': '"new"'},  # second download verified
+    ]
+    with patch('model_cache.load_cnn_model', return_value=(MagicMock(), None, {})) as mock_load:
+        _, info = model_cache.get_model(s3, 'bucket', 'model.pth', 'cpu')
+
+    assert info['version'] == 'new'
+    assert s3.download_file.call_count == 2
+    assert sorted(os.listdir(tmp_path)) == ['model-new.pth']
+    assert mock_load.call_args.args[0].endswith('model-new.pth')
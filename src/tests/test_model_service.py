@@ -76,3 +76,12 @@ def test_device_selection():
             model_service = ModelService()
             expected_device = 'cuda' if cuda_available else 'cpu'
             assert str(model_service._device) in [expected_device, 'cpu']
+
+def test_load_timings_recorded(mock_model_state):
+    """Test that checkpoint read and model construction are timed"""
+    with patch('model_service.torch.load', return_value=mock_model_state):
+        model_service = ModelService()
+        timings = model_service.get_load_timings()
+        assert 'load_ms' in timings
+        assert 'construct_ms' in timings
+        assert timings['construction'] in ('meta', 'eager')
@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import patch
+
+import post_analysis
+
+from .conftest import real_numpy as real_np
+
+
+def _loop_analysis(attributions, mean_shap, labels):
+    """The per-superpixel loop compute_analysis used before post_analysis"""
+    np = real_np
+    num_superpixels = np.max(labels) + 1
+    shap_vals_aneurysm = attributions.mean(axis=2)
+    shap_per_superpixel = np.zeros(num_superpixels)
+    for sp in range(num_superpixels):
+        mask = labels == sp
+        if mask.sum() > 0:
+            shap_per_superpixel[sp] = shap_vals_aneurysm[mask].mean()
+    top_indices = np.argsort(shap_per_superpixel)[-5:][::-1]
+
+    h, w = mean_shap.shape
+    quadrants = {
+        'upper_left': mean_shap[:h//2, :w//2],
+        'upper_right': mean_shap[:h//2, w//2:],
+        'lower_left': mean_shap[h//2:, :w//2],
+        'lower_right': mean_shap[h//2:, w//2:]
+    }
+    quadrant_scores = {k: float(np.mean(v)) for k, v in quadrants.items()}
+    total_importance = float(np.sum(np.abs(mean_shap)))
+    return {
+        'most_important_quadrant': max(quadrant_scores.items(), key=lambda x: x[1])[0],
+        'quadrant_scores': quadrant_scores,
+        'relative_importances': {k: float(np.sum(np.abs(v))) / total_importance for k, v in quadrants.items()},
+        'stability_score': float(1 - (np.std(mean_shap) / (np.mean(mean_shap) + 1e-7))),
+        'importance_score': float(np.mean(np.abs(mean_shap))),
+        'superpixel_analysis': {
+            'num_superpixels': int(num_superpixels),
+            'top_superpixels': [int(idx) for idx in top_indices],
+            'top_shap_scores': shap_per_superpixel[top_indices].tolist()
+        }
+    }
+
+
+def _grid_labels(side, height=224, width=224):
+    ys, xs = real_np.mgrid[0:height, 0:width]
+    return (ys * side // height) * side + (xs * side // width)
+
+
+class TestPostAnalysis(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.object(post_analysis, 'np', real_np)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        rng = real_np.random.default_rng(0)
+        self.attributions = rng.normal(0, 1e-4, (224, 224, 3))
+        self.mean_shap = real_np.abs(self.attributions).mean(axis=2)
+
+    def assertAnalysisEqual(self, analysis, expected):
+        self.assertEqual(analysis['most_important_quadrant'], expected['most_important_quadrant'])
+        for key in ('quadrant_scores', 'relative_importances'):
+            for quadrant, value in expected[key].items():
+                self.assertAlmostEqual(analysis[key][quadrant], value, places=12)
+        self.assertAlmostEqual(analysis['stability_score'], expected['stability_score'])
+        self.assertAlmostEqual(analysis['importance_score'], expected['importance_score'])
+
+        superpixels = analysis['superpixel_analysis']
+        self.assertEqual(superpixels['num_superpixels'], expected['superpixel_analysis']['num_superpixels'])
+        self.assertEqual(superpixels['top_superpixels'], expected['superpixel_analysis']['top_superpixels'])
+        real_np.testing.assert_allclose(superpixels['top_shap_scores'],
+                                        expected['superpixel_analysis']['top_shap_scores'], rtol=1e-9)
+
+    def test_summarize_matches_loop(self):
+        labels = _grid_labels(5)
+
+        analysis, top_indices = post_analysis.summarize(self.attributions, self.mean_shap, labels)
+
+        self.assertAnalysisEqual(analysis, _loop_analysis(self.attributions, self.mean_shap, labels))
+        self.assertEqual(list(top_indices), analysis['superpixel_analysis']['top_superpixels'])
+
+    def test_summarize_matches_loop_with_many_segments_and_gaps(self):
+        labels = _grid_labels(15)
+        # SLIC can skip labels; empty superpixels score 0 like the loop did
+        labels[labels == 7] = 8
+        labels[labels == 100] = 101
+
+        analysis, _ = post_analysis.summarize(self.attributions, self.mean_shap, labels)
+
+        self.assertAnalysisEqual(analysis, _loop_analysis(self.attributions, self.mean_shap, labels))
+        self.assertEqual(analysis['superpixel_analysis']['num_superpixels'], 225)
+
+    def test_centroids_match_pixel_means(self):
+        labels = _grid_labels(4, height=100, width=60)
+        labels[labels == 3] = 2
+
+        result = post_analysis.centroids(labels, [5, 3, 2])
+
+        y, x = real_np.where(labels == 5)
+        self.assertAlmostEqual(result[0][0], x.mean())
+        self.assertAlmostEqual(result[0][1], y.mean())
+        self.assertIsNone(result[1])
+        y, x = real_np.where(labels == 2)
+        self.assertAlmostEqual(result[2][0], x.mean())
+        self.assertAlmostEqual(result[2][1], y.mean())
+
+    def test_quadrants_handle_odd_sizes(self):
+        mean_shap = self.mean_shap[:223, :221]
+
+        scores, relative = post_analysis.quadrant_stats(mean_shap)
+
+        self.assertAlmostEqual(scores['lower_right'], float(mean_shap[111:, 110:].mean()), places=12)
+        self.assertAlmostEqual(sum(relative.values()), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,11 @@
+import _io
+import json
+import struct
+import threading
+import time
 import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
 # Mock Django settings and models before importing PredictionService
@@ -15,12 +22,64 @@ image_prediction_mock = MagicMock()
 sys.modules['models.image_prediction'] = MagicMock()
 sys.modules['models.image_prediction'].ImagePrediction = image_prediction_mock
 
+shap_job_mock = MagicMock()
+shap_job_mock.QUEUED, shap_job_mock.RUNNING = 'queued', 'running'
+shap_job_mock.ANALYZED = 'analyzed'
+shap_job_mock.COMPLETED, shap_job_mock.FAILED = 'completed', 'failed'
+sys.modules['models.shap_job'] = MagicMock()
+sys.modules['models.shap_job'].ShapJob = shap_job_mock
+
 # Now import PredictionService after mocking dependencies
 from api.service.prediction_service import PredictionService
+from api.service.prediction_cache import get_prediction_cache
+from api.service.shap_status import ShapResultIndex
+from api.service.shap_artifacts import ShapArtifacts
+from api.service.job_notifier import JobNotifier, get_job_notifier
+from utils.aws_clients import reset_clients
+
+
+class _FakeCache:
+    """Just enough of the Django cache API for the shared SHAP dedupe lock"""
+
+    def __init__(self):
+        self.data = {}
+
+    def add(self, key, value, timeout=None):
+        if key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def _npy(descr, shape, values):
+    """An .npy file as numpy.save writes it (numpy itself is mocked in these tests)"""
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': shape}).encode('latin1')
+    header += b' ' * (63 - (10 + len(header)) % 64) + b'\n'
+    code = {'<f2': 'e', '<f4': 'f', '<u2': 'H'}[descr]
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header + struct.pack(f'<{len(values)}{code}', *values)
 
 
 class TestPredictionService(unittest.TestCase):
     def setUp(self):
+        # Clients and the endpoint name are cached per process
+        reset_clients()
+        PredictionService._endpoint_resolver = None
+        PredictionService._endpoint_config_resolver = None
+        # Query mocks are configured per test
+        shap_job_mock.objects = MagicMock()
+        status_cache_patch = patch('api.service.status_cache.cache')
+        self.status_cache = status_cache_patch.start()
+        self.status_cache.get.return_value = None
+        self.addCleanup(status_cache_patch.stop)
         self.service = PredictionService()
         # Mock user
         self.user = MagicMock()
@@ -40,6 +99,730 @@ class TestPredictionService(unittest.TestCase):
         endpoint_name = self.service.get_endpoint_name()
         self.assertEqual(endpoint_name, 'test-endpoint')
 
+    @patch('boto3.client')
+    def test_endpoint_name_is_cached(self, mock_boto3_client):
+        mock_sagemaker = MagicMock()
+        mock_sagemaker.list_endpoints.return_value = {
+            'Endpoints': [{'EndpointName': 'test-endpoint'}]
+        }
+        mock_boto3_client.return_value = mock_sagemaker
+
+        for _ in range(3):
+            self.assertEqual(self.service.get_endpoint_name(), 'test-endpoint')
+            self.assertEqual(PredictionService().get_endpoint_name(), 'test-endpoint')
+
+        # One control-plane call and one client for the whole process
+        mock_sagemaker.list_endpoints.assert_called_once()
+        mock_boto3_client.assert_called_once()
+
+    @patch('boto3.client')
+    def test_sagemaker_model_version_follows_endpoint_config(self, mock_boto3_client):
+        """An in-place UpdateEndpoint moves the prediction cache to a new key"""
+        from api.service.inference_backend import get_inference_backend
+        mock_sagemaker = MagicMock()
+        mock_sagemaker.list_endpoints.return_value = {'Endpoints': [{'EndpointName': 'test-endpoint'}]}
+        mock_sagemaker.describe_endpoint.return_value = {'EndpointConfigName': 'config-v1'}
+        mock_boto3_client.return_value = mock_sagemaker
+        backend = get_inference_backend(self.service, 'sagemaker')
+
+        self.assertEqual(backend.model_version(), 'sagemaker:test-endpoint:config-v1')
+        self.assertEqual(backend.model_version(), 'sagemaker:test-endpoint:config-v1')
+        # describe_endpoint is cached for the endpoint TTL like list_endpoints
+        mock_sagemaker.describe_endpoint.assert_called_once_with(EndpointName='test-endpoint')
+
+        mock_sagemaker.describe_endpoint.return_value = {'EndpointConfigName': 'config-v2'}
+        resolver = PredictionService.get_endpoint_config_resolver()
+        resolver._fetched_at -= resolver.ttl
+        deadline = time.monotonic() + 2
+        while backend.model_version() != 'sagemaker:test-endpoint:config-v2' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(backend.model_version(), 'sagemaker:test-endpoint:config-v2')
+
+    @patch('api.service.inference_backend.settings')
+    def test_invoke_endpoint_uses_sagemaker_backend(self, mock_settings):
+        mock_settings.PREDICTION_BACKEND = 'sagemaker'
+        mock_runtime = MagicMock()
+        mock_runtime.invoke_endpoint.return_value = {
+            'Body': MagicMock(read=MagicMock(return_value=b'{"prediction": "aneurysm detected", "confidence": 0.9}'))
+        }
+        with patch.object(self.service, 'get_runtime_client', return_value=mock_runtime), \
+             patch.object(self.service, 'get_endpoint_name', return_value='test-endpoint'):
+            result = self.service.invoke_endpoint(self.test_image_url)
+
+        self.assertEqual(result['confidence'], 0.9)
+        mock_runtime.invoke_endpoint.assert_called_once()
+        self.assertEqual(mock_runtime.invoke_endpoint.call_args.kwargs['EndpointName'], 'test-endpoint')
+
+    @patch('api.service.inference_backend.requests.Session')
+    @patch('api.service.inference_backend.settings')
+    def test_invoke_endpoint_uses_http_backend(self, mock_settings, mock_session_cls):
+        from api.service import inference_backend
+        inference_backend._backends.clear()
+        mock_settings.PREDICTION_BACKEND = 'http'
+        mock_settings.PREDICTION_HTTP_URL = 'http://localhost:8080/'
+        mock_settings.PREDICTION_TIMEOUT = 5
+        mock_session = mock_session_cls.return_value
+        mock_session.post.return_value.json.return_value = {'prediction': 'no aneurysm detected', 'confidence': 0.7}
+
+        result = self.service.invoke_endpoint(self.test_image_url)
+
+        self.assertEqual(result['prediction'], 'no aneurysm detected')
+        self.assertEqual(mock_session.post.call_args.args[0], 'http://localhost:8080/invocations')
+        inference_backend._backends.clear()
+
+    @patch('api.service.inference_backend.settings')
+    def test_invoke_endpoint_rejects_unknown_backend(self, mock_settings):
+        mock_settings.PREDICTION_BACKEND = 'carrier-pigeon'
+        with self.assertRaises(Exception) as ctx:
+            self.service.invoke_endpoint(self.test_image_url)
+        self.assertIn('Unknown prediction backend', str(ctx.exception))
+
+    def test_create_predictions_partial_failure(self):
+        """One failing image must not fail the rest of the batch"""
+        urls = ['https://example.com/a.jpg', 'https://example.com/bad.jpg', 'https://example.com/c.jpg']
+
+        def fake_invoke(image_url, image_bytes=None):
+            if 'bad' in image_url:
+                raise Exception('endpoint timeout')
+            return {'prediction': 'no aneurysm detected', 'confidence': 0.8}
+
+        image_prediction_mock.objects.bulk_create.reset_mock()
+        with patch.object(self.service, 'get_image_identity', return_value=(None, None)), \
+             patch.object(self.service, 'get_prediction_result', side_effect=fake_invoke):
+            results = self.service.create_predictions(self.user, urls)
+
+        self.assertEqual([r['image_url'] for r in results], urls)
+        self.assertEqual([r['status'] for r in results], ['completed', 'failed', 'completed'])
+        self.assertIn('endpoint timeout', results[1]['error'])
+        # All successful rows are written in a single insert
+        image_prediction_mock.objects.bulk_create.assert_called_once()
+        self.assertEqual(len(image_prediction_mock.objects.bulk_create.call_args.args[0]), 2)
+
+    @patch('api.service.prediction_service.connection')
+    def test_bulk_create_reads_ids_back_by_insert_token(self, mock_connection):
+        """Without RETURNING (MySQL), ids come from each row's token, not from row order"""
+        mock_connection.features.can_return_rows_from_bulk_insert = False
+        first = [MagicMock(pk=None), MagicMock(pk=None)]
+        second = [MagicMock(pk=None)]
+        stored = {}
+
+        def bulk_create(rows):
+            for row in rows:
+                stored[row.insert_token] = MagicMock(pk=100 + len(stored), insert_token=row.insert_token)
+            return rows
+
+        def rows_for(insert_token__in):
+            # The database hands rows back newest first, whatever the batch
+            return MagicMock(only=MagicMock(return_value=[stored[t] for t in reversed(insert_token__in)]))
+
+        image_prediction_mock.objects.bulk_create.side_effect = bulk_create
+        image_prediction_mock.objects.filter.side_effect = rows_for
+        try:
+            self.service._bulk_create_predictions(first)
+            self.service._bulk_create_predictions(second)
+        finally:
+            image_prediction_mock.objects.bulk_create.side_effect = None
+            image_prediction_mock.objects.filter.side_effect = None
+
+        self.assertEqual(len({p.insert_token for p in first + second}), 3)
+        self.assertEqual([p.pk for p in first + second], [100, 101, 102])
+
+    @patch('api.service.prediction_service.settings')
+    def test_identical_image_is_served_from_cache(self, mock_settings):
+        mock_settings.PREDICTION_CACHE_ENABLED = True
+        get_prediction_cache().clear()
+        backend = MagicMock()
+        backend.model_version.return_value = 'sagemaker:test-endpoint'
+
+        with patch.object(self.service, 'fetch_image', return_value=b'same scan bytes'), \
+             patch.object(self.service, 'get_inference_backend', return_value=backend), \
+             patch.object(self.service, 'invoke_endpoint', return_value={'prediction': 'x', 'confidence': 0.9}) as mock_invoke:
+            first = self.service.get_prediction_result('https://example.com/upload-1.jpg')
+            second = self.service.get_prediction_result('https://example.com/upload-2.jpg')
+
+        self.assertEqual(first, second)
+        mock_invoke.assert_called_once()
+        self.assertGreaterEqual(self.service.get_cache_stats()['memory_hits'], 1)
+
+    @patch('api.service.prediction_service.settings')
+    def test_new_model_version_misses_cache(self, mock_settings):
+        mock_settings.PREDICTION_CACHE_ENABLED = True
+        get_prediction_cache().clear()
+        backend = MagicMock()
+
+        with patch.object(self.service, 'fetch_image', return_value=b'scan'), \
+             patch.object(self.service, 'get_inference_backend', return_value=backend), \
+             patch('api.service.prediction_cache.cache') as shared_cache, \
+             patch.object(self.service, 'invoke_endpoint', return_value={'prediction': 'x'}) as mock_invoke:
+            shared_cache.get.return_value = None
+            backend.model_version.return_value = 'v1'
+            self.service.get_prediction_result(self.test_image_url)
+            backend.model_version.return_value = 'v2'
+            self.service.get_prediction_result(self.test_image_url)
+
+        self.assertEqual(mock_invoke.call_count, 2)
+
+    def test_http_model_version_comes_from_settings(self):
+        from api.service.inference_backend import HttpInferenceBackend
+        with patch('api.service.inference_backend.requests.Session'):
+            versioned = HttpInferenceBackend('http://localhost:8080/', version='2024-06-01')
+            unversioned = HttpInferenceBackend('http://localhost:8080/')
+
+        self.assertEqual(versioned.model_version(), 'http:http://localhost:8080/invocations:2024-06-01')
+        self.assertIsNone(unversioned.model_version())
+
+    @patch('api.service.prediction_service.settings')
+    def test_backend_without_model_version_is_not_cached(self, mock_settings):
+        mock_settings.PREDICTION_CACHE_ENABLED = True
+        get_prediction_cache().clear()
+        backend = MagicMock()
+        backend.model_version.return_value = None
+
+        with patch.object(self.service, 'fetch_image', return_value=b'same scan bytes'), \
+             patch.object(self.service, 'get_inference_backend', return_value=backend), \
+             patch.object(self.service, 'invoke_endpoint', return_value={'prediction': 'x'}) as mock_invoke:
+            self.service.get_prediction_result(self.test_image_url)
+            self.service.get_prediction_result(self.test_image_url)
+
+        self.assertEqual(mock_invoke.call_count, 2)
+        self.assertEqual(mock_invoke.call_args.kwargs['image_bytes'], b'same scan bytes')
+
+    def test_concurrent_identical_predictions_are_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_invoke(image_url, image_bytes=None):
+            started.set()
+            release.wait(5)
+            return {'prediction': 'aneurysm detected', 'confidence': 0.9}
+
+        with patch.object(self.service, 'get_image_identity', return_value=(b'scan', 'abc123')), \
+             patch.object(self.service, 'get_prediction_result', side_effect=slow_invoke) as mock_result:
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [executor.submit(self.service.create_prediction, self.user, self.test_image_url)]
+                started.wait(5)
+                futures += [executor.submit(self.service.create_prediction, self.user, self.test_image_url) for _ in range(2)]
+                time.sleep(0.05)
+                release.set()
+                predictions = [f.result(5) for f in futures]
+
+        mock_result.assert_called_once()
+        self.assertTrue(all(p is predictions[0] for p in predictions))
+
+    @patch('api.service.singleflight.cache')
+    def test_shap_analysis_reuses_in_flight_request(self, mock_cache):
+        in_flight = {'status': 'processing', 'request_id': 'existing-request', 'timestamp': '2024-01-01T00:00:00'}
+        mock_cache.add.return_value = False
+        mock_cache.get.return_value = in_flight
+        shap_job_mock.objects.filter.return_value.first.return_value = MagicMock(status='running', is_terminal=False)
+
+        with patch('api.service.prediction_service.get_client') as mock_get_client:
+            result = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123')
+
+        self.assertEqual(result['request_id'], 'existing-request')
+        mock_get_client.return_value.invoke.assert_not_called()
+
+    def test_finished_run_behind_the_lock_is_not_handed_out_as_in_flight(self):
+        shared = _FakeCache()
+        lock_key = 'singleflight:shap:1:shap_partition:fast:abc123'
+        shared.set(lock_key, {'status': 'processing', 'request_id': 'done-request'})
+        result = {'status': 'completed', 'request_id': 'done-request', 'analysis': {}}
+
+        with patch('api.service.singleflight.cache', shared), \
+             patch('api.service.prediction_service.cache', shared), \
+             patch('api.service.prediction_service.get_client') as mock_get_client:
+            # Completed: the new row gets a copy of the result
+            shap_job_mock.objects.filter.return_value.first.return_value = MagicMock(
+                request_id='done-request', status='completed', is_terminal=True, result=result)
+            reused = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123',
+                                                        preset='fast', method='shap_partition')
+            mock_get_client.return_value.invoke.assert_not_called()
+
+            # Failed: a fresh run takes over the lock
+            shap_job_mock.objects.filter.return_value.first.return_value = MagicMock(
+                request_id='done-request', status='failed', is_terminal=True)
+            fresh = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123',
+                                                       preset='fast', method='shap_partition')
+
+        self.assertEqual(reused, result)
+        mock_get_client.return_value.invoke.assert_called_once()
+        self.assertEqual(fresh['status'], 'processing')
+        self.assertNotEqual(fresh['request_id'], 'done-request')
+        self.assertEqual(shared.get(lock_key)['request_id'], fresh['request_id'])
+
+    def test_terminal_callback_releases_dedupe_lock(self):
+        shared = _FakeCache()
+        with patch('api.service.singleflight.cache', shared), \
+             patch('api.service.prediction_service.cache', shared), \
+             patch('api.service.prediction_service.get_client') as mock_get_client:
+            first = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123',
+                                                       preset='fast', method='shap_partition')
+            job = MagicMock(status='running', request_id=first['request_id'], result={'status': 'completed'})
+            shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+
+            def transition(new_status, result=None, error=None):
+                job.status = new_status
+            job.transition.side_effect = transition
+            self.service.handle_shap_callback({'request_id': first['request_id'], 'status': 'completed',
+                                               'result': job.result})
+
+            second = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123',
+                                                        preset='fast', method='shap_partition')
+
+        self.assertEqual(mock_get_client.return_value.invoke.call_count, 2)
+        self.assertNotEqual(first['request_id'], second['request_id'])
+        self.assertNotIn(f"singleflight:shap-run:{first['request_id']}", shared.data)
+
+    @patch('api.service.prediction_service.settings')
+    def test_batch_rows_saved_after_job_finished_get_its_result(self, mock_settings):
+        """The batch path inserts rows after invoking; a callback in between has no row to update"""
+        mock_settings.SHAP_DEFAULT_METHOD = 'shap_partition'
+        result = {'status': 'completed', 'request_id': 'req-1'}
+        job = MagicMock(status='completed', request_id='req-1', result=result)
+        shap_job_mock.objects.filter.return_value.exclude.return_value = [job]
+        image_prediction_mock.objects.filter.reset_mock()
+
+        with patch.object(self.service, 'get_image_identity', return_value=(None, 'abc123')), \
+             patch.object(self.service, 'get_prediction_result', return_value={'prediction': 'x'}), \
+             patch.object(self.service, 'perform_shap_analysis',
+                          return_value={'status': 'processing', 'request_id': 'req-1'}), \
+             patch.object(self.service, '_bulk_create_predictions'):
+            self.service.create_predictions(self.user, [self.test_image_url], include_shap='fast')
+
+        shap_job_mock.objects.filter.assert_called_with(request_id__in=['req-1'])
+        image_prediction_mock.objects.filter.assert_called_with(request_id='req-1')
+        image_prediction_mock.objects.filter.return_value.update.assert_called_once_with(shap_explanation=result)
+
+    @patch('api.service.singleflight.cache')
+    def test_failed_shap_invoke_releases_lock(self, mock_cache):
+        mock_cache.add.return_value = True
+
+        with patch('api.service.prediction_service.get_client') as mock_get_client:
+            mock_get_client.return_value.invoke.side_effect = Exception('throttled')
+            result = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123',
+                                                        preset='fast', method='shap_partition')
+
+        self.assertEqual(result['status'], 'failed')
+        mock_cache.delete.assert_called_once_with('singleflight:shap:1:shap_partition:fast:abc123')
+
+    @patch('api.service.prediction_service.settings')
+    @patch('api.service.singleflight.cache')
+    def test_shap_preset_is_sent_to_lambda(self, mock_cache, mock_settings):
+        mock_cache.add.return_value = True
+        mock_settings.SHAP_DEFAULT_PRESET = 'standard'
+        mock_settings.SHAP_DEFAULT_METHOD = 'shap_partition'
+        mock_settings.SHAP_CALLBACK_URL = None
+
+        with patch('api.service.prediction_service.get_client') as mock_get_client:
+            fast = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123', preset='fast')
+            default = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123')
+
+        payloads = [json.loads(c.kwargs['Payload']) for c in mock_get_client.return_value.invoke.call_args_list]
+        self.assertEqual([p['body']['preset'] for p in payloads], ['fast', 'standard'])
+        self.assertEqual((fast['preset'], default['preset']), ('fast', 'standard'))
+        # Different presets are different runs, never coalesced
+        self.assertNotEqual(fast['request_id'], default['request_id'])
+        with self.assertRaises(ValueError):
+            self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123', preset='slow')
+
+    @patch('api.service.prediction_service.settings')
+    @patch('api.service.singleflight.cache')
+    def test_explanation_method_is_sent_to_lambda(self, mock_cache, mock_settings):
+        mock_cache.add.return_value = True
+        mock_settings.SHAP_DEFAULT_PRESET = 'standard'
+        mock_settings.SHAP_DEFAULT_METHOD = 'shap_partition'
+        mock_settings.SHAP_CALLBACK_URL = None
+
+        with patch('api.service.prediction_service.get_client') as mock_get_client:
+            gradcam = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123', method='gradcam')
+            default = self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123')
+
+        payloads = [json.loads(c.kwargs['Payload']) for c in mock_get_client.return_value.invoke.call_args_list]
+        self.assertEqual([p['body']['method'] for p in payloads], ['gradcam', 'shap_partition'])
+        self.assertEqual((gradcam['method'], default['method']), ('gradcam', 'shap_partition'))
+        # Different methods are different runs, never coalesced
+        self.assertNotEqual(gradcam['request_id'], default['request_id'])
+        with self.assertRaises(ValueError):
+            self.service.perform_shap_analysis(self.test_image_url, 1, image_hash='abc123', method='lime')
+
+    @patch('api.service.prediction_service.get_client')
+    def test_shap_status_is_one_job_read(self, mock_get_client):
+        job = MagicMock(status='completed', request_id='req-1', is_terminal=True)
+        shap_job_mock.objects.filter.return_value.first.return_value = job
+
+        result = self.service.check_shap_analysis_status('req-1', 1)
+
+        self.assertEqual(result, {'status': 'completed'})
+        shap_job_mock.objects.filter.assert_called_with(request_id='req-1')
+        mock_get_client.assert_not_called()
+
+    def _s3_with_files(self, files):
+        s3 = MagicMock()
+        s3.exceptions.NoSuchKey = type('NoSuchKey', (Exception,), {})
+
+        def get_object(Bucket, Key):
+            if Key not in files:
+                raise s3.exceptions.NoSuchKey(Key)
+            return {'Body': MagicMock(read=MagicMock(return_value=json.dumps(files[Key]).encode()))}
+        s3.get_object.side_effect = get_object
+        return s3
+
+    @patch('api.service.prediction_service.settings')
+    @patch('api.service.prediction_service.get_client')
+    def test_status_without_callback_is_resolved_from_s3(self, mock_get_client, mock_settings):
+        """With SHAP_CALLBACK_URL unset nothing moves the job; the result files do"""
+        mock_settings.SHAP_CALLBACK_URL = None
+        result = {'status': 'completed', 'request_id': 'req-1'}
+        mock_get_client.return_value = self._s3_with_files({'requests/7/req-1/result.json': result})
+        job = MagicMock(status='queued', request_id='req-1', user_id=7, is_terminal=False)
+        shap_job_mock.objects.filter.return_value.first.return_value = job
+        shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+        image_prediction_mock.objects.filter.reset_mock()
+
+        def transition(new_status, result=None, error=None):
+            job.status = new_status
+            job.result = result
+        job.transition.side_effect = transition
+
+        status = self.service.check_shap_analysis_status('req-1', 1)
+
+        self.assertEqual(status, {'status': 'completed'})
+        # Read from the owner's prefix, whoever asked
+        mock_get_client.return_value.get_object.assert_called_with(
+            Bucket='mcs09-bucket', Key='requests/7/req-1/result.json')
+        job.transition.assert_called_once_with('completed', result=result, error=None)
+        job.save.assert_called_once()
+        image_prediction_mock.objects.filter.return_value.update.assert_called_once_with(shap_explanation=result)
+
+    @patch('api.service.prediction_service.get_client')
+    def test_unfinished_job_without_result_stays_processing(self, mock_get_client):
+        mock_get_client.return_value = self._s3_with_files({})
+        job = MagicMock(status='running', request_id='req-1', user_id=7, is_terminal=False)
+        shap_job_mock.objects.filter.return_value.first.return_value = job
+
+        status = self.service.check_shap_analysis_status('req-1', 1)
+
+        self.assertEqual(status, {'status': 'processing', 'request_id': 'req-1', 'job_status': 'running'})
+        job.transition.assert_not_called()
+
+    def test_completion_callback_updates_prediction(self):
+        job = MagicMock(status='running', request_id='req-1', result={'shap_image_url': 'https://example.com/shap.png'})
+        shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+        image_prediction_mock.objects.filter.reset_mock()
+
+        def transition(new_status, result=None, error=None):
+            job.status = new_status
+        job.transition.side_effect = transition
+
+        result = self.service.handle_shap_callback({
+            'request_id': 'req-1',
+            'status': 'completed',
+            'result': job.result
+        })
+
+        self.assertEqual(result, {'status': 'completed'})
+        job.save.assert_called_once()
+        image_prediction_mock.objects.filter.assert_called_with(request_id='req-1')
+        image_prediction_mock.objects.filter.return_value.update.assert_called_once_with(shap_explanation=job.result)
+
+    def test_analyzed_callback_exposes_partial_result(self):
+        partial = {'status': 'analyzed', 'analysis': {'stability_score': 0.9}, 'visualization': {'status': 'pending'}}
+        job = MagicMock(status='running', request_id='req-1', result=partial)
+        shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+        image_prediction_mock.objects.filter.reset_mock()
+
+        def transition(new_status, result=None, error=None):
+            job.status = new_status
+        job.transition.side_effect = transition
+
+        result = self.service.handle_shap_callback({'request_id': 'req-1', 'status': 'analyzed', 'result': partial})
+
+        self.assertEqual(result['status'], 'partial')
+        self.assertEqual(result['visualization'], 'pending')
+        image_prediction_mock.objects.filter.return_value.update.assert_called_once_with(shap_explanation=partial)
+        # Still moving, so only cached briefly
+        self.assertIsNotNone(self.status_cache.set.call_args.args[2])
+
+    def test_duplicate_callback_is_idempotent(self):
+        job = MagicMock(status='completed', request_id='req-1')
+        shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+
+        result = self.service.handle_shap_callback({'request_id': 'req-1', 'status': 'completed'})
+
+        self.assertEqual(result, {'status': 'completed'})
+        job.transition.assert_not_called()
+        job.save.assert_not_called()
+
+    def _prediction(self, prediction_id, request_id, shap_explanation=None, prediction=None):
+        return MagicMock(
+            id=prediction_id,
+            user_id=1,
+            request_id=request_id,
+            shap_explanation=shap_explanation or {'status': 'processing', 'request_id': request_id},
+            prediction=prediction or {'prediction': 'aneurysm detected'}
+        )
+
+    def test_poll_only_fetches_pending_jobs(self):
+        done = self._prediction(1, 'done', shap_explanation={'status': 'completed', 'request_id': 'done'})
+        failed = self._prediction(2, 'failed', prediction={'shap_analysis': {'status': 'failed', 'error': 'oom'}})
+        pending = self._prediction(3, 'pending')
+        image_prediction_mock.objects.filter.return_value.order_by.return_value = [done, failed, pending]
+        image_prediction_mock.objects.bulk_update.reset_mock()
+        shap_job_mock.objects.filter.return_value = []
+
+        result = {'status': 'completed', 'request_id': 'pending', 'shap_image_url': 'https://example.com/shap.png'}
+        with patch('api.service.prediction_service.get_client'), \
+             patch('api.service.prediction_service.ShapResultIndex') as mock_index:
+            mock_index.return_value.load.return_value.fetch.return_value = ('completed', result)
+            statuses = self.service.get_user_predictions(self.user)
+
+        mock_index.return_value.load.assert_called_once()
+        mock_index.return_value.load.return_value.fetch.assert_called_once_with('pending')
+        self.assertEqual([s['prediction_id'] for s in statuses], [1, 2, 3])
+        self.assertEqual([s['status'] for s in statuses], ['completed', 'failed', 'completed'])
+        self.assertEqual(pending.shap_explanation, result)
+        image_prediction_mock.objects.bulk_update.assert_called_once_with([pending], ['shap_explanation', 'prediction'])
+
+    def test_poll_answers_terminal_jobs_from_db(self):
+        pending = self._prediction(1, 'req-1')
+        image_prediction_mock.objects.filter.return_value.order_by.return_value = [pending]
+        image_prediction_mock.objects.bulk_update.reset_mock()
+        job = MagicMock(request_id='req-1', status='completed', is_terminal=True)
+        shap_job_mock.objects.filter.return_value = [job]
+
+        with patch('api.service.prediction_service.ShapResultIndex') as mock_index:
+            statuses = self.service.get_user_predictions(self.user)
+
+        mock_index.assert_not_called()
+        image_prediction_mock.objects.bulk_update.assert_not_called()
+        self.assertEqual(statuses, [{'status': 'completed', 'prediction_id': 1}])
+
+    def test_poll_writes_terminal_job_back_onto_stale_row(self):
+        """A row that missed the completion update is fixed once, not re-derived on every listing"""
+        result = {'status': 'completed', 'request_id': 'req-1', 'analysis': {}}
+        stale = self._prediction(1, 'req-1')
+        current = self._prediction(2, 'req-2', shap_explanation={'status': 'completed', 'request_id': 'req-2'})
+        failed = self._prediction(3, 'req-3')
+        image_prediction_mock.objects.filter.return_value.order_by.return_value = [stale, current, failed]
+        image_prediction_mock.objects.filter.reset_mock()
+        shap_job_mock.objects.filter.return_value = [
+            MagicMock(request_id='req-1', status='completed', is_terminal=True, result=result),
+            MagicMock(request_id='req-2', status='completed', is_terminal=True, result={'status': 'completed'}),
+            MagicMock(request_id='req-3', status='failed', is_terminal=True, error='oom', completed_at=None),
+        ]
+
+        with patch('api.service.prediction_service.ShapResultIndex') as mock_index:
+            statuses = self.service.get_user_predictions(self.user)
+
+        mock_index.assert_not_called()
+        self.assertEqual([s['status'] for s in statuses], ['completed', 'completed', 'failed'])
+        updates = image_prediction_mock.objects.filter.return_value.update.call_args_list
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[0].kwargs, {'shap_explanation': result})
+        self.assertEqual(updates[1].kwargs['prediction']['shap_analysis']['error'], 'oom')
+        image_prediction_mock.objects.filter.assert_any_call(pk=stale.pk)
+        self.assertEqual(stale.shap_explanation, result)
+
+    def test_result_index_lists_once_and_fetches_finished_runs(self):
+        s3 = MagicMock()
+        s3.get_paginator.return_value.paginate.return_value = [
+            {'Contents': [
+                {'Key': 'requests/7/done/request.json'},
+                {'Key': 'requests/7/done/result.json'},
+                {'Key': 'requests/7/broken/request.json'},
+            ]},
+            {'Contents': [
+                {'Key': 'requests/7/broken/error.json'},
+                {'Key': 'requests/7/running/request.json'},
+            ]},
+        ]
+        s3.get_object.return_value = {'Body': MagicMock(read=MagicMock(return_value=b'{"status": "completed"}'))}
+
+        index = ShapResultIndex(s3, 'mcs09-bucket', 7).load()
+
+        s3.get_paginator.return_value.paginate.assert_called_once_with(Bucket='mcs09-bucket', Prefix='requests/7/')
+        self.assertEqual(index.outcome('done'), 'completed')
+        self.assertEqual(index.outcome('broken'), 'failed')
+        self.assertEqual(index.outcome('running'), 'processing')
+        self.assertEqual(index.outcome('unknown'), 'processing')
+        self.assertEqual(index.fetch('running'), ('processing', None))
+        s3.get_object.assert_not_called()
+        self.assertEqual(index.fetch('done'), ('completed', {'status': 'completed'}))
+        s3.get_object.assert_called_once_with(Bucket='mcs09-bucket', Key='requests/7/done/result.json')
+
+        # result.json is written first with the numbers only
+        s3.get_object.return_value = {'Body': MagicMock(read=MagicMock(return_value=b'{"status": "analyzed"}'))}
+        self.assertEqual(index.fetch('done'), ('analyzed', {'status': 'analyzed'}))
+
+    def test_attributions_are_served_as_downsampled_grid(self):
+        # conftest replaces the io module; _io is the implementation behind the real one
+        buf = _io.BytesIO()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('heatmap.npy', _npy('<f2', (4, 4), [0.5, 1.0, 0.0, 0.0] * 2 + [0.25] * 8))
+            archive.writestr('heatmap_scale.npy', _npy('<f4', (), [0.002]))
+            archive.writestr('labels.npy', _npy('<u2', (4, 4), [0, 0, 1, 1] * 2 + [2, 2, 3, 3] * 2))
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': MagicMock(read=MagicMock(return_value=buf.getvalue()))}
+
+        with patch('api.service.shap_artifacts.io', _io):
+            grid = ShapArtifacts(s3, 'mcs09-bucket', 'requests/7/req-1/attributions.npz').heatmap(2)
+
+        self.assertEqual(grid['shape'], [2, 2])
+        self.assertAlmostEqual(grid['heatmap'][0][0], 0.75 * 0.002, places=6)
+        self.assertAlmostEqual(grid['heatmap'][0][1], 0.0)
+        self.assertAlmostEqual(grid['heatmap'][1][0], 0.25 * 0.002, places=6)
+        self.assertEqual(grid['labels'], [[0, 1], [2, 3]])
+        with self.assertRaises(ValueError):
+            ShapArtifacts(s3, 'mcs09-bucket', 'key').heatmap(3)
+
+    @patch('api.service.prediction_service.settings')
+    @patch('api.service.prediction_service.get_client')
+    def test_attributions_url_needs_stored_artifacts(self, mock_get_client, mock_settings):
+        mock_settings.SHAP_ARTIFACT_URL_EXPIRY = 600
+        mock_get_client.return_value.generate_presigned_url.return_value = 'https://signed.example.com/a.npz'
+        stored = {'key': 'requests/7/req-1/attributions.npz', 'bytes': 1234, 'shape': [224, 224, 3]}
+        image_prediction_mock.objects.filter.return_value.first.return_value = self._prediction(
+            1, 'req-1', shap_explanation={'status': 'analyzed', 'artifacts': {'attributions': stored}}
+        )
+
+        result = self.service.get_shap_attributions('req-1', 7)
+
+        self.assertEqual(result['url'], 'https://signed.example.com/a.npz')
+        self.assertEqual(result['expires_in'], 600)
+        mock_get_client.return_value.generate_presigned_url.assert_called_once_with(
+            'get_object', Params={'Bucket': 'mcs09-bucket', 'Key': stored['key']}, ExpiresIn=600
+        )
+
+        # Runs from before attributions were stored
+        image_prediction_mock.objects.filter.return_value.first.return_value = self._prediction(1, 'req-2')
+        result = self.service.get_shap_attributions('req-2', 7)
+        self.assertEqual(result['status'], 'error')
+        self.assertIn('not found', result['error'])
+
+    @patch('api.service.prediction_service.get_client')
+    def test_legacy_status_reads_both_files_under_owner_prefix(self, mock_get_client):
+        s3 = mock_get_client.return_value
+        s3.exceptions.NoSuchKey = KeyError
+        s3.get_object.side_effect = [KeyError(), {'Body': MagicMock(read=MagicMock(return_value=b'{"error": "oom"}'))}]
+        prediction = self._prediction(1, 'req-1')
+        prediction.user.id = 7
+        image_prediction_mock.objects.get.return_value = prediction
+        shap_job_mock.objects.filter.return_value.first.return_value = None
+
+        result = self.service.check_shap_analysis_status('req-1', 'someone-else')
+
+        self.assertEqual(result, {'status': 'failed', 'error': {'error': 'oom'}})
+        keys = [c.kwargs['Key'] for c in s3.get_object.call_args_list]
+        self.assertEqual(keys, ['requests/7/req-1/result.json', 'requests/7/req-1/error.json'])
+
+    def test_notifier_wakes_waiters(self):
+        notifier = JobNotifier()
+        threading.Timer(0.05, notifier.notify, args=('req-1',)).start()
+
+        start = time.monotonic()
+        self.assertTrue(notifier.wait('req-1', 5))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(notifier.wait('req-1', 0.01))
+        self.assertEqual(notifier.waiting(), 0)
+
+    @patch('api.service.prediction_service.settings')
+    def test_wait_for_shap_status_returns_on_completion(self, mock_settings):
+        mock_settings.SHAP_WAIT_MAX_TIMEOUT = 10
+        mock_settings.SHAP_WAIT_RECHECK_SECONDS = 10
+        statuses = [{'status': 'processing', 'request_id': 'req-1'}, {'status': 'completed'}]
+        threading.Timer(0.05, get_job_notifier().notify, args=('req-1',)).start()
+
+        start = time.monotonic()
+        with patch.object(self.service, 'check_shap_analysis_status', side_effect=statuses) as mock_check:
+            result = self.service.wait_for_shap_status('req-1', 1, timeout=10)
+
+        self.assertEqual(result, {'status': 'completed'})
+        self.assertEqual(mock_check.call_count, 2)
+        self.assertLess(time.monotonic() - start, 5)
+
+    @patch('api.service.prediction_service.settings')
+    def test_wait_since_partial_waits_for_visualization(self, mock_settings):
+        mock_settings.SHAP_WAIT_MAX_TIMEOUT = 10
+        mock_settings.SHAP_WAIT_RECHECK_SECONDS = 10
+        statuses = [{'status': 'partial', 'request_id': 'req-1'}, {'status': 'completed'}]
+        threading.Timer(0.05, get_job_notifier().notify, args=('req-1',)).start()
+
+        with patch.object(self.service, 'check_shap_analysis_status', side_effect=statuses):
+            result = self.service.wait_for_shap_status('req-1', 1, timeout=10, since='partial')
+
+        self.assertEqual(result, {'status': 'completed'})
+
+    @patch('api.service.prediction_service.settings')
+    def test_wait_for_shap_status_times_out_processing(self, mock_settings):
+        mock_settings.SHAP_WAIT_MAX_TIMEOUT = 0.1
+        mock_settings.SHAP_WAIT_RECHECK_SECONDS = 5
+        processing = {'status': 'processing', 'request_id': 'req-1'}
+
+        with patch.object(self.service, 'check_shap_analysis_status', return_value=processing):
+            result = self.service.wait_for_shap_status('req-1', 1, timeout=60)
+
+        self.assertEqual(result, processing)
+
+    @patch('api.service.prediction_service.settings')
+    @patch('api.service.prediction_service.get_client')
+    def test_wait_without_callback_returns_once_result_is_in_s3(self, mock_get_client, mock_settings):
+        mock_settings.SHAP_WAIT_MAX_TIMEOUT = 5
+        mock_settings.SHAP_WAIT_RECHECK_SECONDS = 0.01
+        files = {}
+        mock_get_client.return_value = self._s3_with_files(files)
+        job = MagicMock(status='running', request_id='req-1', user_id=7, is_terminal=False)
+        shap_job_mock.objects.filter.return_value.first.return_value = job
+        shap_job_mock.objects.select_for_update.return_value.filter.return_value.first.return_value = job
+
+        def transition(new_status, result=None, error=None):
+            job.status = new_status
+        job.transition.side_effect = transition
+        # Nothing cached, so every recheck reaches the job row and S3
+        self.status_cache.get.return_value = None
+        threading.Timer(0.05, files.update, args=({'requests/7/req-1/result.json': {'status': 'completed'}},)).start()
+
+        start = time.monotonic()
+        result = self.service.wait_for_shap_status('req-1', 1)
+
+        self.assertEqual(result, {'status': 'completed'})
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_cached_status_skips_lookup(self):
+        self.status_cache.get.return_value = {'status': 'completed'}
+
+        result = self.service.check_shap_analysis_status('req-1', 1)
+
+        self.assertEqual(result, {'status': 'completed'})
+        shap_job_mock.objects.filter.assert_not_called()
+
+    @patch('api.service.status_cache.settings')
+    def test_status_ttl_depends_on_state(self, mock_settings):
+        mock_settings.SHAP_STATUS_PROCESSING_TTL = 3
+        shap_job_mock.objects.filter.return_value.first.return_value = MagicMock(status='running', request_id='req-1')
+        self.service.check_shap_analysis_status('req-1', 1)
+        self.assertEqual(self.status_cache.set.call_args.args[2], 3)
+
+        shap_job_mock.objects.filter.return_value.first.return_value = MagicMock(status='completed', request_id='req-2')
+        self.service.check_shap_analysis_status('req-2', 1)
+        self.assertIsNone(self.status_cache.set.call_args.args[2])
+
+    def test_concurrent_status_checks_share_one_lookup(self):
+        release = threading.Event()
+
+        def slow_lookup(request_id, user_id):
+            release.wait(5)
+            return {'status': 'processing', 'request_id': request_id}
+
+        with patch.object(self.service, '_read_shap_status', side_effect=slow_lookup) as mock_read:
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                futures = [executor.submit(self.service.check_shap_analysis_status, 'req-1', 1) for _ in range(4)]
+                time.sleep(0.05)
+                release.set()
+                results = [f.result(5) for f in futures]
+
+        mock_read.assert_called_once()
+        self.assertTrue(all(r['status'] == 'processing' for r in results))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
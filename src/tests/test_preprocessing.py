@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+
+import preprocessing
+
+from .conftest import REAL_TORCH_MODULES, real_numpy as real_np, real_torch, using_real_torch
+
+
+def _stacked_normalize(batch):
+    """The per-image Normalize + torch.stack that model_pipeline used before BatchNormalizer"""
+    transforms = REAL_TORCH_MODULES['torchvision.transforms']
+    x = real_torch.Tensor(batch).permute(0, 3, 1, 2)
+    normalize = transforms.Normalize(mean=list(preprocessing.IMAGENET_MEAN), std=list(preprocessing.IMAGENET_STD))
+    return real_torch.stack([normalize(img) for img in x])
+
+
+@unittest.skipIf('torchvision.transforms' not in REAL_TORCH_MODULES, 'needs torch and torchvision')
+class TestBatchNormalizer(unittest.TestCase):
+    def setUp(self):
+        modules = using_real_torch()
+        modules.start()
+        self.addCleanup(modules.stop)
+        for name, module in (('torch', real_torch), ('np', real_np)):
+            attribute = patch.object(preprocessing, name, module)
+            attribute.start()
+            self.addCleanup(attribute.stop)
+
+        self.rng = real_np.random.default_rng(0)
+
+    def batch(self, n, height=24, width=24):
+        return self.rng.random((n, height, width, 3), dtype=real_np.float32)
+
+    def test_matches_stacked_normalize(self):
+        batch = self.batch(4, 24, 32)
+        expected = _stacked_normalize(batch)
+
+        for channels_last in (True, False):
+            with self.subTest(channels_last=channels_last):
+                out = preprocessing.BatchNormalizer(channels_last=channels_last)(batch)
+
+                self.assertEqual(tuple(out.shape), (4, 3, 24, 32))
+                self.assertTrue(real_torch.allclose(out, expected, atol=1e-6))
+                if channels_last:
+                    self.assertTrue(out.is_contiguous(memory_format=real_torch.channels_last))
+                else:
+                    self.assertTrue(out.is_contiguous())
+
+    def test_buffer_is_reused_until_it_is_too_small(self):
+        normalizer = preprocessing.BatchNormalizer(channels_last=True)
+
+        first = normalizer(self.batch(5))
+        buffer = normalizer._buffer
+
+        smaller = normalizer(self.batch(2))
+        self.assertIs(normalizer._buffer, buffer)
+        self.assertEqual(smaller.data_ptr(), first.data_ptr())
+        self.assertEqual(tuple(smaller.shape), (2, 3, 24, 24))
+
+        normalizer(self.batch(8))
+        self.assertIsNot(normalizer._buffer, buffer)
+        self.assertEqual(normalizer._buffer.shape[0], 8)
+
+        buffer = normalizer._buffer
+        resized = normalizer(self.batch(2, 16, 24))
+        self.assertIsNot(normalizer._buffer, buffer)
+        self.assertEqual(tuple(resized.shape), (2, 3, 16, 24))
+
+    def test_prepare_model_switches_weights_to_channels_last(self):
+        conv = real_torch.nn.Conv2d(3, 4, 3)
+        self.assertFalse(conv.weight.is_contiguous(memory_format=real_torch.channels_last))
+
+        preprocessing.prepare_model(conv, channels_last=False)
+        self.assertFalse(conv.weight.is_contiguous(memory_format=real_torch.channels_last))
+
+        model = preprocessing.prepare_model(conv, channels_last=True)
+        self.assertTrue(model.weight.is_contiguous(memory_format=real_torch.channels_last))
+
+
+if __name__ == '__main__':
+    unittest.main()
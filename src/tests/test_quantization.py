@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+from .conftest import real_torch, using_real_torch, load_module
+
+pytestmark = pytest.mark.skipif(real_torch is None, reason='needs torch')
+
+QUANTIZATION_PATH = os.path.join(os.path.dirname(__file__), '..', 'ml', 'quantization.py')
+
+
+@pytest.fixture
+def real():
+    """ml.quantization bound to the real torch, and a tiny VGG-shaped model"""
+    with using_real_torch():
+        torch = real_torch
+        nn = torch.nn
+        quantization = load_module('ml_quantization_under_test', QUANTIZATION_PATH)
+
+        class TinyVGG(nn.Module):
+            """Same attribute layout as CNNModel: vgg16.features then vgg16.classifier"""
+            def __init__(self):
+                super().__init__()
+                self.vgg16 = nn.Module()
+                self.vgg16.features = nn.Sequential(
+                    nn.Conv2d(3, 8, 3, padding=1), nn.ReLU(), nn.MaxPool2d(2),
+                    nn.Conv2d(8, 8, 3, padding=1), nn.ReLU(), nn.AdaptiveAvgPool2d(4),
+                )
+                self.vgg16.classifier = nn.Sequential(
+                    nn.Flatten(), nn.Linear(128, 32), nn.ReLU(), nn.Linear(32, 2),
+                )
+
+            def forward(self, x):
+                return self.vgg16.classifier(self.vgg16.features(x))
+
+        torch.manual_seed(0)
+        model = TinyVGG().eval()
+        batch = torch.rand(4, 3, 32, 32)
+        yield quantization, model, batch
+
+
+def _max_diff(reference, quantized, batch):
+    with real_torch.no_grad():
+        return float((reference(batch) - quantized(batch)).abs().max())
+
+
+def test_none_returns_the_float_model(real):
+    quantization, model, _ = real
+    quantized, info = quantization.quantize_model(model, 'none')
+    assert quantized is model
+    assert info['mode'] == 'none'
+    assert info['size_mb'] == info['size_mb_fp32']
+
+
+def test_dynamic_quantizes_linear_layers_only(real):
+    quantization, model, batch = real
+    dynamic_linear = real_torch.ao.nn.quantized.dynamic.Linear
+
+    quantized, info = quantization.quantize_model(model, 'dynamic')
+
+    assert info['mode'] == 'dynamic'
+    assert info['size_mb'] < info['size_mb_fp32']
+    assert isinstance(quantized.vgg16.classifier[1], dynamic_linear)
+    assert isinstance(quantized.vgg16.classifier[3], dynamic_linear)
+    assert type(quantized.vgg16.features[0]) is real_torch.nn.Conv2d
+    # A copy is quantized unless inplace=True
+    assert type(model.vgg16.classifier[1]) is real_torch.nn.Linear
+    assert _max_diff(model, quantized, batch) < 1e-2
+
+
+def test_static_quantizes_features_with_calibration(real):
+    quantization, model, batch = real
+    calibration = [real_torch.rand(4, 3, 32, 32) for _ in range(4)]
+
+    quantized, info = quantization.quantize_model(model, 'static', calibration)
+
+    assert info['mode'] == 'static'
+    # Quant/dequant stubs around the feature stack, conv/relu pairs fused into int8 kernels
+    features = quantized.vgg16.features
+    assert isinstance(features[0], real_torch.ao.nn.quantized.Quantize)
+    assert isinstance(features[2], real_torch.ao.nn.quantized.DeQuantize)
+    fused = real_torch.ao.nn.intrinsic.quantized.ConvReLU2d
+    assert sum(isinstance(m, fused) for m in features.modules()) == 2
+    assert isinstance(quantized.vgg16.classifier[1], real_torch.ao.nn.quantized.dynamic.Linear)
+    assert _max_diff(model, quantized, batch) < 5e-2
+
+
+def test_static_without_calibration_degrades_to_dynamic(real):
+    quantization, model, _ = real
+    quantized, info = quantization.quantize_model(model, 'static')
+
+    assert (info['requested'], info['mode']) == ('static', 'dynamic')
+    assert type(quantized.vgg16.features[0]) is real_torch.nn.Conv2d
+
+
+def test_unknown_mode_is_rejected(real):
+    quantization, model, _ = real
+    with pytest.raises(ValueError):
+        quantization.quantize_model(model, 'int4')
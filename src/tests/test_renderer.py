@@ -0,0 +1,146 @@
+import unittest
+from unittest.mock import patch
+
+import post_analysis
+import renderer
+
+from .conftest import REAL_PIL_MODULES, real_io, real_numpy as real_np, real_pil_image, using_real_pil
+
+
+def _grid_labels(side, size):
+    ys, xs = real_np.mgrid[0:size, 0:size]
+    return (ys * side // size) * side + (xs * side // size)
+
+
+class TestRenderer(unittest.TestCase):
+    def setUp(self):
+        modules = using_real_pil()
+        modules.start()
+        self.addCleanup(modules.stop)
+        for module, name, value in (
+            (renderer, 'np', real_np),
+            (renderer, 'io', real_io),
+            (renderer, 'Image', real_pil_image),
+            (renderer, 'ImageDraw', REAL_PIL_MODULES['PIL.ImageDraw']),
+            (renderer, 'ImageFont', REAL_PIL_MODULES['PIL.ImageFont']),
+            (renderer, '_lut', None),
+            (post_analysis, 'np', real_np),
+        ):
+            patcher = patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        rng = real_np.random.default_rng(0)
+        self.image = (rng.random((32, 32, 3)) * 255).astype(real_np.uint8)
+        self.mean_shap = rng.normal(0, 1e-3, (32, 32))
+        self.labels = _grid_labels(4, 32)
+        self.top_indices = [5, 10, 0]
+
+    def render(self, **kwargs):
+        return renderer.render_panels(self.image, self.mean_shap, self.labels, self.top_indices, **kwargs)
+
+    def decode(self, data):
+        with real_pil_image.open(real_io.BytesIO(data)) as img:
+            img.load()
+            return img.format, real_np.asarray(img.convert('RGB'))
+
+    def test_four_panels_at_panel_size(self):
+        panel_size = 64
+        data, _, _ = self.render(panel_size=panel_size, fmt='png')
+        _, canvas = self.decode(data)
+
+        # Layout constants from render_panels for this panel size
+        font_size = max(panel_size // 24, 10)
+        margin = max(panel_size // 20, 8)
+        colorbar_width = max(panel_size // 6, 40)
+        widths = [panel_size, panel_size + colorbar_width, panel_size, panel_size]
+        self.assertEqual(canvas.shape, (font_size * 2 + panel_size + margin * 2,
+                                        sum(widths) + margin * 5, 3))
+
+        top = margin + font_size * 2
+        lefts = [margin]
+        for width in widths[:-1]:
+            lefts.append(lefts[-1] + width + margin)
+
+        def panel(index, width=panel_size):
+            return canvas[top:top + panel_size, lefts[index]:lefts[index] + width]
+
+        # Original image, upscaled
+        image_big = real_np.asarray(real_pil_image.fromarray(self.image).resize(
+            (panel_size, panel_size), real_pil_image.BILINEAR))
+        real_np.testing.assert_array_equal(panel(0), image_big)
+
+        # Heatmap centred on 0, then its colorbar
+        bound = float(real_np.abs(self.mean_shap).max())
+        shap_big = renderer._resize_nearest(self.mean_shap.astype(real_np.float32), panel_size)
+        real_np.testing.assert_array_equal(panel(1), renderer.apply_colormap(shap_big, -bound, bound))
+        self.assertFalse((panel(1, widths[1])[:, panel_size:] == 255).all())
+
+        # Overlay; its left edge can carry the colorbar's tick labels
+        colors = renderer.apply_colormap(shap_big, float(shap_big.min()), float(shap_big.max()))
+        overlay = (image_big * (1.0 - renderer.OVERLAY_ALPHA) + colors * renderer.OVERLAY_ALPHA).astype(real_np.uint8)
+        real_np.testing.assert_array_equal(panel(2)[:, panel_size // 2:], overlay[:, panel_size // 2:])
+
+        # Superpixels: the first label change sits at x = 16 in a 64 pixel panel
+        # (clear of the numbered boxes near the bottom)
+        superpixels = panel(3)
+        self.assertTrue((superpixels[-8:, 15:17] == renderer.BOUNDARY_COLOR).all())
+        real_np.testing.assert_array_equal(superpixels[-8:, 20:28], image_big[-8:, 20:28])
+
+        # White margins beside the outer panels (titles may run into them above)
+        self.assertTrue((canvas[top:, :margin] == 255).all())
+        self.assertTrue((canvas[top:, -margin:] == 255).all())
+        self.assertTrue((canvas[top:top + panel_size, lefts[3] - margin:lefts[3]] == 255).all())
+
+    def test_png_and_webp_encoding(self):
+        for fmt, pil_format, content_type in (('png', 'PNG', 'image/png'), ('webp', 'WEBP', 'image/webp')):
+            with self.subTest(fmt=fmt):
+                data, returned_type, extension = self.render(panel_size=48, fmt=fmt)
+                decoded_format, canvas = self.decode(data)
+
+                self.assertEqual(decoded_format, pil_format)
+                self.assertEqual(returned_type, content_type)
+                self.assertEqual(extension, fmt)
+                self.assertEqual(canvas.shape[2], 3)
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.render(fmt='gif')
+
+    def test_colormap_maps_range_onto_lut(self):
+        lut = renderer.colormap_lut()
+        colors = renderer.apply_colormap(real_np.array([-2.0, 0.0, 2.0, -5.0, 5.0]), -2.0, 2.0)
+
+        self.assertEqual(lut.shape, (256, 3))
+        real_np.testing.assert_array_equal(colors[0], lut[0])
+        real_np.testing.assert_array_equal(colors[1], lut[127])
+        real_np.testing.assert_array_equal(colors[2], lut[255])
+        # Out of range values clip to the ends
+        real_np.testing.assert_array_equal(colors[3], lut[0])
+        real_np.testing.assert_array_equal(colors[4], lut[255])
+        # RdBu_r: dark blue, near white, dark red
+        self.assertEqual(tuple(lut[0]), renderer._RDBU_R_ANCHORS[0])
+        self.assertEqual(tuple(lut[255]), renderer._RDBU_R_ANCHORS[-1])
+        self.assertTrue((lut[127] > 240).all())
+
+    def test_boundaries_mark_label_changes(self):
+        labels = real_np.array([
+            [0, 0, 1, 1],
+            [0, 0, 1, 1],
+            [2, 2, 2, 1],
+            [2, 2, 2, 2],
+        ])
+
+        expected = real_np.zeros(labels.shape, dtype=bool)
+        for y in range(4):
+            for x in range(4):
+                neighbours = [(y + dy, x + dx) for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                              if 0 <= y + dy < 4 and 0 <= x + dx < 4]
+                expected[y, x] = any(labels[n] != labels[y, x] for n in neighbours)
+
+        real_np.testing.assert_array_equal(renderer._boundaries(labels), expected)
+        self.assertFalse(renderer._boundaries(real_np.zeros((3, 3), dtype=int)).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import callback
+from utils.callback_signing import verify, SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+
+class TestShapCallback(unittest.TestCase):
+    """The Lambda's signed status callback, delivered to a local stand-in for the API"""
+
+    def setUp(self):
+        self.secret = 'test-secret'
+        self.received = []
+
+        def local_api(url, body, headers):
+            # What ShapCallbackView does before handing the payload to PredictionService
+            if not verify(body, self.secret, headers[TIMESTAMP_HEADER], headers[SIGNATURE_HEADER]):
+                raise Exception('403 Invalid signature')
+            self.received.append((url, json.loads(body)))
+
+        self.patches = [
+            patch.object(callback, 'CALLBACK_SECRET', self.secret),
+            patch.object(callback, 'transport', local_api),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def test_signed_callback_is_accepted(self):
+        delivered = callback.send_status(
+            'https://api.example.com/analysis/shap/callback/', 'req-1', 'completed',
+            result={'shap_image_url': 'https://example.com/shap.png'}
+        )
+
+        self.assertTrue(delivered)
+        url, payload = self.received[0]
+        self.assertEqual(url, 'https://api.example.com/analysis/shap/callback/')
+        self.assertEqual(payload['status'], 'completed')
+        self.assertEqual(payload['result']['shap_image_url'], 'https://example.com/shap.png')
+
+    def test_wrong_secret_is_rejected_without_failing_the_job(self):
+        with patch.object(callback, 'CALLBACK_SECRET', 'other-secret'):
+            delivered = callback.send_status('https://api.example.com/cb/', 'req-1', 'failed', error={'error': 'boom'})
+
+        self.assertFalse(delivered)
+        self.assertEqual(self.received, [])
+
+    def test_stale_timestamp_is_rejected(self):
+        body = b'{"request_id": "req-1", "status": "running"}'
+        signature = callback.sign(body, self.secret, 1000)
+        self.assertFalse(verify(body, self.secret, '1000', signature))
+
+    def test_no_callback_url_is_a_no_op(self):
+        self.assertFalse(callback.send_status(None, 'req-1', 'running'))
+        self.assertEqual(self.received, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import sys
 from unittest.mock import patch, MagicMock
 
 # Import mocked dependencies from conftest
-from .conftest import mock_torch
+from .conftest import mock_torch, real_numpy as real_np
 
 # Create a mock nn module
 mock_nn = MagicMock()
@@ -81,7 +81,11 @@ def mock_model():
 @pytest.fixture
 def shap_service(mock_model):
     """Create a SHAP service instance with mocked dependencies"""
-    with patch('shap_service.CNNModel') as mock_cnn:
+    model_info = {'cache': 'miss', 'version': 'test', 'load_timings': {}, 'quantization': None}
+    with patch('shap_service.CNNModel') as mock_cnn, \
+         patch('shap_service.model_cache.get_model', return_value=(mock_model, model_info)), \
+         patch('shap_service.preprocessing.BatchNormalizer'), \
+         patch('shap_service.batch_tuner.get_batch_size', return_value=(None, {'source': 'preset'})):
         mock_cnn.return_value = mock_model
         service = ShapAnalysisService()
         service.model = mock_model  # Ensure we're using our mock
@@ -288,3 +292,61 @@ def test_error_handling(shap_service, test_params, monkeypatch):
     # Verify error response
     assert result.get('status') == 'failed'
     assert 'error' in result
+
+def test_model_pipeline_reuses_cached_outputs(shap_service, monkeypatch):
+    """Images the explainer already evaluated are answered without another forward pass"""
+    fake_torch = MagicMock()
+    fake_torch.nn.functional.softmax = lambda output, dim: output
+    monkeypatch.setattr('shap_service.torch', fake_torch)
+    monkeypatch.setattr('shap_service.np', real_np)
+    shap_service.preprocess = lambda batch: MagicMock(to=lambda device: batch)
+
+    batch_sizes = []
+
+    def forward(batch):
+        batch_sizes.append(len(batch))
+        means = batch.mean(axis=(1, 2, 3))
+        probs = real_np.stack([1 - means, means], axis=1)
+        return MagicMock(cpu=lambda: MagicMock(numpy=lambda: probs))
+
+    shap_service.model = MagicMock(side_effect=forward)
+    dark = real_np.zeros((224, 224, 3), dtype=real_np.float32)
+    bright = real_np.full((224, 224, 3), 0.75, dtype=real_np.float32)
+
+    pipeline = shap_service.model_pipeline()
+    first = pipeline(real_np.stack([dark, bright]))
+    again = pipeline(real_np.stack([bright, dark, bright]))
+
+    assert batch_sizes == [2]
+    assert real_np.allclose(first, [[1.0, 0.0], [0.25, 0.75]])
+    assert real_np.allclose(again, [first[1], first[0], first[1]])
+
+    # A new analysis starts with an empty cache
+    shap_service.model_pipeline()(real_np.stack([dark]))
+    assert batch_sizes == [2, 1]
+
+@pytest.mark.parametrize('renderer_name, expected', [('matplotlib', 'render_matplotlib'), ('numpy', 'render_panels')])
+def test_render_visualization_dispatches_on_renderer(shap_service, test_params, monkeypatch, renderer_name, expected):
+    """SHAP_RENDERER=matplotlib draws the old figure; anything else uses the NumPy/PIL renderer"""
+    monkeypatch.setattr('shap_service.RENDERER', renderer_name)
+    renderers = {
+        'render_matplotlib': MagicMock(return_value=(b'matplotlib', 'image/png', 'png')),
+        'render_panels': MagicMock(return_value=(b'panels', 'image/webp', 'webp')),
+    }
+    monkeypatch.setattr(ShapAnalysisService, 'render_matplotlib', renderers['render_matplotlib'])
+    monkeypatch.setattr('shap_service.renderer.render_panels', renderers['render_panels'])
+    save_to_s3 = MagicMock(return_value='https://bucket/shap_analysis.png')
+    monkeypatch.setattr(shap_service, 'save_to_s3', save_to_s3)
+    arrays = {'image_rgb': 'image', 'mean_shap': 'shap', 'labels': 'labels', 'top_indices': 'top'}
+
+    result = shap_service.render_visualization(arrays, test_params['user_id'], test_params['request_id'])
+
+    assert result == {'status': 'completed', 'url': 'https://bucket/shap_analysis.png'}
+    renderers[expected].assert_called_once_with('image', 'shap', 'labels', 'top')
+    for name, render in renderers.items():
+        if name != expected:
+            render.assert_not_called()
+    data, _, image_name, _ = save_to_s3.call_args.args
+    assert data == renderers[expected].return_value[0]
+    assert image_name.endswith('.' + renderers[expected].return_value[2])
+    assert save_to_s3.call_args.kwargs['content_type'] == renderers[expected].return_value[1]
@@ -0,0 +1,51 @@
+import threading
+
+import boto3
+from botocore.config import Config
+from django.conf import settings
+
+# boto3 clients are thread-safe once built, but building them from the shared
+# default session is not, and each one carries its own connection pool. Build
+# each (service, region) pair once per process and hand out the same client.
+_clients = {}
+_lock = threading.Lock()
+
+
+def _client_config():
+    return Config(
+        max_pool_connections=getattr(settings, 'AWS_MAX_POOL_CONNECTIONS', 50),
+        connect_timeout=getattr(settings, 'AWS_CONNECT_TIMEOUT', 5),
+        read_timeout=getattr(settings, 'AWS_READ_TIMEOUT', 60),
+        retries={
+            'max_attempts': getattr(settings, 'AWS_MAX_ATTEMPTS', 3),
+            'mode': getattr(settings, 'AWS_RETRY_MODE', 'standard'),
+        },
+    )
+
+
+def get_client(service_name, region_name=None):
+    """
+    Get the process-wide boto3 client for a service
+
+    Args:
+        service_name: boto3 service name, e.g. 's3' or 'sagemaker-runtime'
+        region_name: Optional region, defaults to the environment's region
+
+    Returns:
+        A pooled boto3 client shared by every caller in this process
+    """
+    key = (service_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = boto3.client(service_name, region_name=region_name, config=_client_config())
+                _clients[key] = client
+    return client
+
+
+def reset_clients():
+    """Drop every cached client (tests and credential rotation)"""
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,36 @@
+import hashlib
+import hmac
+import time
+
+# The shap-analysis Lambda signs its status callbacks with the same scheme
+# (ml_lambda/callback.py); keep the two in step.
+SIGNATURE_HEADER = 'X-Shap-Signature'
+TIMESTAMP_HEADER = 'X-Shap-Timestamp'
+
+
+def sign(body, secret, timestamp):
+    """
+    HMAC-SHA256 over "<timestamp>.<raw body>"
+
+    Args:
+        body: Raw request body as bytes
+        secret: Shared callback secret
+        timestamp: Unix seconds, sent alongside so old callbacks cannot be replayed
+    """
+    message = str(timestamp).encode('utf-8') + b'.' + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def verify(body, secret, timestamp, signature, max_skew=300):
+    """
+    Returns:
+        bool: True if the signature matches and the timestamp is recent
+    """
+    if not secret or not timestamp or not signature:
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > max_skew:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign(body, secret, timestamp), signature)